@@ -0,0 +1,88 @@
+"""
+Benchmark of DbConnection.add_batch_can_msg: one execute per row with the SQL built per row (the old way) vs. rows
+grouped by message and written with executemany and a cached INSERT statement per message type. Rows are written in
+batches of BATCH_SIZE, like the live consumer does. The cost of the rollups (see rollups.py) is reported on its own:
+once with every fold put off until all rows are written, once with the periodic folds of a live session.
+
+Run from the root of the repo (same as main.py) so the DBCs in resources/CAN-messages are used:
+    python benchmarks/bench_db_insert.py [number of frames]
+"""
+
+import os
+import random
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+
+import backend.dbcs as dbcs
+import backend.rollups as rollups
+from backend.can_message import decode_message
+from backend.db_connection import DbConnection
+
+# same as consumer.FLUSH_MAX_BATCH
+BATCH_SIZE = 1000
+
+
+def add_batch_can_msg_per_row(db_conn: DbConnection, can_msg_list: list) -> None:
+    """ add_batch_can_msg as it was before the statement cache, kept here as the baseline """
+
+    for can_msg in can_msg_list:
+        signal_dict = can_msg.sigDict
+        columns = ', '.join(signal_dict.keys())
+        placeholders = ', '.join(['?' for _ in signal_dict])
+        sql = f'INSERT INTO {can_msg.messageName} ({columns}, timeStamp) VALUES ({placeholders}, {can_msg.timeStamp})'
+        db_conn.cur.execute(sql, tuple(signal_dict.values()))
+    db_conn.conn.commit()
+
+
+def make_messages(count: int) -> list:
+    rng = random.Random(0)
+    known_ids = [msg.frame_id for db in dbcs.DBCs for msg in db.messages]
+    messages = []
+    while len(messages) < count:
+        can_msg = decode_message(rng.choice(known_ids), rng.randbytes(8), len(messages) * 0.001)
+        if can_msg is not None:
+            messages.append(can_msg)
+    return messages
+
+
+def bench(add_batch, messages, db_path: str) -> tuple[float, float]:
+    """ Returns the rows/sec of writing the messages in batches, and the seconds it took to fold what was left """
+
+    DbConnection.setup_the_db_path(db_path)
+    DbConnection.writer_conn = None  # a new database and session
+    DbConnection.rollup_folded_at = 0.0
+    with DbConnection.writer() as db_conn:
+        db_conn.setup_the_tables()
+        start = time.perf_counter()
+        for first in range(0, len(messages), BATCH_SIZE):
+            add_batch(db_conn, messages[first:first + BATCH_SIZE])
+        rate = len(messages) / (time.perf_counter() - start)
+        start = time.perf_counter()
+        db_conn.fold_rollups()
+        return rate, time.perf_counter() - start
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 1_000_000
+    dbcs.load_dbc_files()
+    messages = make_messages(count)
+    print(f"{count} decoded frames, {len({can_msg.messageName for can_msg in messages})} message types, batches of {BATCH_SIZE}")
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        per_row, _ = bench(add_batch_can_msg_per_row, messages, os.path.join(tmp_dir, "per_row.db"))
+        fold_interval = rollups.ROLLUP_FOLD_INTERVAL
+        rollups.ROLLUP_FOLD_INTERVAL = float("inf")  # every fold put off until fold_rollups()
+        grouped, fold_seconds = bench(DbConnection.add_batch_can_msg, messages, os.path.join(tmp_dir, "grouped.db"))
+        rollups.ROLLUP_FOLD_INTERVAL = fold_interval
+        live, _ = bench(DbConnection.add_batch_can_msg, messages, os.path.join(tmp_dir, "live.db"))
+    print(f"execute per row:                {per_row:12,.0f} rows/sec")
+    print(f"grouped executemany:            {grouped:12,.0f} rows/sec ({grouped / per_row:.1f}x), "
+          f"then {fold_seconds:.2f} s to fold the rollups ({count / fold_seconds:,.0f} rows/sec)")
+    print(f"with the rollups folded every {fold_interval:g} s: {live:12,.0f} rows/sec ({live / per_row:.1f}x)")
+
+
+if __name__ == "__main__":
+    main()
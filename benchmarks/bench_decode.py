@@ -0,0 +1,85 @@
+"""
+Microbenchmark for decoding: the old linear search over every DBC message vs. the frame-ID index in decode_message,
+and batch_decode.decode_batch over the same frames.
+
+Run from the root of the repo (same as main.py) so the DBCs in resources/CAN-messages are used:
+    python benchmarks/bench_decode.py [number of frames]
+"""
+
+import os
+import random
+import sys
+import time
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+
+import backend.dbcs as dbcs
+from backend.can_message import CanMessage, decode_message
+from backend.batch_decode import decode_batch
+
+
+def decode_message_linear(id: int, data: bytes, timestamp: float) -> CanMessage:
+    """ decode_message as it was before the frame-ID index, kept here as the baseline """
+
+    name = None
+    data += b'\x00' * 8
+    decoded_message = None
+    for db in dbcs.DBCs:
+        for msg in db.messages:
+            if msg.frame_id == id:
+                name = msg.name
+                decoded_message = db.decode_message(id, data)
+                break
+        if decoded_message is not None:
+            break
+    if decoded_message is None:
+        return None
+    return CanMessage(name, id, decoded_message, timestamp)
+
+
+def make_frames(count: int, unknown_ratio: float = 0.05) -> list[tuple[int, bytes, float]]:
+    """ Random frames over every known ID, with a small share of IDs that are not in any DBC """
+
+    known_ids = [msg.frame_id for db in dbcs.DBCs for msg in db.messages]
+    rng = random.Random(0)
+    frames = []
+    for i in range(count):
+        if rng.random() < unknown_ratio:
+            id = rng.choice((0x7FF, 0x123456, 0x1))
+        else:
+            id = rng.choice(known_ids)
+        frames.append((id, rng.randbytes(8), i * 0.005))
+    return frames
+
+
+def bench(decode, frames) -> float:
+    start = time.perf_counter()
+    for frame in frames:
+        decode(*frame)
+    return len(frames) / (time.perf_counter() - start)
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 200_000
+    dbcs.load_dbc_files()
+    n_messages = sum(len(db.messages) for db in dbcs.DBCs)
+    print(f"{len(dbcs.DBCs)} DBC files, {n_messages} message definitions, {count} frames")
+
+    frames = make_frames(count)
+    linear = bench(decode_message_linear, frames)
+    indexed = bench(decode_message, frames)
+    print(f"linear search:  {linear:12,.0f} frames/sec")
+    print(f"frame-ID index: {indexed:12,.0f} frames/sec ({indexed / linear:.1f}x)")
+
+    ids = np.array([frame[0] for frame in frames])
+    payloads = np.frombuffer(b"".join(frame[1] for frame in frames), dtype=np.uint8).reshape(-1, 8)
+    timestamps = np.array([frame[2] for frame in frames])
+    start = time.perf_counter()
+    decode_batch(ids, payloads, timestamps)
+    batched = count / (time.perf_counter() - start)
+    print(f"decode_batch:   {batched:12,.0f} frames/sec ({batched / linear:.1f}x)")
+
+
+if __name__ == "__main__":
+    main()
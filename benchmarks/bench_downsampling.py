@@ -0,0 +1,166 @@
+"""
+Benchmark of backend.downsampling: the per-bucket LTTB loop it used to have, the bucket-vectorized
+largest_triangle_three_buckets and minmax_lttb, at the 2500 point cap of graph_view.
+
+Before timing it checks that the downsampled data looks the same: results are drawn into a viewport of VIEWPORT_WIDTH
+pixel columns and the min/max of every column is compared (error in % of the y range of the data). The vectorized LTTB
+must pick exactly the points of the old loop, except on quantized inputs where ties between equal areas may go the other
+way (within TIE_MAX_ERROR), and LTTB and MinMax-LTTB must stay within ENVELOPE_MAX_ERROR / ENVELOPE_MEAN_ERROR of the raw
+data. The script exits with status 1 if any check fails.
+
+Run from the root of the repo:
+    python benchmarks/bench_downsampling.py [largest number of points]
+Defaults to 10M points.
+"""
+
+import os
+import sys
+import time
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+
+from backend.downsampling import largest_triangle_three_buckets, minmax_lttb
+
+THRESHOLD = 2500
+VIEWPORT_WIDTH = 1200
+EQUIVALENCE_CASES = 300
+
+# bounds of the checks, in % of the y range of the data per pixel column
+TIE_MAX_ERROR = 2.0  # vectorized LTTB vs loop on quantized inputs
+ENVELOPE_MAX_ERROR = 1.0  # LTTB and MinMax-LTTB vs raw data, worst column
+ENVELOPE_MEAN_ERROR = 0.2  # LTTB and MinMax-LTTB vs raw data, mean over the columns
+
+
+def lttb_loop(data: np.ndarray, threshold: int) -> np.ndarray:
+    """ largest_triangle_three_buckets as it was before it was vectorized, kept here as the baseline """
+
+    data = np.asarray(data, dtype=float)
+    n = data.shape[0]
+    if threshold is None or threshold <= 0 or n <= threshold:
+        return data
+    x = data[:, 0]
+    y = data[:, 1]
+    sampled = np.empty((threshold, 2), dtype=float)
+    sampled[0] = data[0]
+    sampled[-1] = data[-1]
+    bucket_size = (n - 2) / (threshold - 2)
+    a_idx = 0
+    for i in range(1, threshold - 1):
+        range_start = int(np.floor((i - 1) * bucket_size)) + 1
+        range_end = min(int(np.floor(i * bucket_size)) + 1, n - 1)
+        if range_end <= range_start:
+            range_end = range_start + 1
+        idx_range = np.arange(range_start, range_end)
+        avg_start = int(np.floor(i * bucket_size)) + 1
+        avg_end = min(int(np.floor((i + 1) * bucket_size)) + 1, n)
+        if avg_end <= avg_start:
+            avg_end = avg_start + 1
+        cx = np.mean(x[avg_start:avg_end])
+        cy = np.mean(y[avg_start:avg_end])
+        ax, ay = x[a_idx], y[a_idx]
+        bx, by = x[idx_range], y[idx_range]
+        areas = np.abs((ax - cx) * (by - ay) - (ax - bx) * (cy - ay))
+        a_idx = idx_range[np.argmax(areas)]
+        sampled[i] = (x[a_idx], y[a_idx])
+    return sampled
+
+
+def make_signal(rng: np.random.Generator, points: int) -> np.ndarray:
+    """ A random walk with noise and a few spikes, timestamps at 200 Hz """
+
+    y = np.cumsum(rng.normal(size=points)) + rng.normal(scale=5, size=points)
+    spikes = rng.integers(0, points, size=max(1, points // 100_000))
+    y[spikes] += rng.choice((-1, 1), size=spikes.shape[0]) * 50 * y.std()
+    return np.column_stack((np.arange(points) / 200, y))
+
+
+def column_envelope(data: np.ndarray, x_range: tuple[float, float]) -> tuple[np.ndarray, np.ndarray]:
+    """ Min and max y drawn in each pixel column, columns without a point take the value of the line through them """
+
+    columns = np.minimum(((data[:, 0] - x_range[0]) / (x_range[1] - x_range[0]) * VIEWPORT_WIDTH).astype(np.int64),
+                         VIEWPORT_WIDTH - 1)
+    low = np.full(VIEWPORT_WIDTH, np.inf)
+    high = np.full(VIEWPORT_WIDTH, -np.inf)
+    np.minimum.at(low, columns, data[:, 1])
+    np.maximum.at(high, columns, data[:, 1])
+    centers = x_range[0] + (np.arange(VIEWPORT_WIDTH) + 0.5) / VIEWPORT_WIDTH * (x_range[1] - x_range[0])
+    line = np.interp(centers, data[:, 0], data[:, 1])
+    empty = ~np.isfinite(low)
+    low[empty] = high[empty] = line[empty]
+    return low, high
+
+
+def check_equivalence(rng: np.random.Generator) -> list[str]:
+    """ Runs the checks described at the top, returns a description of every failed one """
+
+    failures = []
+    mismatches = 0
+    worst = 0.0
+    for case in range(EQUIVALENCE_CASES):
+        points = int(rng.integers(3, 50_000))
+        threshold = int(rng.integers(3, 3000))
+        data = make_signal(rng, points)
+        quantized = case % 3 == 0
+        if quantized:  # lots of equal triangle areas
+            data[:, 1] = np.round(data[:, 1] / 10)
+        expected, result = lttb_loop(data, threshold), largest_triangle_three_buckets(data, threshold)
+        if np.array_equal(expected, result):
+            continue
+        mismatches += 1
+        if not quantized:
+            failures.append(f"case {case}: vectorized LTTB differs from the loop on float input ({points} points, threshold {threshold})")
+            continue
+        # np.mean sums pairwise, reduceat in order: the bucket averages can differ in the last bit, which only changes
+        # the pick between candidates with the same area
+        x_range = (data[0, 0], data[-1, 0])
+        difference = np.abs(np.concatenate(column_envelope(expected, x_range)) - np.concatenate(column_envelope(result, x_range)))
+        error = difference.max() / np.ptp(data[:, 1]) * 100
+        worst = max(worst, error)
+        if error > TIE_MAX_ERROR:
+            failures.append(f"case {case}: vectorized LTTB differs from the loop by {error:.2f} % on quantized input")
+    print(f"Vectorized LTTB vs loop: {EQUIVALENCE_CASES - mismatches}/{EQUIVALENCE_CASES} random inputs identical, "
+          f"the others (quantized, ties between equal areas) differ by at most {worst:.2f} % of the y range per pixel column")
+
+    for points in (100_000, 1_000_000):
+        data = make_signal(rng, points)
+        x_range = (data[0, 0], data[-1, 0])
+        y_range = np.ptp(data[:, 1])
+        raw_low, raw_high = column_envelope(data, x_range)
+        for name, downsample in (("LTTB", largest_triangle_three_buckets), ("MinMax-LTTB", minmax_lttb)):
+            low, high = column_envelope(downsample(data, THRESHOLD), x_range)
+            error = np.maximum(np.abs(low - raw_low), np.abs(high - raw_high)) / y_range * 100
+            print(f"  {points:>10,} points {name:12s} column min/max error vs raw data: "
+                  f"mean {error.mean():5.2f} %, max {error.max():6.2f} %")
+            if error.max() > ENVELOPE_MAX_ERROR or error.mean() > ENVELOPE_MEAN_ERROR:
+                failures.append(f"{name} at {points:,} points: column error mean {error.mean():.2f} %, max {error.max():.2f} %")
+    return failures
+
+
+def main():
+    largest = int(sys.argv[1]) if len(sys.argv) > 1 else 10_000_000
+    rng = np.random.default_rng(0)
+    failures = check_equivalence(rng)
+    if failures:
+        print(f"FAILED {len(failures)} checks:\n  " + "\n  ".join(failures[:10]) + ("\n  ..." if len(failures) > 10 else ""))
+        sys.exit(1)
+
+    print(f"Downsampling to {THRESHOLD} points, best of 3 (ms):")
+    print(f"  {'points':>12s} {'loop':>10s} {'vectorized':>12s} {'minmax':>10s}")
+    points = 10_000
+    while points <= largest:
+        data = make_signal(rng, points)
+        timings = []
+        for downsample in (lttb_loop, largest_triangle_three_buckets, minmax_lttb):
+            best = float("inf")
+            for _ in range(3):
+                start = time.perf_counter()
+                downsample(data, THRESHOLD)
+                best = min(best, time.perf_counter() - start)
+            timings.append(best * 1e3)
+        print(f"  {points:>12,} {timings[0]:10.1f} {timings[1]:12.1f} {timings[2]:10.1f}")
+        points *= 10
+
+
+if __name__ == "__main__":
+    main()
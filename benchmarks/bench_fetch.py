@@ -0,0 +1,93 @@
+"""
+Benchmark of reading a time range of a message table into NumPy, the way the graph endpoints do: through
+DbConnection.query() (one dict per row, then tuples, then np.array, what graph_view used to do), through
+cursor.fetchall() and np.array (one sqlite3.Row per row), and with DbConnection.fetch_range().
+
+Every method reads the same rows of a table with a timeStamp and SIGNALS signal columns (some NULL), the results are
+checked to be identical before timing. Peak memory is measured with tracemalloc in a separate run, since tracing slows
+everything down.
+
+Run from the root of the repo:
+    python benchmarks/bench_fetch.py [number of rows]
+Defaults to 1M rows.
+"""
+
+import os
+import sys
+import sqlite3
+import tempfile
+import time
+import tracemalloc
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+
+from backend.db_connection import DbConnection
+
+SIGNALS = 4
+TABLE = "BenchMessage"
+
+
+def make_database(path: str, rows: int) -> list[str]:
+    """ Writes a message table of `rows` rows at 100 Hz, about 1 % of the values NULL, returns the signal names """
+
+    rng = np.random.default_rng(0)
+    signals = [f"signal_{i}" for i in range(SIGNALS)]
+    values = rng.normal(size=(rows, SIGNALS))
+    values[rng.random(size=values.shape) < 0.01] = np.nan  # bound as NULL
+    conn = sqlite3.connect(path)
+    conn.execute(f"CREATE TABLE {TABLE} (timeStamp REAL, {', '.join(f'{signal} REAL' for signal in signals)})")
+    conn.executemany(f"INSERT INTO {TABLE} VALUES ({', '.join('?' * (SIGNALS + 1))})",
+                     zip((np.arange(rows) / 100).tolist(), *values.T.tolist()))
+    conn.execute(f"CREATE INDEX idx_{TABLE}_timeStamp ON {TABLE} (timeStamp)")
+    conn.commit()
+    conn.close()
+    return signals
+
+
+def read_dicts(db_conn: DbConnection, signals: list[str], end: float) -> np.ndarray:
+    results = db_conn.query(f"SELECT timeStamp, {', '.join(signals)} FROM {TABLE} WHERE timeStamp BETWEEN 0 AND {end} ORDER BY timeStamp")
+    return np.array([tuple(r[column] for column in ["timeStamp"] + signals) for r in results], dtype=float)
+
+
+def read_rows(db_conn: DbConnection, signals: list[str], end: float) -> np.ndarray:
+    db_conn.cur.execute(f"SELECT timeStamp, {', '.join(signals)} FROM {TABLE} WHERE timeStamp BETWEEN 0 AND {end} ORDER BY timeStamp")
+    return np.array(db_conn.cur.fetchall(), dtype=float)
+
+
+def read_fetch_range(db_conn: DbConnection, signals: list[str], end: float) -> np.ndarray:
+    return db_conn.fetch_range(TABLE, signals, 0, end)
+
+
+def main():
+    rows = int(sys.argv[1]) if len(sys.argv) > 1 else 1_000_000
+    end = rows / 100
+    methods = (("query() + dicts", read_dicts), ("fetchall() + np.array", read_rows), ("fetch_range()", read_fetch_range))
+
+    with tempfile.TemporaryDirectory() as directory:
+        DbConnection.setup_the_db_path(os.path.join(directory, "bench.db"))
+        signals = make_database(DbConnection.DB_path, rows)
+        db_conn = DbConnection(read_only=True)
+
+        expected = read_dicts(db_conn, signals, end)
+        for name, read in methods[1:]:
+            assert np.array_equal(read(db_conn, signals, end), expected, equal_nan=True), name
+        print(f"Reading {rows:,} rows of timeStamp + {SIGNALS} signals, all methods return identical arrays")
+
+        print(f"  {'method':24s} {'best of 3 (ms)':>15s} {'peak memory (MB)':>17s}")
+        for name, read in methods:
+            best = float("inf")
+            for _ in range(3):
+                start = time.perf_counter()
+                read(db_conn, signals, end)
+                best = min(best, time.perf_counter() - start)
+            tracemalloc.start()
+            read(db_conn, signals, end)
+            peak = tracemalloc.get_traced_memory()[1]
+            tracemalloc.stop()
+            print(f"  {name:24s} {best * 1e3:15.0f} {peak / 2**20:17.1f}")
+        del db_conn
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,91 @@
+"""
+Benchmark of the /get_visible_range response formats for a multi-signal view: JSON lists built point by point (what
+graph_view used to do), JSON lists from tolist(), and the binary format (graph_view.points_to_binary) with float32 and
+float64 y values. Reports the size of each body and the time to build it.
+
+The binary bodies are decoded again and checked against the points they were built from before timing.
+
+Run from the root of the repo:
+    python benchmarks/bench_graph_payload.py [number of signals]
+Defaults to 8 signals of 2500 points, the per-signal cap of graph_view.
+"""
+
+import json
+import os
+import struct
+import sys
+import time
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+
+from backend.sockio.graph_view import ABSOLUTE_POINT_CAP, points_to_binary, points_to_json
+
+REPEATS = 20
+
+
+def make_points(rng: np.random.Generator, signals: int) -> dict:
+    """ Downsampled looking series: irregular timestamps late in a log, values with full float precision """
+
+    points_by_signal = dict()
+    for i in range(signals):
+        x = 36000 + np.cumsum(rng.random(ABSOLUTE_POINT_CAP) * 0.2)
+        y = np.cumsum(rng.normal(size=ABSOLUTE_POINT_CAP)) * 3.7 + 100
+        points_by_signal[f"Message{i // 4}.signal_{i}"] = np.column_stack((x, y))
+    return points_by_signal
+
+
+def json_loop(points_by_signal: dict) -> bytes:
+    return json.dumps({"status": "success", "signals": {sid: {'x': [float(pt[0]) for pt in ds], 'y': [float(pt[1]) for pt in ds]}
+                                                        for sid, ds in points_by_signal.items()}}).encode()
+
+
+def json_tolist(points_by_signal: dict) -> bytes:
+    return json.dumps({"status": "success", "signals": points_to_json(points_by_signal)}).encode()
+
+
+def decode_binary(body: bytes) -> dict:
+    """ The Python equivalent of decodeBinaryRange() in graph_view.js """
+
+    header_length = struct.unpack_from("<I", body)[0]
+    header = json.loads(body[4:4 + header_length])
+    value_type = "<f4" if header["value_type"] == "float32" else "<f8"
+    offset = 4 + header_length
+    xs = dict()
+    for signal in header["signals"]:
+        xs[signal["id"]] = np.frombuffer(body, "<f8", signal["points"], offset)
+        offset += signal["points"] * 8
+    decoded = dict()
+    for signal in header["signals"]:
+        y = np.frombuffer(body, value_type, signal["points"], offset)
+        offset += y.nbytes
+        decoded[signal["id"]] = np.column_stack((xs[signal["id"]], y))
+    return decoded
+
+
+def main():
+    signals = int(sys.argv[1]) if len(sys.argv) > 1 else 8
+    points_by_signal = make_points(np.random.default_rng(0), signals)
+
+    for value_type in ("float32", "float64"):
+        decoded = decode_binary(points_to_binary(points_by_signal, value_type))
+        for sid, points in points_by_signal.items():
+            assert np.array_equal(decoded[sid][:, 0], points[:, 0]), sid
+            assert np.array_equal(decoded[sid][:, 1], points[:, 1].astype(value_type).astype(float)), sid
+    print(f"{signals} signals of {ABSOLUTE_POINT_CAP} points, binary bodies decode to the same points")
+
+    formats = (("JSON, per point", json_loop), ("JSON, tolist()", json_tolist),
+               ("binary float32", lambda points: points_to_binary(points, "float32")),
+               ("binary float64", lambda points: points_to_binary(points, "float64")))
+    print(f"  {'format':18s} {'size (kB)':>10s} {'build, best of %d (ms)' % REPEATS:>24s}")
+    for name, build in formats:
+        best = float("inf")
+        for _ in range(REPEATS):
+            start = time.perf_counter()
+            body = build(points_by_signal)
+            best = min(best, time.perf_counter() - start)
+        print(f"  {name:18s} {len(body) / 1024:10.1f} {best * 1e3:24.2f}")
+
+
+if __name__ == "__main__":
+    main()
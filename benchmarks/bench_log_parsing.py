@@ -0,0 +1,73 @@
+"""
+Benchmark of log file parsing: LogParser.parse_line on every line vs. the memory mapped scan_logfile fast path.
+Also reports the peak Python memory of each, scan_logfile's should not grow with the file size.
+
+Run from the root of the repo:
+    python benchmarks/bench_log_parsing.py [log file]
+Without a log file, a synthetic one with 1M lines is written to a temporary directory.
+"""
+
+import os
+import random
+import sys
+import tempfile
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+
+from backend.input.logfile_producer import LogParser, scan_logfile
+
+
+def write_synthetic_log(path: str, lines: int) -> None:
+    """ Writes a log in the same format as the car's, 200 frames per second with a mix of hex and decimal IDs """
+
+    rng = random.Random(0)
+    with open(path, "w") as file:
+        for i in range(lines):
+            seconds = 8 * 3600 + i // 200
+            id = rng.randrange(0x100, 0x800)
+            id_str = hex(id) if i % 2 else str(id)
+            file.write(f"{seconds // 3600:02d}:{seconds // 60 % 60:02d}:{seconds % 60:02d} [INFO] CAN: ID {id_str} "
+                       f"Length 8 Data 0x{rng.randbytes(8).hex().upper()}\n")
+
+
+def bench_parse_line(path: str) -> tuple[int, float]:
+    parser = LogParser()
+    frames = 0
+    start = time.perf_counter()
+    with open(path, "r") as file:
+        for line in file:
+            if parser.parse_line(line) is not None:
+                frames += 1
+    return frames, time.perf_counter() - start
+
+
+def bench_scan_logfile(path: str) -> tuple[int, float]:
+    frames = 0
+    start = time.perf_counter()
+    for seconds, ids, payloads in scan_logfile(path):
+        frames += seconds.shape[0]
+    return frames, time.perf_counter() - start
+
+
+def main():
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        path = sys.argv[1] if len(sys.argv) > 1 else os.path.join(tmp_dir, "synthetic.log")
+        if len(sys.argv) <= 1:
+            write_synthetic_log(path, 1_000_000)
+        with open(path, "rb") as file:
+            lines = sum(1 for _ in file)
+        print(f"{path}: {os.path.getsize(path) / 1e6:.1f} MB, {lines} lines")
+
+        for name, bench in (("parse_line", bench_parse_line), ("scan_logfile", bench_scan_logfile)):
+            frames, seconds = bench(path)
+            tracemalloc.start()
+            bench(path)
+            peak = tracemalloc.get_traced_memory()[1]
+            tracemalloc.stop()
+            print(f"{name:13s} {lines / seconds:12,.0f} lines/sec, {frames} frames, peak Python memory {peak / 1e6:.1f} MB")
+
+
+if __name__ == "__main__":
+    main()
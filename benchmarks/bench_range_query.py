@@ -0,0 +1,85 @@
+"""
+Benchmark of the queries that depend on the timeStamp index: graph_view's range query
+(WHERE timeStamp BETWEEN ... ORDER BY timeStamp) and the dashboard's latest row (ORDER BY timeStamp DESC LIMIT 1),
+on a message table without and with the index that DbConnection.create_time_indexes() builds.
+
+Run from the root of the repo:
+    python benchmarks/bench_range_query.py [number of rows]
+Defaults to 10M rows, 200 per second of log, written to a temporary database.
+"""
+
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+
+from backend.db_connection import DbConnection
+
+ROWS_PER_SECOND = 200
+RANGE_SECONDS = (1, 10, 60)  # widths of the queried windows
+REPEATS = 20
+
+
+def fill_table(db_conn: DbConnection, rows: int) -> None:
+    db_conn.cur.execute('CREATE TABLE BenchMessage (count INTEGER PRIMARY KEY AUTOINCREMENT, speed INTEGER, '
+                        'voltage INTEGER, current INTEGER, timeStamp REAL)')
+    rng = random.Random(0)
+    chunk = 100_000
+    for start in range(0, rows, chunk):
+        db_conn.cur.executemany('INSERT INTO BenchMessage (speed, voltage, current, timeStamp) VALUES (?, ?, ?, ?)',
+                                ((rng.randrange(100), rng.random() * 150, rng.random() * 40, i / ROWS_PER_SECOND)
+                                 for i in range(start, min(start + chunk, rows))))
+    db_conn.conn.commit()
+
+
+def time_query(db_conn: DbConnection, sql: str, params: tuple = ()) -> tuple[float, int]:
+    start = time.perf_counter()
+    db_conn.cur.execute(sql, params)
+    fetched = len(db_conn.cur.fetchall())
+    return time.perf_counter() - start, fetched
+
+
+def run_queries(db_conn: DbConnection, rows: int) -> None:
+    rng = random.Random(1)
+    duration = rows / ROWS_PER_SECOND
+    for width in RANGE_SECONDS:
+        latencies = []
+        for _ in range(REPEATS):
+            low = rng.uniform(0, max(duration - width, 0))
+            latency, fetched = time_query(db_conn, 'SELECT speed, timeStamp FROM BenchMessage WHERE timeStamp BETWEEN '
+                                                   '? AND ? ORDER BY timeStamp', (low, low + width))
+            latencies.append(latency)
+        print(f"  {width:3d} s range ({fetched:6d} rows) median {statistics.median(latencies) * 1e3:10.2f} ms")
+
+    latencies = [time_query(db_conn, 'SELECT * FROM BenchMessage ORDER BY timeStamp DESC LIMIT 1')[0]
+                 for _ in range(REPEATS)]
+    print(f"  latest row                  median {statistics.median(latencies) * 1e3:10.2f} ms")
+
+
+def main():
+    rows = int(sys.argv[1]) if len(sys.argv) > 1 else 10_000_000
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        DbConnection.setup_the_db_path(os.path.join(tmp_dir, "bench.db"))
+        with DbConnection.writer() as db_conn:
+            start = time.perf_counter()
+            fill_table(db_conn, rows)
+            print(f"Inserted {rows:,} rows in {time.perf_counter() - start:.1f} s")
+
+            print("Without index:")
+            run_queries(db_conn, rows)
+
+            start = time.perf_counter()
+            db_conn.create_time_indexes()
+            print(f"Built index in {time.perf_counter() - start:.1f} s")
+
+            print("With index:")
+            run_queries(db_conn, rows)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,72 +1,428 @@
 from backend.db_connection import DbConnection
 from backend.can_message import CanMessage
+from backend.alert_state import AlertState, AlertEpisode
+from backend.alert_expressions import AlertExpression
 from backend.sockio.socket import socketio
+import backend.dbcs as dbcs
 from backend.dbcs import get_fault_signals
 from datetime import datetime
+import numpy as np
+import threading
+import operator
+import time
 import json
 
+# comparison operators an int/double alert can use. They work on single values as well as element wise on NumPy columns
+COMPARISON_OPERATORS = {"<": operator.lt, "<=": operator.le, ">": operator.gt, ">=": operator.ge, "==": operator.eq, "!=": operator.ne}
+
+# type of the threshold values of each alert type that has comparisons
+THRESHOLD_TYPES = {"int": int, "double": float}
+
+# message name -> (fault signals of that message, active alerts on its signals), built from the Alerts table and the
+# DBCs on first use (see getMessageAlerts). Alert definitions in it are already compiled, see compileAlert()
+alert_registry = None
+alert_registry_source = None  # (database path, DBCs) the registry was built for
+alert_registry_lock = threading.Lock()
+NO_ALERTS = ([], [])
+
+# (alert id, message name, signal, comparison index) -> AlertState, fault signals use an alert id of -1. Held for the
+# whole check of a batch, checks run one at a time
+alert_states = dict()
+alert_states_lock = threading.RLock()
+
+# alert id -> AlertExpression of an expression alert. Kept across registry rebuilds (like alert_states) so the windows of
+# the expression are not emptied whenever another alert is created, guarded by alert_states_lock
+expression_states = dict()
+
+# hold-off and hysteresis (seconds, see alert_state.py) of the auto faults
+FAULT_HOLDOFF = 0.0
+FAULT_HYSTERESIS = 0.0
+
+# a popup is sent at most once per this many (wall clock) seconds for the same alert, the rows are still recorded
+POPUP_MIN_INTERVAL = 1.0
+last_popup_times = dict()  # popup message -> time.monotonic() it was last sent
+
 
 def fetchActiveAlerts():
     """
     Fetches all active alerts from the database
     """
 
-    logger_db = DbConnection()
-    query = "SELECT * FROM Alerts"
-    alerts = logger_db.query(query)
+    with DbConnection.reader() as logger_db:
+        query = "SELECT * FROM Alerts"
+        alerts = logger_db.query(query)
     return alerts
 
 
-def checkAlertsAgainstCanMsg(can_message: CanMessage, raw_data: bytes): 
-    """
-    Checks the given CAN message against all active alerts
-    """
-    
-    logger_db = DbConnection()
-    
-    # Get all fault signals dynamically from DBC files
-    all_faults = get_fault_signals()
-
-    for fault in all_faults:
-        if (fault in can_message.sigDict and can_message.sigDict[fault] == 1):
-            logger_db.add_triggered_alert(-1, "", datetime.now().strftime('%Y-%m-%d %H:%M:%S'), can_message.messageId, raw_data, can_message.timeStamp, fault, "AUTO FAULT")
-
-            socketio.emit('big_popup_event', {
-                'message': f"Auto Fault Triggered: {fault}"
-            })
-
-    activeAlerts = fetchActiveAlerts()
-    for alert in activeAlerts:
-        signal = alert['field']
-        alertType = alert['type']
-        category = alert['category']
-
-        if alertType == 'bool':
-            bool_value = json.loads(alert['bool_value'])
-            if signal in can_message.sigDict and can_message.sigDict[signal] == bool_value:
-               
-                fail_cause = f"BOOL Alert {alert['name']} triggered: {can_message.sigDict[signal]} == {bool_value}"
-                logger_db.add_triggered_alert(alert['id'], category, datetime.now().strftime('%Y-%m-%d %H:%M:%S'), can_message.messageId, raw_data, can_message.timeStamp, signal, fail_cause)
-
-                socketio.emit('big_popup_event', {
-                    'message': f"Boolean Alert Triggered: {alert['name']}!"
-                })
-        
-        elif alertType == 'int':
-            comparisons = json.loads(alert['comparisons_json'])
-            for comparison in comparisons:
-                if (signal in can_message.sigDict):
-                    decoded_val = int(can_message.sigDict[signal])
-                    comp_val = int(comparison['value'])
-                    operator = comparison['operator']
-
-                    # the alert condition was not met, so no alert should be triggered
-                    if not eval(f"{decoded_val} {operator} {comp_val}"):
-                        continue                        
-
-                    # the alert condition was met, so trigger the alert
-                    fail_cause = f"{decoded_val} {comparison['operator']} {comp_val}"
-                    logger_db.add_triggered_alert(alert['id'], category, datetime.now().strftime('%Y-%m-%d %H:%M:%S'), can_message.messageId, raw_data, can_message.timeStamp, signal, fail_cause)
-                    socketio.emit('big_popup_event', {
-                        'message': f"INT Alert {alert['name']} triggered: {decoded_val} != {comp_val}"
-                    })
\ No newline at end of file
+def invalidateAlertRegistry() -> None:
+    """ Must be called whenever the Alerts table changes, the registry is rebuilt on the next check """
+
+    global alert_registry
+    with alert_registry_lock:
+        alert_registry = None
+
+
+def deleteAlert(alert_id: int) -> None:
+    """
+    Deletes an alert, clears its open TriggeredAlerts episodes and drops its edge detection and expression state. Holds
+    alert_states_lock throughout, so no check can recreate the state from the registry of before the delete
+    """
+    with alert_states_lock:
+        with DbConnection.writer() as logger_db:
+            logger_db.delete_alert(alert_id)
+        invalidateAlertRegistry()
+        for key in [key for key in alert_states if key[0] == alert_id]:
+            del alert_states[key]
+        expression_states.pop(alert_id, None)
+
+
+def getMessageAlerts(message_name: str) -> tuple[list[str], list[dict]]:
+    """
+    Returns the fault signal names and the active alerts that belong to one message type, in constant time
+
+    @param message_name: The name of the message as defined in the DBCs
+    @return: (fault signal names, alert definitions), alerts are in the order they were created
+    """
+    global alert_registry, alert_registry_source
+    source = (DbConnection.DB_path, dbcs.DBCs)
+    registry = alert_registry
+    if registry is None or alert_registry_source[0] != source[0] or alert_registry_source[1] is not source[1]:
+        with alert_registry_lock:  # held while building, so an invalidation can not be lost in the meantime
+            if alert_registry is None or alert_registry_source != source:
+                if alert_registry_source != source:
+                    with alert_states_lock:  # a different database or DBCs, nothing is active there yet
+                        alert_states.clear()
+                        expression_states.clear()
+                alert_registry, alert_registry_source = _buildAlertRegistry(), source
+            registry = alert_registry
+    return registry.get(message_name, NO_ALERTS)
+
+
+def compileComparisons(alert_type: str, comparisons: list[dict]) -> list[tuple]:
+    """
+    Turns the comparisons of an int/double alert into predicates, raises ValueError if one is invalid
+
+    @param alert_type: 'int' or 'double', decides the type of the thresholds
+    @param comparisons: list of {"operator": "<", "value": 3.0} dictionaries, as sent to /create_alert
+    @return: list of (operator symbol, operator function, threshold) tuples, the alert triggers if
+    function(signal value, threshold) is true for any of them
+    """
+    threshold_type = THRESHOLD_TYPES.get(alert_type)
+    if threshold_type is None:
+        raise ValueError(f"Alert type '{alert_type}' has no comparisons")
+
+    predicates = []
+    for comparison in comparisons:
+        symbol = comparison.get('operator')
+        if symbol not in COMPARISON_OPERATORS:
+            raise ValueError(f"Unknown comparison operator '{symbol}'")
+        try:
+            threshold = threshold_type(comparison.get('value'))
+        except (TypeError, ValueError):
+            raise ValueError(f"Invalid {alert_type} threshold '{comparison.get('value')}'")
+        predicates.append((symbol, COMPARISON_OPERATORS[symbol], threshold))
+    return predicates
+
+
+def parseBoolValue(value) -> bool:
+    """
+    The value of a bool alert, given as a bool or as the "true"/"false" the alert manager sends. Raises ValueError for
+    anything else
+    """
+
+    if isinstance(value, bool):
+        return value
+    if value in ('true', 'false'):
+        return value == 'true'
+    raise ValueError(f"Bool alert value must be true or false, not {value!r}")
+
+
+def compileAlert(alert: dict) -> dict:
+    """
+    Adds the parsed definition to an Alerts table row: 'bool_value' becomes a bool for bool alerts, int/double alerts
+    get 'predicates' (see compileComparisons) and expression alerts get an 'evaluator' (an AlertExpression). Alerts of
+    an unknown type get no predicates and never trigger. 'holdoff' and 'hysteresis' become floats, 0 if not set.
+    """
+    alert['holdoff'] = float(alert.get('holdoff') or 0)
+    alert['hysteresis'] = float(alert.get('hysteresis') or 0)
+    if alert['type'] == 'expression':
+        alert['evaluator'] = AlertExpression(alert.get('expression') or '')
+        alert['predicates'] = []
+    elif alert['type'] == 'bool':
+        alert['bool_value'] = parseBoolValue(alert['bool_value'])
+        alert['predicates'] = []
+    elif alert['type'] in THRESHOLD_TYPES and alert['comparisons_json']:
+        alert['predicates'] = compileComparisons(alert['type'], json.loads(alert['comparisons_json']))
+    else:
+        alert['predicates'] = []
+    return alert
+
+
+def _buildAlertRegistry() -> dict:
+    """ Builds the alert registry (see alert_registry) from the Alerts table and the DBCs """
+
+    alerts_by_signal = dict()
+    for alert in fetchActiveAlerts():
+        try:
+            compileAlert(alert)
+        except (TypeError, ValueError) as e:  # stored before alerts were validated on creation, skip instead of failing every check
+            print(f"[ALERTS] Ignoring alert {alert['name']}: {e}")
+            continue
+        # an expression alert belongs to every message that has one of its signals
+        for signal in alert['evaluator'].signals if alert['type'] == 'expression' else [alert['field']]:
+            alerts_by_signal.setdefault(signal, []).append(alert)
+
+    fault_signals = set(get_fault_signals())
+    registry = dict()
+    for dbc in dbcs.DBCs:
+        for message in dbc.messages:
+            if message.name in registry:
+                continue
+            signal_names = [signal.name for signal in message.signals]
+            faults = [signal for signal in signal_names if signal in fault_signals]
+            alerts = {alert['id']: alert for signal in signal_names for alert in alerts_by_signal.get(signal, [])}
+            alerts = sorted(alerts.values(), key=lambda alert: alert['id'])
+            if faults or alerts:
+                registry[message.name] = (faults, alerts)
+    return registry
+
+
+def checkAlertsAgainstCanMsg(can_message: CanMessage, raw_data: bytes) -> int:
+    """
+    Checks the given CAN message against the fault signals and active alerts of its message type
+    """
+
+    can_message.rawData = raw_data
+    return checkAlertsAgainstCanMsgs([can_message])
+
+
+def checkAlertsAgainstCanMsgs(can_messages: list[CanMessage]) -> int:
+    """
+    Checks a batch of CAN messages against the fault signals and active alerts of their message types. An alert only
+    triggers on the rising edge of its condition, repeats update the count and last_seen of the same TriggeredAlerts
+    row (see alert_state.py). All changes are written in one transaction and at most one popup is sent per alert.
+
+    @param can_messages: decoded messages in the order they were received, their rawData is stored with the triggered alerts
+    @return: the number of alerts that triggered
+    """
+    with alert_states_lock:
+        batch = AlertBatch()
+
+        for can_message in can_messages:
+            message_name = can_message.messageName
+            message_faults, message_alerts = getMessageAlerts(message_name)
+            signals = can_message.sigDict
+            timestamp = can_message.timeStamp
+
+            def start(alert_id, category, signal, fail_cause, popup):
+                row = (alert_id, category, batch.now, can_message.messageId, can_message.rawData, timestamp, signal, fail_cause)
+                return batch.start(row, timestamp, popup)
+
+            for fault in message_faults:
+                if fault in signals:
+                    state = getAlertState((-1, message_name, fault, 0), FAULT_HOLDOFF, FAULT_HYSTERESIS)
+                    state.observe(signals[fault] == 1, timestamp, batch.changed,
+                                  lambda: start(-1, "", fault, "AUTO FAULT", f"Auto Fault Triggered: {fault}"))
+
+            for alert in message_alerts:
+                if alert['type'] == 'expression':
+                    expression = getExpressionState(alert)
+                    condition = expression.update(signals, timestamp)
+                    if condition is not None:
+                        state = getAlertState((alert['id'], None, None, 0), alert['holdoff'], alert['hysteresis'])
+                        state.observe(condition, timestamp, batch.changed,
+                                      lambda: start(alert['id'], alert['category'], alert['field'], f"{expression.source}: {expression.describe()}",
+                                                    f"EXPRESSION Alert {alert['name']} triggered: {expression.source}"))
+                    continue
+
+                signal = alert['field']
+                if signal not in signals:
+                    continue
+                decoded_val = signals[signal]
+
+                if alert['type'] == 'bool':
+                    state = getAlertState((alert['id'], message_name, signal, 0), alert['holdoff'], alert['hysteresis'])
+                    fail_cause = f"BOOL Alert {alert['name']} triggered: {decoded_val} == {alert['bool_value']}"
+                    state.observe(decoded_val == alert['bool_value'], timestamp, batch.changed,
+                                  lambda: start(alert['id'], alert['category'], signal, fail_cause, f"Boolean Alert Triggered: {alert['name']}!"))
+                    continue
+
+                for index, (symbol, compare, comp_val) in enumerate(alert['predicates']):
+                    state = getAlertState((alert['id'], message_name, signal, index), alert['holdoff'], alert['hysteresis'])
+                    state.observe(compare(decoded_val, comp_val), timestamp, batch.changed,
+                                  lambda: start(alert['id'], alert['category'], signal, f"{decoded_val} {symbol} {comp_val}",
+                                                f"{alert['type'].upper()} Alert {alert['name']} triggered: {symbol} {comp_val}"))
+
+        return batch.flush()
+
+
+def checkAlertsAgainstColumns(message_name: str, columns: dict, frame_ids: np.ndarray, payloads: np.ndarray) -> int:
+    """
+    Checks a batch of decoded rows of one message type (see batch_decode.decode_batch) against the fault signals and all
+    active alerts, with the same rules as checkAlertsAgainstCanMsgs. Rows must be in the order they were received.
+
+    @param message_name: The name of the message all rows belong to
+    @param columns: dictionary of signal names (and 'timeStamp') to equal length NumPy arrays
+    @param frame_ids: The raw frame ID of each row
+    @param payloads: uint8 array of shape (rows, 8) with each row's payload
+    @return: the number of alerts that triggered
+    """
+    timestamps = columns["timeStamp"]
+
+    with alert_states_lock:
+        batch = AlertBatch()
+
+        def observe(key, holdoff, hysteresis, condition, present, fail_cause, popup, alert_id, category, signal):
+            """ Feeds the rows where the signal is present to the condition's state, fail_cause(row) builds the text """
+
+            rows = np.flatnonzero(present) if present is not None else None
+            def start(index):
+                row = rows[index] if rows is not None else index
+                triggered = (alert_id, category, batch.now, int(frame_ids[row]), payloads[row].tobytes(), float(timestamps[row]), signal, fail_cause(row))
+                return batch.start(triggered, float(timestamps[row]), popup)
+
+            state = getAlertState(key, holdoff, hysteresis)
+            if rows is None:
+                state.observe_rows(condition, timestamps, batch.changed, start)
+            elif rows.size:
+                state.observe_rows(condition[rows], timestamps[rows], batch.changed, start)
+
+        message_faults, message_alerts = getMessageAlerts(message_name)
+
+        for fault in message_faults:
+            if fault not in columns:
+                continue
+            values = columns[fault]
+            present = ~np.isnan(values) if values.dtype.kind == 'f' else None  # NaN marks an inactive multiplexed signal
+            observe((-1, message_name, fault, 0), FAULT_HOLDOFF, FAULT_HYSTERESIS, values == 1, present,
+                    lambda row: "AUTO FAULT", f"Auto Fault Triggered: {fault}", -1, "", fault)
+
+        for alert in message_alerts:
+            signal = alert['field']
+            if alert['type'] == 'expression' or signal not in columns:  # expressions: see checkExpressionAlertsAgainstGroups
+                continue
+            values = columns[signal]
+            present = ~np.isnan(values) if values.dtype.kind == 'f' else None
+
+            if alert['type'] == 'bool':
+                bool_value = alert['bool_value']
+                observe((alert['id'], message_name, signal, 0), alert['holdoff'], alert['hysteresis'], values == bool_value, present,
+                        lambda row: f"BOOL Alert {alert['name']} triggered: {values[row].item()} == {bool_value}",
+                        f"Boolean Alert Triggered: {alert['name']}!", alert['id'], alert['category'], signal)
+                continue
+
+            for index, (symbol, compare, comp_val) in enumerate(alert['predicates']):
+                observe((alert['id'], message_name, signal, index), alert['holdoff'], alert['hysteresis'], compare(values, comp_val), present,
+                        lambda row: f"{values[row].item()} {symbol} {comp_val}",
+                        f"{alert['type'].upper()} Alert {alert['name']} triggered: {symbol} {comp_val}", alert['id'], alert['category'], signal)
+
+        return batch.flush()
+
+
+def checkExpressionAlertsAgainstGroups(groups: dict) -> int:
+    """
+    Checks the decoded rows of several message types against the expression alerts that use their signals. An expression
+    can combine signals of different messages, so the rows of those messages are fed to it merged back into the order
+    they were received. Rows of messages no expression uses are not looked at.
+
+    @param groups: {message name: (columns, rows, frame IDs, payloads)} of one chunk, as in checkAlertsAgainstColumns.
+    rows gives the position of each row in the chunk, which decides the merged order
+    @return: the number of alerts that triggered
+    """
+    with alert_states_lock:
+        # (message name, expression alerts of that message) for the messages in this chunk that have any
+        involved = [(name, [alert for alert in getMessageAlerts(name)[1] if alert['type'] == 'expression']) for name in groups]
+        involved = [(name, alerts) for name, alerts in involved if alerts]
+        if not involved:
+            return 0
+
+        batch = AlertBatch()
+        positions = np.concatenate([groups[name][1] for name, _ in involved])
+        sources = np.repeat(np.arange(len(involved)), [len(groups[name][1]) for name, _ in involved])
+        local_rows = np.concatenate([np.arange(len(groups[name][1])) for name, _ in involved])
+        order = np.argsort(positions, kind='stable')
+
+        # per message: (columns as lists, frame IDs, payloads, [(alert, expression, its signals in this message)])
+        feeds = []
+        for name, alerts in involved:
+            columns, _, frame_ids, payloads = groups[name]
+            expressions = [(alert, getExpressionState(alert)) for alert in alerts]
+            used = {signal for _, expression in expressions for signal in expression.signals if signal in columns}
+            values = {signal: columns[signal].tolist() for signal in used}
+            values['timeStamp'] = columns['timeStamp'].tolist()
+            feeds.append((values, frame_ids, payloads, [(alert, expression, [signal for signal in expression.signals if signal in values])
+                                                        for alert, expression in expressions]))
+
+        for source, row in zip(sources[order].tolist(), local_rows[order].tolist()):
+            values, frame_ids, payloads, expressions = feeds[source]
+            timestamp = values['timeStamp'][row]
+
+            for alert, expression, signals in expressions:
+                condition = expression.update({signal: values[signal][row] for signal in signals}, timestamp)
+                if condition is None:
+                    continue
+
+                def start():
+                    triggered = (alert['id'], alert['category'], batch.now, int(frame_ids[row]), payloads[row].tobytes(), timestamp,
+                                 alert['field'], f"{expression.source}: {expression.describe()}")
+                    return batch.start(triggered, timestamp, f"EXPRESSION Alert {alert['name']} triggered: {expression.source}")
+
+                state = getAlertState((alert['id'], None, None, 0), alert['holdoff'], alert['hysteresis'])
+                state.observe(condition, timestamp, batch.changed, start)
+
+        return batch.flush()
+
+
+def getExpressionState(alert: dict) -> AlertExpression:
+    """ Returns the evaluator of an expression alert that keeps its state across checks, see expression_states """
+
+    expression = expression_states.get(alert['id'])
+    if expression is None or expression.source != alert['evaluator'].source:
+        expression = expression_states[alert['id']] = alert['evaluator']
+    return expression
+
+
+def getAlertState(key: tuple, holdoff: float, hysteresis: float) -> AlertState:
+    """ Returns the edge detection state of one alert condition, see alert_states """
+
+    state = alert_states.get(key)
+    if state is None:
+        state = alert_states[key] = AlertState(holdoff, hysteresis)
+    return state
+
+
+class AlertBatch:
+    """ The TriggeredAlerts changes and popups of one check, written and sent at once by flush() """
+
+    def __init__(self):
+        self.now = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+        self.changed = dict()  # AlertEpisode -> None, episodes that were started, updated or cleared, in order
+        self.popups = dict()  # popup message -> number of times it triggered
+        self.triggered = 0
+
+
+    def start(self, row: tuple, timestamp: float, popup: str) -> AlertEpisode:
+        self.triggered += 1
+        self.popups[popup] = self.popups.get(popup, 0) + 1
+        return AlertEpisode(row, timestamp)
+
+
+    def flush(self) -> int:
+        """ Writes the changed episodes in one transaction and sends the popups, returns the number of triggered alerts """
+
+        if self.changed:
+            episodes = list(self.changed)
+            new_episodes = [episode for episode in episodes if episode.id is None]
+            updates = [(episode.count, episode.last_seen, episode.cleared_at, episode.id) for episode in episodes if episode.id is not None]
+            with DbConnection.writer() as db_conn:
+                ids = db_conn.save_triggered_alerts([episode.row + (episode.count, episode.last_seen, episode.cleared_at) for episode in new_episodes], updates)
+            for episode, id in zip(new_episodes, ids):
+                episode.id = id
+
+        now = time.monotonic()
+        for popup, count in self.popups.items():
+            if now - last_popup_times.get(popup, -POPUP_MIN_INTERVAL) < POPUP_MIN_INTERVAL:
+                continue
+            last_popup_times[popup] = now
+            socketio.emit('big_popup_event', {'message': f"{popup} ({count}x)" if count > 1 else popup})
+        return self.triggered
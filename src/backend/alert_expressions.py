@@ -0,0 +1,228 @@
+# Alert expressions: conditions over one or more signals, e.g.
+#     mean(pack_current, 2) > 150
+#     rate(cell_temp) > 0.5
+#     pack_voltage > 10 and is_charging == 0
+# An expression is parsed once with Python's ast module (only the constructs below are allowed, nothing is ever eval'd)
+# and compiled into closures. Every window function keeps its own running state, so feeding a sample costs O(1)
+# (amortized, old samples leave a window at most once) no matter how long the window is.
+#
+#     signals                  bare signal names as defined in the DBCs, the latest value received is used
+#     numbers, True, False
+#     + - * / and unary -      arithmetic
+#     < <= > >= == !=          comparisons, can be chained (0 < soc < 20)
+#     and, or, not
+#     abs(x)
+#     mean(signal, seconds)    mean of the samples of the last `seconds` seconds
+#     rate(signal)             change per second between the last two samples
+#     rate(signal, seconds)    change per second over the samples of the last `seconds` seconds
+import ast
+import operator
+from collections import deque
+
+BINARY_OPERATORS = {ast.Add: operator.add, ast.Sub: operator.sub, ast.Mult: operator.mul, ast.Div: operator.truediv}
+COMPARE_OPERATORS = {ast.Lt: operator.lt, ast.LtE: operator.le, ast.Gt: operator.gt, ast.GtE: operator.ge, ast.Eq: operator.eq, ast.NotEq: operator.ne}
+WINDOW_FUNCTIONS = ("mean", "rate")
+
+# longest window a function may use, bounds the memory of a window to this many seconds of samples
+MAX_WINDOW_SECONDS = 600
+
+
+class RollingMean:
+    """ Mean of the samples within the last `seconds` seconds, with a running sum """
+
+    def __init__(self, seconds: float):
+        self.seconds = seconds
+        self.samples = deque()
+        self.total = 0.0
+
+    def add(self, timestamp: float, value: float) -> None:
+        self.samples.append((timestamp, value))
+        self.total += value
+        while self.samples[0][0] <= timestamp - self.seconds:
+            self.total -= self.samples.popleft()[1]
+
+    def value(self) -> float:
+        return self.total / len(self.samples) if self.samples else None
+
+
+class RateOfChange:
+    """ Change per second between the last two samples, or between the oldest and newest sample of a time window """
+
+    def __init__(self, seconds: float = None):
+        self.seconds = seconds
+        self.samples = deque()
+
+    def add(self, timestamp: float, value: float) -> None:
+        self.samples.append((timestamp, value))
+        if self.seconds is None:
+            if len(self.samples) > 2:
+                self.samples.popleft()
+            return
+        while len(self.samples) > 2 and self.samples[0][0] < timestamp - self.seconds:
+            self.samples.popleft()
+
+    def value(self) -> float:
+        if len(self.samples) < 2:
+            return None
+        (first_time, first_value), (last_time, last_value) = self.samples[0], self.samples[-1]
+        if last_time == first_time:
+            return None
+        return (last_value - first_value) / (last_time - first_time)
+
+
+class AlertExpression:
+    """
+    A compiled alert expression and its state (latest signal values and window contents). Raises ValueError if the
+    source is not a valid expression. Feed it every frame that contains one of its signals, in time order, with update()
+    """
+
+    def __init__(self, source: str):
+        self.source = source.strip()
+        try:
+            tree = ast.parse(self.source, mode="eval")
+        except SyntaxError as e:
+            raise ValueError(f"Invalid expression '{self.source}': {e.msg}")
+
+        self.values = dict()  # signal name -> latest value
+        self.windows = dict()  # signal name -> window functions of that signal
+        self.signals = set()
+        self.evaluate = self.__compile(tree.body)
+        if not self.signals:
+            raise ValueError(f"Expression '{self.source}' does not use any signal")
+
+
+    def update(self, signals: dict, timestamp: float) -> bool:
+        """
+        Takes the values of this expression's signals from one frame and evaluates the expression
+
+        @param signals: signal name -> value of one frame, other signals are ignored
+        @return: whether the condition holds, None while a signal or window has no value yet
+        """
+        for name in self.signals:
+            value = signals.get(name)
+            if value is None or value != value:  # not in this frame, or NaN (inactive multiplexed signal)
+                continue
+            self.values[name] = value
+            for window in self.windows.get(name, ()):
+                window.add(timestamp, value)
+
+        result = self.evaluate()
+        return None if result is None else bool(result)
+
+
+    def describe(self) -> str:
+        """ The current values of the expression's signals, for the fail cause of a triggered alert """
+
+        return ", ".join(f"{name}={self.values.get(name)}" for name in sorted(self.signals))
+
+
+    def __compile(self, node):
+        """ Returns a function without arguments that evaluates the node, None propagates through everything """
+
+        if isinstance(node, ast.Constant) and isinstance(node.value, (int, float, bool)):
+            value = node.value
+            return lambda: value
+
+        if isinstance(node, ast.Name):
+            name = node.id
+            self.signals.add(name)
+            values = self.values
+            return lambda: values.get(name)
+
+        if isinstance(node, ast.UnaryOp) and isinstance(node.op, (ast.USub, ast.UAdd, ast.Not)):
+            operand = self.__compile(node.operand)
+            if isinstance(node.op, ast.Not):
+                return lambda: _apply(operator.not_, operand())
+            if isinstance(node.op, ast.USub):
+                return lambda: _apply(operator.neg, operand())
+            return operand
+
+        if isinstance(node, ast.BinOp) and type(node.op) in BINARY_OPERATORS:
+            function, left, right = BINARY_OPERATORS[type(node.op)], self.__compile(node.left), self.__compile(node.right)
+            return lambda: _apply(function, left(), right())
+
+        if isinstance(node, ast.Compare):
+            if any(type(op) not in COMPARE_OPERATORS for op in node.ops):
+                raise ValueError(f"Unsupported comparison in '{self.source}'")
+            operands = [self.__compile(operand) for operand in [node.left] + node.comparators]
+            functions = [COMPARE_OPERATORS[type(op)] for op in node.ops]
+            return lambda: _compare(functions, operands)
+
+        if isinstance(node, ast.BoolOp):
+            operands = [self.__compile(value) for value in node.values]
+            if isinstance(node.op, ast.And):
+                return lambda: _all(operands)
+            return lambda: _any(operands)
+
+        if isinstance(node, ast.Call) and isinstance(node.func, ast.Name) and not node.keywords:
+            return self.__compile_call(node.func.id, node.args)
+
+        raise ValueError(f"Unsupported syntax '{ast.unparse(node)}' in '{self.source}'")
+
+
+    def __compile_call(self, function: str, args: list):
+        if function == "abs" and len(args) == 1:
+            operand = self.__compile(args[0])
+            return lambda: _apply(abs, operand())
+
+        if function not in WINDOW_FUNCTIONS:
+            raise ValueError(f"Unknown function '{function}' in '{self.source}'")
+        if not args or not isinstance(args[0], ast.Name):
+            raise ValueError(f"The first argument of {function}() must be a signal name")
+
+        seconds = None
+        if len(args) == 2 and isinstance(args[1], ast.Constant) and isinstance(args[1].value, (int, float)):
+            seconds = float(args[1].value)
+            if not 0 < seconds <= MAX_WINDOW_SECONDS:
+                raise ValueError(f"The window of {function}() must be between 0 and {MAX_WINDOW_SECONDS} seconds")
+        elif len(args) != 1 or function == "mean":
+            raise ValueError(f"{function}() takes a signal name and a window in seconds")
+
+        window = RollingMean(seconds) if function == "mean" else RateOfChange(seconds)
+        name = args[0].id
+        self.signals.add(name)
+        self.windows.setdefault(name, []).append(window)
+        return window.value
+
+
+def _apply(function, *operands):
+    if any(operand is None for operand in operands):
+        return None
+    try:
+        return function(*operands)
+    except ZeroDivisionError:
+        return None
+
+
+def _compare(functions: list, operands: list):
+    left = operands[0]()
+    for function, operand in zip(functions, operands[1:]):
+        right = operand()
+        if left is None or right is None:
+            return None
+        if not function(left, right):
+            return False
+        left = right
+    return True
+
+
+def _all(operands: list):
+    result = True
+    for operand in operands:
+        value = operand()
+        if value is None:
+            result = None
+        elif not value:
+            return False
+    return result
+
+
+def _any(operands: list):
+    result = False
+    for operand in operands:
+        value = operand()
+        if value is None:
+            result = None
+        elif value:
+            return True
+    return result
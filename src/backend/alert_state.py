@@ -0,0 +1,113 @@
+# Edge detection for alerts. Every alert condition (one comparison of an alert, or one fault signal, on one message type)
+# has an AlertState: it triggers once on the rising edge, every further frame the condition holds for only increments
+# the count of that occurrence (an AlertEpisode, one TriggeredAlerts row), and it clears on the falling edge.
+#
+# hold-off: the condition has to hold for this many seconds (of message time) before the alert triggers
+# hysteresis: the condition has to be false for this many seconds before the alert clears, shorter gaps are part of the
+# same episode
+import numpy as np
+from numpy.typing import NDArray
+
+
+class AlertEpisode:
+    """ One stretch of time an alert condition was active, stored as one row of TriggeredAlerts """
+
+    def __init__(self, row: tuple, timestamp: float):
+        self.row = row  # (alert_id, category, timestamp, can_message_id, can_message_data, can_message_timestamp, signal, fail_cause)
+        self.count = 1
+        self.last_seen = timestamp
+        self.cleared_at = None
+        self.id = None  # TriggeredAlerts id, set once the row is written
+
+
+class AlertState:
+    """ Rising/falling edge detection of one alert condition, see the top of this file """
+
+    def __init__(self, holdoff: float = 0.0, hysteresis: float = 0.0):
+        self.holdoff = holdoff
+        self.hysteresis = hysteresis
+        self.true_since = None  # timestamp the condition became true, while waiting for the hold-off
+        self.false_since = None  # timestamp the condition became false, while waiting for the hysteresis
+        self.episode = None  # the active episode, None while the alert is not triggered
+
+
+    def observe(self, condition: bool, timestamp: float, changed: dict, start) -> None:
+        """
+        Feeds one evaluation of the condition
+
+        @param changed: episodes that were updated are added to this dictionary (used as an ordered set)
+        @param start: called without arguments on the rising edge, must return the new AlertEpisode
+        """
+        if condition:
+            self.false_since = None
+            if self.episode is not None:
+                self.episode.count += 1
+                self.episode.last_seen = timestamp
+                changed[self.episode] = None
+                return
+            if self.true_since is None:
+                self.true_since = timestamp
+            if timestamp - self.true_since >= self.holdoff:
+                self.__start(start(), changed)
+
+        else:
+            self.true_since = None
+            if self.episode is None:
+                return
+            if self.false_since is None:
+                self.false_since = timestamp
+            if timestamp - self.false_since >= self.hysteresis:
+                self.__clear(timestamp, changed)
+
+
+    def observe_rows(self, condition: NDArray[np.bool_], timestamps: NDArray[np.float64], changed: dict, start) -> None:
+        """
+        Same as calling observe() for every row in order, but only loops over the runs of equal condition values
+
+        @param condition: the condition of each row
+        @param timestamps: the (non-decreasing) timestamp of each row
+        @param start: called with the row index on the rising edge, must return the new AlertEpisode
+        """
+        if condition.shape[0] == 0:
+            return
+        bounds = np.r_[0, np.flatnonzero(condition[1:] != condition[:-1]) + 1, condition.shape[0]].tolist()
+
+        for first, end in zip(bounds[:-1], bounds[1:]):
+            if condition[first]:
+                self.false_since = None
+                if self.episode is None:
+                    if self.true_since is None:
+                        self.true_since = float(timestamps[first])
+                    due = np.flatnonzero(timestamps[first:end] - self.true_since >= self.holdoff)
+                    if not due.size:
+                        continue
+                    first += int(due[0])
+                    self.__start(start(first), changed)
+                    first += 1
+                if end > first:
+                    self.episode.count += end - first
+                    self.episode.last_seen = float(timestamps[end - 1])
+                    changed[self.episode] = None
+
+            else:
+                self.true_since = None
+                if self.episode is None:
+                    continue
+                if self.false_since is None:
+                    self.false_since = float(timestamps[first])
+                due = np.flatnonzero(timestamps[first:end] - self.false_since >= self.hysteresis)
+                if due.size:
+                    self.__clear(float(timestamps[first + int(due[0])]), changed)
+
+
+    def __start(self, episode: AlertEpisode, changed: dict) -> None:
+        self.true_since = None
+        self.episode = episode
+        changed[episode] = None
+
+
+    def __clear(self, timestamp: float, changed: dict) -> None:
+        self.episode.cleared_at = timestamp
+        changed[self.episode] = None
+        self.episode = None
+        self.false_since = None
@@ -0,0 +1,216 @@
+# Evaluates alert definitions retroactively against the message tables of a database. The comparisons run in SQL, only
+# (timeStamp, condition) pairs come back, and the same edge detection as live checking (alert_state.py) turns them into
+# the intervals the alert would have been active for. Frames are never decoded or replayed through alert_checker.
+# Expression alerts (alert_expressions.py) need every sample in order, their signals are read and merged by timestamp.
+import heapq
+import itertools
+import json
+import time
+import numpy as np
+import backend.alert_checker as alertChecker
+from backend.alert_expressions import AlertExpression
+from backend.alert_state import AlertState, AlertEpisode
+from backend.db_connection import DbConnection
+
+
+def alert_from_definition(definition: dict) -> dict:
+    """
+    Turns an alert definition in the format of /create_alert into a compiled alert (see alert_checker.compileAlert),
+    raises ValueError if it is invalid
+    """
+    if definition.get('type') == 'expression':
+        expression = AlertExpression(definition.get('expression') or '')
+        definition = dict(definition, field=",".join(sorted(expression.signals)))
+    if not definition.get('field'):
+        raise ValueError("Alert definition has no field")
+
+    bool_value = definition.get('value')
+    if bool_value is not None and not isinstance(bool_value, str):
+        bool_value = json.dumps(bool_value)
+    alert = {
+        'id': definition.get('id'),
+        'name': definition.get('name') or definition['field'],
+        'field': definition['field'],
+        'type': definition.get('type'),
+        'category': definition.get('category'),
+        'bool_value': bool_value,
+        'comparisons_json': json.dumps(definition['comparisons']) if definition.get('comparisons') else None,
+        'holdoff': definition.get('holdoff'),
+        'hysteresis': definition.get('hysteresis'),
+        'expression': definition.get('expression'),
+    }
+    if alert['type'] == 'bool' and bool_value is None:
+        raise ValueError("Bool alert definition has no value")
+    try:
+        return alertChecker.compileAlert(alert)
+    except (TypeError, json.JSONDecodeError) as e:
+        raise ValueError(f"Invalid alert definition: {e}")
+
+
+def get_active_alerts() -> list[dict]:
+    """ Returns all alerts of the Alerts table, compiled. Alerts that do not compile are left out """
+
+    alerts = []
+    for alert in alertChecker.fetchActiveAlerts():
+        try:
+            alerts.append(alertChecker.compileAlert(alert))
+        except (TypeError, ValueError) as e:
+            print(f"[BACKTEST] Ignoring alert {alert['name']}: {e}")
+    return alerts
+
+
+def backtest_alerts(alerts: list[dict], start_time: float = None, end_time: float = None) -> list[dict]:
+    """
+    Finds the intervals each alert would have been active for in the current database
+
+    @param alerts: compiled alerts, see alert_from_definition() and get_active_alerts()
+    @param start_time: only consider frames at or after this timestamp (seconds), None for the start of the data
+    @param end_time: only consider frames at or before this timestamp (seconds), None for the end of the data
+    @return: list of intervals, sorted by start: {"alert_id", "name", "message", "signal", "condition", "start", "end",
+    "last_seen", "count"}. "end" is the timestamp the alert cleared, None if it was still active at the end of the range
+    """
+    intervals = []
+    with DbConnection.reader() as db_conn:
+        tables_by_signal = _get_tables_by_signal(db_conn)
+
+        for alert in alerts:
+            if alert['type'] == 'expression':
+                intervals += _backtest_expression(db_conn, tables_by_signal, alert, start_time, end_time)
+                continue
+            if alert['type'] == 'bool':
+                conditions = [("==", alert['bool_value'], f"== {alert['bool_value']}")]
+            else:
+                conditions = [(symbol, comp_val, f"{symbol} {comp_val}") for symbol, _, comp_val in alert['predicates']]
+            if not conditions:
+                continue
+
+            for table_name in tables_by_signal.get(alert['field'], []):
+                timestamps, results = _query_conditions(db_conn, table_name, alert['field'], conditions, start_time, end_time)
+
+                for (_, _, description), condition in zip(conditions, results):
+                    state = AlertState(alert['holdoff'], alert['hysteresis'])
+                    episodes = []
+
+                    def start(row):
+                        episodes.append(AlertEpisode(row, float(timestamps[row])))
+                        return episodes[-1]
+
+                    state.observe_rows(condition, timestamps, dict(), start)
+                    intervals += [{
+                        "alert_id": alert['id'],
+                        "name": alert['name'],
+                        "message": table_name,
+                        "signal": alert['field'],
+                        "condition": description,
+                        "start": float(timestamps[episode.row]),
+                        "end": episode.cleared_at,
+                        "last_seen": episode.last_seen,
+                        "count": episode.count,
+                    } for episode in episodes]
+
+    intervals.sort(key=lambda interval: interval["start"])
+    return intervals
+
+
+def _backtest_expression(db_conn: DbConnection, tables_by_signal: dict, alert: dict, start_time: float, end_time: float) -> list[dict]:
+    """ Replays the samples of an expression alert's signals in timestamp order through a new evaluator """
+
+    expression = AlertExpression(alert['evaluator'].source)  # starts with empty windows
+    signals_by_table = dict()
+    for signal in expression.signals:
+        for table_name in tables_by_signal.get(signal, []):
+            signals_by_table.setdefault(table_name, []).append(signal)
+
+    cursors = []
+    for table_name, signals in signals_by_table.items():
+        sql = f'SELECT timeStamp, {", ".join(signals)} FROM {table_name} WHERE ({" OR ".join(f"{signal} IS NOT NULL" for signal in signals)})'
+        params = []
+        if start_time is not None:
+            sql += ' AND timeStamp >= ?'
+            params.append(start_time)
+        if end_time is not None:
+            sql += ' AND timeStamp <= ?'
+            params.append(end_time)
+        cursor = db_conn.conn.cursor()
+        cursor.execute(sql + ' ORDER BY timeStamp', params)
+        cursors.append(zip(cursor, itertools.repeat(signals)))
+
+    state = AlertState(alert['holdoff'], alert['hysteresis'])
+    episodes = []
+    for row, signals in heapq.merge(*cursors, key=lambda sample: sample[0][0]):
+        timestamp = row[0]
+        condition = expression.update(dict(zip(signals, tuple(row)[1:])), timestamp)
+        if condition is None:
+            continue
+
+        def start():
+            episodes.append(AlertEpisode((timestamp, expression.describe()), timestamp))
+            return episodes[-1]
+
+        state.observe(condition, timestamp, dict(), start)
+
+    return [{
+        "alert_id": alert['id'],
+        "name": alert['name'],
+        "message": ",".join(signals_by_table),
+        "signal": alert['field'],
+        "condition": f"{expression.source} ({episode.row[1]})",
+        "start": episode.row[0],
+        "end": episode.cleared_at,
+        "last_seen": episode.last_seen,
+        "count": episode.count,
+    } for episode in episodes]
+
+
+def _get_tables_by_signal(db_conn: DbConnection) -> dict[str, list[str]]:
+    """ Returns {signal name: names of the message tables that have a column for it} """
+
+    tables_by_signal = dict()
+    for table_name in db_conn.get_message_table_names():
+        for column in db_conn.query(f"PRAGMA table_info({table_name});"):
+            if column['name'] not in ('count', 'timeStamp'):
+                tables_by_signal.setdefault(column['name'], []).append(table_name)
+    return tables_by_signal
+
+
+def _query_conditions(db_conn: DbConnection, table_name: str, signal: str, conditions: list[tuple], start_time: float, end_time: float) -> tuple:
+    """
+    Evaluates the comparisons in SQL for every row of the table within the time range where the signal is not NULL
+
+    @param conditions: list of (operator symbol, threshold, description), the symbols are keys of COMPARISON_OPERATORS
+    @return: (timestamps, [boolean array per condition]), rows in timeStamp order
+    """
+    # all comparisons are packed into the bits of one integer column, fetching rows is what takes the time
+    bits = ' | '.join(f'(({signal} {symbol} ?) << {bit})' for bit, (symbol, _, _) in enumerate(conditions))
+    sql = f'SELECT timeStamp, {bits} FROM {table_name} WHERE {signal} IS NOT NULL'
+    params = [threshold for _, threshold, _ in conditions]
+    if start_time is not None:
+        sql += ' AND timeStamp >= ?'
+        params.append(start_time)
+    if end_time is not None:
+        sql += ' AND timeStamp <= ?'
+        params.append(end_time)
+
+    db_conn.cur.execute(sql + ' ORDER BY timeStamp', params)
+    rows = np.fromiter(itertools.chain.from_iterable(db_conn.cur), dtype=np.float64).reshape(-1, 2)
+    packed = rows[:, 1].astype(np.int64)
+    return rows[:, 0], [(packed >> bit) & 1 == 1 for bit in range(len(conditions))]
+
+
+def run_cli(alert_id: int = None, start_time: float = None, end_time: float = None) -> None:
+    """ Backtests one alert of the Alerts table (all of them if alert_id is None) and prints the intervals """
+
+    alerts = get_active_alerts()
+    if alert_id is not None:
+        alerts = [alert for alert in alerts if alert['id'] == alert_id]
+        if not alerts:
+            print(f"[BACKTEST] No alert with id {alert_id}")
+            return
+
+    start = time.perf_counter()
+    intervals = backtest_alerts(alerts, start_time, end_time)
+    for interval in intervals:
+        end = f"{interval['end']:.3f}" if interval['end'] is not None else "still active"
+        print(f"[BACKTEST] {interval['name']}: {interval['message']}.{interval['signal']} {interval['condition']} "
+              f"from {interval['start']:.3f} to {end} ({interval['count']} frames)")
+    print(f"[BACKTEST] {len(intervals)} intervals for {len(alerts)} alerts in {time.perf_counter() - start:.2f} s")
@@ -0,0 +1,156 @@
+# Vectorized counterpart to can_message.decode_message, used when a lot of frames are available at once (e.g. pastlog).
+# Frames are grouped by ID and every signal is pulled out of a uint64 view of the payloads with shift/mask/scale, so no
+# per-frame Python objects are created.
+import numpy as np
+from numpy.typing import NDArray
+import backend.dbcs as dbcs
+
+_ALL_BITS = np.uint64(0xFFFFFFFFFFFFFFFF)
+
+# frame ID -> (message, layout), see _get_layout()
+_layouts = dict()
+
+
+class SignalLayout:
+    """ Everything needed to extract one signal from the payload's uint64 view, precomputed from the cantools Signal """
+
+    def __init__(self, signal):
+        self.name = signal.name
+        self.big_endian = signal.byte_order == "big_endian"
+        self.length = signal.length
+        self.is_signed = signal.is_signed
+        self.is_float = signal.is_float
+        self.scale = signal.scale
+        self.offset = signal.offset
+        # cantools keeps a decoded value an int when neither scale nor offset are floats, do the same for the column
+        self.int_result = not self.is_float and isinstance(self.scale, int) and isinstance(self.offset, int)
+        self.multiplexer_ids = signal.multiplexer_ids
+        self.multiplexer_signal = signal.multiplexer_signal
+
+        if self.big_endian:
+            # position of the MSB counting from the MSB of the first byte, i.e. a plain index into the big-endian view
+            msb = 8 * (signal.start // 8) + (7 - signal.start % 8)
+            self.shift = 64 - msb - self.length
+        else:
+            self.shift = signal.start
+        self.fits = 0 <= self.shift and self.shift + self.length <= 64
+        self.mask = _ALL_BITS if self.length >= 64 else np.uint64((1 << self.length) - 1)
+
+    def extract(self, little: NDArray[np.uint64], big: NDArray[np.uint64]) -> NDArray:
+        """ Returns the decoded (and scaled) values of this signal for every payload """
+
+        if not self.fits:  # signal lies outside of the first 8 bytes
+            return np.full(little.shape[0], np.nan)
+
+        raw = big if self.big_endian else little
+        if self.shift:
+            raw = raw >> np.uint64(self.shift)
+        raw = raw & self.mask
+
+        if self.is_float:
+            values = raw.astype(np.uint32).view(np.float32) if self.length == 32 else raw.view(np.float64)
+            with np.errstate(invalid="ignore"):  # random bits can be signaling NaNs, they stay NaN
+                values = values.astype(np.float64)
+        elif self.is_signed and self.length < 64:
+            values = raw.astype(np.int64)
+            values -= ((raw >> np.uint64(self.length - 1)) & np.uint64(1)).astype(np.int64) << self.length
+        else:
+            values = raw.astype(np.int64)
+
+        if self.int_result:
+            if self.scale != 1:
+                values = values * self.scale
+            if self.offset:
+                values = values + self.offset
+            return values
+        return values * float(self.scale) + float(self.offset)
+
+
+def _get_layout(msg) -> list[SignalLayout]:
+    """ Returns the (cached) signal layouts of a cantools message """
+
+    cached = _layouts.get(msg.frame_id)
+    if cached is None or cached[0] is not msg:  # also rebuilds after the DBCs were reloaded
+        cached = (msg, [SignalLayout(signal) for signal in msg.signals])
+        _layouts[msg.frame_id] = cached
+    return cached[1]
+
+
+def payloads_to_uint64(payloads: NDArray) -> tuple[NDArray[np.uint64], NDArray[np.uint64]]:
+    """
+    Returns the little-endian and big-endian uint64 views of the payloads
+
+    @param payloads: uint8 array of shape (n, 8), shorter frames must already be zero padded
+    """
+    payloads = np.ascontiguousarray(payloads, dtype=np.uint8).reshape(-1, 8)
+    little = payloads.view("<u8").ravel()
+    big = payloads.view(">u8").ravel().astype(np.uint64)
+    return little.astype(np.uint64, copy=False), big
+
+
+def group_by_message(ids: NDArray) -> dict:
+    """
+    Groups frames by their message definition. Frames whose ID is not in any DBC are left out.
+
+    @param ids: array of frame IDs
+    @return: {message_name: (cantools message, array of row indices into ids)}, row indices are in ascending order
+    """
+    ids = np.asarray(ids, dtype=np.int64)
+    order = np.argsort(ids, kind="stable")
+    sorted_ids = ids[order]
+    starts = np.flatnonzero(np.r_[True, sorted_ids[1:] != sorted_ids[:-1]])
+    ends = np.r_[starts[1:], sorted_ids.shape[0]]
+
+    groups = dict()
+    for start, end in zip(starts, ends):
+        entry = dbcs.get_message_by_id(int(sorted_ids[start]))
+        if entry is None:
+            continue
+        msg = entry[1]
+        rows = order[start:end]
+        if msg.name in groups:  # several frame IDs can map to the same message name (e.g. defined in two DBCs)
+            rows = np.sort(np.concatenate((groups[msg.name][1], rows)))
+        groups[msg.name] = (msg, rows)
+    return groups
+
+
+def decode_columns(msg, little: NDArray[np.uint64], big: NDArray[np.uint64]) -> dict[str, NDArray]:
+    """
+    Decodes every signal of one message type
+
+    @param msg: the cantools message all payloads belong to
+    @param little: little-endian uint64 view of the payloads (see payloads_to_uint64)
+    @param big: big-endian uint64 view of the same payloads
+    @return: {signal_name: column}. Integer signals are int64 columns, scaled/float signals are float64. Signals that
+    are not active for a frame's multiplexer value are NaN. Choices are not applied, the raw numeric value is kept.
+    """
+    layouts = _get_layout(msg)
+    columns = {layout.name: layout.extract(little, big) for layout in layouts}
+
+    for layout in layouts:
+        if layout.multiplexer_ids is None or layout.multiplexer_signal not in columns:
+            continue
+        active = np.isin(columns[layout.multiplexer_signal], layout.multiplexer_ids)
+        columns[layout.name] = np.where(active, columns[layout.name], np.nan)
+    return columns
+
+
+def decode_batch(ids: NDArray, payloads: NDArray, timestamps: NDArray) -> dict[str, dict[str, NDArray]]:
+    """
+    Decodes a batch of raw frames into per-message columns
+
+    @param ids: array of frame IDs, shape (n,)
+    @param payloads: uint8 array of zero padded payloads, shape (n, 8)
+    @param timestamps: array of timestamps, shape (n,)
+    @return: {message_name: {signal_name: column, ..., 'timeStamp': column}}, rows keep their order from the input.
+    Frames whose ID is not in any DBC are dropped, same as decode_message returning None.
+    """
+    little, big = payloads_to_uint64(payloads)
+    timestamps = np.asarray(timestamps, dtype=np.float64)
+
+    batch = dict()
+    for name, (msg, rows) in group_by_message(ids).items():
+        columns = decode_columns(msg, little[rows], big[rows])
+        columns["timeStamp"] = timestamps[rows]
+        batch[name] = columns
+    return batch
@@ -2,11 +2,12 @@ import backend.dbcs as dbcs
 
 
 class CanMessage:
-    def __init__(self, name: str, id: int, signals: dict, timestamp: float):
+    def __init__(self, name: str, id: int, signals: dict, timestamp: float, raw_data: bytes = None):
         self.messageName = name
         self.messageId = id
         self.sigDict = signals
         self.timeStamp = timestamp
+        self.rawData = raw_data  # payload as received, stored with triggered alerts
 
     def __str__(self):
         return f'MessageType: {self.messageName}, MessageID: {self.messageId}, TimeStamp: {self.timeStamp}, Signals: {str(self.sigDict)}'
@@ -23,24 +24,15 @@ def decode_message(id: int, data: bytes, timestamp: float) -> CanMessage:
 
     @return: A CANmessage object (defined above). In sigDict, Signals are the keys and decoded values are the values. Returns None if the message type is not found in the DBC files.
     """
-    name = None
     # id = int(id_hex, 16) Old code, kept for reference
     # data = bytes.fromhex(data_hex.replace("0x", ""))
-    data += b'\x00' * 8  # adding padding
+    entry = dbcs.get_message_by_id(id)
 
-    decoded_message = None  # dictionary of signals to return
-
-    for db in dbcs.DBCs:
-        for msg in db.messages:
-            if msg.frame_id == id:
-                name = msg.name
-                decoded_message = db.decode_message(id, data)
-                break
-        if decoded_message is not None:
-            break
-
-    # if decoded message was not associated with a definition from DBCs, return None
-    if decoded_message is None:
+    # if the message is not associated with a definition from DBCs, return None
+    if entry is None:
         return None
 
-    return CanMessage(name, id, decoded_message, timestamp)
+    _, msg = entry
+    decoded_message = msg.decode(data + b'\x00' * 8)  # dictionary of signals to return, decoded with padding
+
+    return CanMessage(msg.name, id, decoded_message, timestamp, data)
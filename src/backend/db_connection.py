@@ -1,21 +1,107 @@
 import sqlite3
+import threading
+import time
+import queue
+from contextlib import contextmanager
 import backend.dbcs as dbcs
+import backend.rollups as rollups
 from backend.can_message import CanMessage  # our own CanMessage Object
+from backend.alert_expressions import AlertExpression
 import json
+import itertools
+import numpy as np
 
 # Before initializing any DbConnection objects, must run setup_the_db_path(path : str)
 
+# Applied to every connection: WAL lets readers run while the writer commits, NORMAL sync is safe with WAL, plus a 64 MB
+# page cache, 256 MB of memory mapped I/O and in-memory temp tables (sorting, grouping)
+CONNECTION_PRAGMAS = (
+    "PRAGMA synchronous=NORMAL",
+    "PRAGMA cache_size=-65536",
+    "PRAGMA mmap_size=268435456",
+    "PRAGMA temp_store=MEMORY",
+)
+
+# Compiled statements kept per connection. Writes use an INSERT and a rollup upsert per message type, a few hundred
+# with the default DBCs, sqlite3's default of 128 would compile most of them again on every batch
+STATEMENT_CACHE_SIZE = 2048
+
+# Maximum number of idle read-only connections kept open for reuse
+READ_POOL_SIZE = 8
+
+# Rows fetched from SQLite at a time by fetch_range(), and the initial size of its result when no capacity is given
+FETCH_CHUNK_ROWS = 8192
+
+# Tables in the database that do not hold CAN messages
+NON_MESSAGE_TABLES = ("sqlite_sequence", "Alerts", "TriggeredAlerts")
+
 
 class DbConnection:
     DB_path = "./error"  # static, i.e. shared with all DbConnection Objects, this variable must be set elsewhere before use
-
-    def __init__(self):
-        # every thread (and socketIO event handler) must have its own DbConnection object
-        self.conn = sqlite3.connect(DbConnection.DB_path)
+    # message name -> (column names, parameterized INSERT statement), shared with all DbConnection Objects
+    insert_statements = dict()
+    # (message name, level) -> (signal names, parameterized upsert statement) of the rollup tables, see rollups.py
+    rollup_statements = dict()
+    # message name -> float arrays of the rows written since the rollups were last folded (signals in the order of the
+    # INSERT statement, then timeStamp), and the time.monotonic() of that fold, see __fold_rollups()
+    rollup_pending = dict()
+    rollup_folded_at = 0.0
+
+    # All writes go through one shared connection (see writer()), reads use pooled read-only connections (see reader())
+    writer_conn = None
+    writer_lock = threading.RLock()
+    read_pool = queue.LifoQueue(READ_POOL_SIZE)
+
+    def __init__(self, read_only: bool = False):
+        # A DbConnection is only used by one thread at a time, but pooled and shared ones move between threads
+        if read_only:
+            self.conn = sqlite3.connect(f"file:{DbConnection.DB_path}?mode=ro", uri=True, check_same_thread=False, cached_statements=STATEMENT_CACHE_SIZE)
+        else:
+            self.conn = sqlite3.connect(DbConnection.DB_path, check_same_thread=False, cached_statements=STATEMENT_CACHE_SIZE)
+            self.conn.execute("PRAGMA journal_mode=WAL")  # stored in the database file, so readers use it as well
+        for pragma in CONNECTION_PRAGMAS:
+            self.conn.execute(pragma)
         self.conn.row_factory = sqlite3.Row
         self.cur = self.conn.cursor()
 
 
+    @staticmethod
+    @contextmanager
+    def writer():
+        """
+        Context manager giving exclusive use of the single writer connection, e.g.
+            with DbConnection.writer() as db_conn:
+                db_conn.add_batch_can_msg(can_msgs)
+        Every write to the database (CAN messages, alerts, ...) must use it. Re-entrant within the same thread.
+        """
+        with DbConnection.writer_lock:
+            if DbConnection.writer_conn is None:
+                DbConnection.writer_conn = DbConnection()
+            yield DbConnection.writer_conn
+
+
+    @staticmethod
+    @contextmanager
+    def reader():
+        """
+        Context manager lending out a read-only connection from the pool, e.g.
+            with DbConnection.reader() as db_conn:
+                rows = db_conn.query("SELECT ...")
+        Readers never block the writer or each other.
+        """
+        try:
+            db_conn = DbConnection.read_pool.get_nowait()
+        except queue.Empty:
+            db_conn = DbConnection(read_only=True)
+        try:
+            yield db_conn
+        finally:
+            try:
+                DbConnection.read_pool.put_nowait(db_conn)
+            except queue.Full:
+                pass  # closed by the destructor
+
+
     def __del__(self): # object destructor, called automatically when the object is deleted
         if hasattr(self,'cur') and self.cur:
             self.cur.close()
@@ -23,6 +109,86 @@ class DbConnection:
             self.conn.close()
 
 
+    @staticmethod
+    def __get_insert_statement(message_name: str) -> tuple[list[str], str]:
+        """
+        Returns the column names (signals in DBC order, then timeStamp) and the parameterized INSERT statement for a
+        message's table. Built once per message type, so SQLite can reuse the compiled statement for every row.
+        """
+        statement = DbConnection.insert_statements.get(message_name)
+        if statement is None:
+            columns = list(dbcs.get_messages_from_dbcs()[message_name].keys()) + ['timeStamp']
+            placeholders = ', '.join(['?' for _ in columns])  # adds a placeholder ? for every column
+            statement = (columns, f'INSERT INTO {message_name} ({", ".join(columns)}) VALUES ({placeholders})')
+            DbConnection.insert_statements[message_name] = statement
+        return statement
+
+
+    @staticmethod
+    def __get_rollup_statement(message_name: str, level: str) -> tuple[list[str], str]:
+        """
+        Returns the signal names and the upsert statement of a message's rollup table of one level. A bucket that already
+        has a row is merged with the new summary: min of the mins, max of the maxes, sums and counts added up.
+        """
+        statement = DbConnection.rollup_statements.get((message_name, level))
+        if statement is None:
+            signals = list(dbcs.get_messages_from_dbcs()[message_name].keys())
+            columns = ['bucket'] + [f'{signal}_{suffix}' for signal in signals for suffix in rollups.ROLLUP_COLUMNS]
+            updates = []
+            for signal in signals:
+                updates += [f'{signal}_min = min(coalesce({signal}_min, excluded.{signal}_min), coalesce(excluded.{signal}_min, {signal}_min))',
+                            f'{signal}_max = max(coalesce({signal}_max, excluded.{signal}_max), coalesce(excluded.{signal}_max, {signal}_max))',
+                            f'{signal}_sum = {signal}_sum + excluded.{signal}_sum',
+                            f'{signal}_count = {signal}_count + excluded.{signal}_count']
+            statement = (signals, f'INSERT INTO {rollups.rollup_table_name(level, message_name)} ({", ".join(columns)}) '
+                                  f'VALUES ({", ".join("?" * len(columns))}) ON CONFLICT(bucket) DO UPDATE SET {", ".join(updates)}')
+            DbConnection.rollup_statements[(message_name, level)] = statement
+        return statement
+
+
+    def __add_rollups(self, message_name: str, rows) -> None:
+        """
+        Keeps rows of one message type until the next __fold_rollups() adds them to its rollup tables, does not commit
+
+        @param rows: NumPy float array of shape (rows, signals + 1), columns in the order of the message's INSERT
+        statement (timeStamp last), NaN for missing values
+        """
+        DbConnection.rollup_pending.setdefault(message_name, []).append(rows)
+        self.__fold_rollups()
+
+
+    def __fold_rollups(self, force: bool = False) -> None:
+        """
+        Adds the rows kept since the last fold to the rollup tables: per message type, all of them are summarized into
+        every level at once and merged with the stored buckets. Skipped if the last fold is less than
+        rollups.ROLLUP_FOLD_INTERVAL seconds ago, unless force. Does not commit.
+        """
+        if not force and time.monotonic() - DbConnection.rollup_folded_at < rollups.ROLLUP_FOLD_INTERVAL:
+            return
+        for message_name, chunks in DbConnection.rollup_pending.items():
+            rows = np.concatenate(chunks) if len(chunks) > 1 else chunks[0]
+            for index, (level, _) in enumerate(rollups.ROLLUP_LEVELS):
+                sql = self.__get_rollup_statement(message_name, level)[1]
+                # tolist() gives floats, SQLite stores the integral bucket numbers and counts as INTEGER
+                self.cur.executemany(sql, rollups.aggregate(rollups.bucket_numbers(rows[:, -1], index), rows[:, :-1]).tolist())
+        DbConnection.rollup_pending.clear()
+        DbConnection.rollup_folded_at = time.monotonic()
+
+
+    def fold_rollups(self) -> None:
+        """ Adds every row written so far to the rollup tables right away, e.g. once a pastlog import is done """
+
+        self.__fold_rollups(force=True)
+        self.conn.commit()
+
+
+    @staticmethod
+    def __message_row(can_msg: CanMessage, signals: list[str]) -> tuple:
+        """ The values of a CanMessage in the column order of its INSERT statement, missing signals become NULL """
+
+        return tuple(map(can_msg.sigDict.get, signals)) + (can_msg.timeStamp,)
+
+
     def __db_insert_message(self, can_msg: CanMessage) -> None:
         """
         Takes in a CanMessage object, then its signals dictionary are deconstructed and placed into connection's database
@@ -31,14 +197,9 @@ class DbConnection:
         @param can_msg: A CanMessage object
         @return: None, adds signals from CanMessage object to database. Does not commit. Needs to call commit after.
         """
-        signal_dict = can_msg.sigDict
-
-        # Generate the SQL query
-        columns = ', '.join(signal_dict.keys())  # joins the keys as names of the columns that values will be inserted
-        placeholders = ', '.join(['?' for _ in signal_dict])  # adds a placeholder ? for every key-val pair in sig_dict
-        sql = f'INSERT INTO {can_msg.messageName} ({columns}, timeStamp) VALUES ({placeholders}, {can_msg.timeStamp})'
         # can_msg.messageName is assumed to be the name of the table in database
-        self.cur.execute(sql, tuple(signal_dict.values()))
+        columns, sql = self.__get_insert_statement(can_msg.messageName)
+        self.cur.execute(sql, self.__message_row(can_msg, columns[:-1]))
 
 
     @staticmethod
@@ -69,6 +230,8 @@ class DbConnection:
         @return: None, just adds single CAN message to connection's database
         """
         self.__db_insert_message(can_msg)  # helper function defined above
+        signals = self.__get_insert_statement(can_msg.messageName)[0][:-1]
+        self.__add_rollups(can_msg.messageName, np.array([self.__message_row(can_msg, signals)], dtype=float))
 
         self.conn.commit()
 
@@ -80,8 +243,33 @@ class DbConnection:
         @param can_msg_list: The list of CanMessage objects to be added to database
         @return: None, adds all CanMessage objects to connection's database
         """
+        # group the rows by message type, so each table gets a single executemany with its cached statement
+        rows_by_message = dict()
         for can_msg in can_msg_list:
-            self.__db_insert_message(can_msg)  # helper function defined above
+            rows_by_message.setdefault(can_msg.messageName, []).append(can_msg)
+
+        for message_name, can_msgs in rows_by_message.items():
+            columns, sql = self.__get_insert_statement(message_name)
+            signals = columns[:-1]
+            rows = [self.__message_row(can_msg, signals) for can_msg in can_msgs]
+            self.cur.executemany(sql, rows)
+            self.__add_rollups(message_name, np.array(rows, dtype=float))  # None becomes NaN
+
+        self.conn.commit()  # all groups are written in one transaction, with the rollups if they were folded
+
+
+    def add_batch_columns(self, message_name: str, columns: dict) -> None:
+        """
+        Add a batch of decoded rows of one message type, given as columns (see batch_decode.decode_batch)
+
+        @param message_name: The message's name, which is also the name of its table
+        @param columns: dictionary of signal names (and 'timeStamp') to equal length NumPy arrays
+        @return: None, adds all rows to connection's database
+        """
+        names, sql = self.__get_insert_statement(message_name)
+        # tolist() turns the NumPy values into plain Python ints/floats, which sqlite3 can bind
+        self.cur.executemany(sql, zip(*[columns[name].tolist() for name in names]))
+        self.__add_rollups(message_name, np.column_stack([columns[name] for name in names]).astype(float, copy=False))
 
         self.conn.commit()
 
@@ -98,15 +286,52 @@ class DbConnection:
         return [dict(row) for row in rows]  # list[ 'can_msg_1' is dict{signal: val,signal: val,signal: val}, ...]
 
 
+    def fetch_range(self, table_name: str, columns: list[str], start: float, end: float, key_column: str = "timeStamp",
+                    capacity: int = None) -> np.ndarray:
+        """
+        Reads the rows of a table whose key is within [start, end] straight into a float64 NumPy array, without building
+        a dict (or sqlite3.Row) per row: rows come in chunks of FETCH_CHUNK_ROWS plain tuples that np.fromiter copies
+        into the preallocated result, which only grows (doubling) if capacity was too small
+
+        @param columns: the columns to read after the key column
+        @param capacity: expected number of rows, if known
+        @return: array of shape (rows, 1 + len(columns)): the key, then the columns. NULL becomes NaN, rows are ordered by
+        the key
+        """
+        width = 1 + len(columns)
+        cursor = self.conn.cursor()
+        cursor.row_factory = None  # plain tuples
+        cursor.execute(f'SELECT {key_column}, {", ".join(columns)} FROM {table_name} WHERE {key_column} BETWEEN ? AND ? '
+                       f'ORDER BY {key_column}', (start, end))
+
+        result = np.empty((capacity or FETCH_CHUNK_ROWS, width))
+        rows = 0
+        while chunk := cursor.fetchmany(FETCH_CHUNK_ROWS):
+            if rows + len(chunk) > result.shape[0]:
+                grown = np.empty((max(2 * result.shape[0], rows + len(chunk)), width))
+                grown[:rows] = result[:rows]
+                result = grown
+            result[rows:rows + len(chunk)] = np.fromiter(itertools.chain.from_iterable(chunk), dtype=np.float64,
+                                                          count=len(chunk) * width).reshape(-1, width)
+            rows += len(chunk)
+        cursor.close()
+        return result[:rows]
+
+
     # Should only be called once!
-    def setup_the_tables(self) -> None:
+    def setup_the_tables(self, create_indexes: bool = True) -> None:
         """
         Sets up the tables in the SQL database, this function must be called before ANY other function calls for the
         instantiated DbConnection object.
 
+        @param create_indexes: whether to create the timeStamp indexes right away. Bulk loads (pastlog) are faster
+        without them, call create_time_indexes() once the data is in.
         @return: None, creates a table for each message type (i.e. there will be as many tables as there are
         message types, as defined in DBCs)
         """
+        DbConnection.insert_statements.clear()  # the DBCs may have changed since the statements were built
+        DbConnection.rollup_statements.clear()
+        DbConnection.rollup_pending.clear()
         
         sql_alerts = '''
             CREATE TABLE IF NOT EXISTS Alerts (
@@ -116,10 +341,14 @@ class DbConnection:
                 type TEXT NOT NULL,
                 category TEXT,           -- NEW COLUMN for alert category
                 bool_value TEXT,
-                comparisons_json TEXT
+                comparisons_json TEXT,
+                holdoff REAL DEFAULT 0,      -- seconds the condition must hold before the alert triggers
+                hysteresis REAL DEFAULT 0,   -- seconds the condition must be false before the alert clears
+                expression TEXT              -- condition of 'expression' alerts, see alert_expressions.py
             );
         '''
         self.cur.execute(sql_alerts)
+        self.__add_missing_columns("Alerts", {"holdoff": "REAL DEFAULT 0", "hysteresis": "REAL DEFAULT 0", "expression": "TEXT"})
 
         sql_triggered_alerts = '''
             CREATE TABLE IF NOT EXISTS TriggeredAlerts (
@@ -131,10 +360,17 @@ class DbConnection:
                 can_message_data BYTEA NOT NULL,
                 can_message_timestamp INTEGER NOT NULL,
                 signal TEXT NOT NULL,
-                fail_cause TEXT NOT NULL
+                fail_cause TEXT NOT NULL,
+                count INTEGER DEFAULT 1,     -- frames the condition held for while the alert was active
+                last_seen REAL,              -- can_message_timestamp of the last of these frames
+                cleared_at REAL              -- timestamp the alert cleared, NULL while it is active
             );
         '''
         self.cur.execute(sql_triggered_alerts)
+        self.__add_missing_columns("TriggeredAlerts", {"count": "INTEGER DEFAULT 1", "last_seen": "REAL", "cleared_at": "REAL"})
+        # for the category and time filters of get_triggered_alerts, paging by id uses the primary key
+        self.cur.execute('CREATE INDEX IF NOT EXISTS idx_TriggeredAlerts_category ON TriggeredAlerts (category, id)')
+        self.cur.execute('CREATE INDEX IF NOT EXISTS idx_TriggeredAlerts_time ON TriggeredAlerts (can_message_timestamp)')
 
 
         can_msg_signals = self.__parse_can_message_signals(dbcs.DBCs)
@@ -143,11 +379,52 @@ class DbConnection:
         for can_msg_type, signal_types_dict in can_msg_signals.items():
             columns = ', '.join([f'{signal_name} INTEGER' for signal_name in signal_types_dict.keys()])
 
-            sql = f'CREATE TABLE IF NOT EXISTS {can_msg_type} (count INTEGER PRIMARY KEY AUTOINCREMENT, {columns}, timeStamp INTEGER)'  # add timestamp column
+            sql = f'CREATE TABLE IF NOT EXISTS {can_msg_type} (count INTEGER PRIMARY KEY AUTOINCREMENT, {columns}, timeStamp REAL)'  # add timestamp column
 
             self.cur.execute(sql)
 
+            # one rollup table per level, bucket is the rowid so range reads need no extra index
+            rollup_columns = ', '.join([f'{signal_name}_min REAL, {signal_name}_max REAL, {signal_name}_sum REAL DEFAULT 0, {signal_name}_count INTEGER DEFAULT 0'
+                                        for signal_name in signal_types_dict.keys()])
+            for level, _ in rollups.ROLLUP_LEVELS:
+                self.cur.execute(f'CREATE TABLE IF NOT EXISTS {rollups.rollup_table_name(level, can_msg_type)} (bucket INTEGER PRIMARY KEY, {rollup_columns})')
+
+        self.conn.commit()
+
+        if create_indexes:
+            self.create_time_indexes()
+
+
+    def create_time_indexes(self) -> int:
+        """
+        Creates an index on timeStamp for every message table that does not have one yet. Graph range queries and
+        latest-value lookups depend on it. Also serves as the one time upgrade for databases created before the indexes
+        existed, later calls only check sqlite_master.
+
+        @return: the number of indexes that were created
+        """
+        self.cur.execute("SELECT name FROM sqlite_master WHERE type='index';")
+        existing = {row[0] for row in self.cur.fetchall()}
+
+        created = 0
+        for table_name in self.get_message_table_names():
+            index_name = f'idx_{table_name}_timeStamp'
+            if index_name not in existing:
+                self.cur.execute(f'CREATE INDEX IF NOT EXISTS {index_name} ON {table_name} (timeStamp)')
+                created += 1
+
         self.conn.commit()
+        return created
+
+
+    def __add_missing_columns(self, table_name: str, columns: dict) -> None:
+        """ Adds the columns ({name: type and default}) a table created by an older version does not have yet """
+
+        self.cur.execute(f"PRAGMA table_info({table_name});")
+        existing = {row['name'] for row in self.cur.fetchall()}
+        for column, declaration in columns.items():
+            if column not in existing:
+                self.cur.execute(f"ALTER TABLE {table_name} ADD COLUMN {column} {declaration}")
 
 
     def get_table_names(self) -> list[str]:
@@ -158,6 +435,71 @@ class DbConnection:
         return [table[0] for table in tables]
 
 
+    def get_message_table_names(self) -> list[str]:
+        """ Returns the names of all tables that hold CAN messages """
+
+        return [name for name in self.get_table_names()
+                if name not in NON_MESSAGE_TABLES and not name.startswith(rollups.ROLLUP_TABLE_PREFIX)]
+
+
+    def build_rollups(self) -> int:
+        """
+        Fills the rollup tables of every message table that has rows but no rollups yet, i.e. databases written before
+        rollups existed. The finest level is computed from the rows, every other level from the level below it.
+
+        @return: the number of message tables whose rollups were built
+        """
+        built = 0
+        existing = set(self.get_table_names())
+        for message_name in self.get_message_table_names():
+            tables = [rollups.rollup_table_name(level, message_name) for level, _ in rollups.ROLLUP_LEVELS]
+            if any(table not in existing for table in tables):
+                continue  # not a message of the current DBCs
+            self.cur.execute(f'SELECT EXISTS (SELECT 1 FROM {message_name}), EXISTS (SELECT 1 FROM {tables[0]})')
+            has_rows, has_rollups = self.cur.fetchone()
+            if not has_rows or has_rollups:
+                continue
+
+            signals = self.__get_rollup_statement(message_name, rollups.ROLLUP_LEVELS[0][0])[0]
+            columns = ', '.join(f'{signal}_{suffix}' for signal in signals for suffix in rollups.ROLLUP_COLUMNS)
+            from_rows = ', '.join(f'min({signal}), max({signal}), total({signal}), count({signal})' for signal in signals)
+            self.cur.execute(f'INSERT INTO {tables[0]} (bucket, {columns}) SELECT CAST(timeStamp / {rollups.ROLLUP_LEVELS[0][1]} AS INTEGER) AS b, '
+                             f'{from_rows} FROM {message_name} WHERE timeStamp IS NOT NULL GROUP BY b')
+
+            from_level = ', '.join(f'min({signal}_min), max({signal}_max), total({signal}_sum), total({signal}_count)' for signal in signals)
+            for index in range(1, len(tables)):
+                ratio = rollups.ROLLUP_RATIOS[index] // rollups.ROLLUP_RATIOS[index - 1]
+                self.cur.execute(f'INSERT INTO {tables[index]} (bucket, {columns}) SELECT bucket / {ratio} AS b, {from_level} '
+                                 f'FROM {tables[index - 1]} GROUP BY b')
+            built += 1
+
+        self.conn.commit()
+        return built
+
+
+    def get_time_bounds(self, table_name: str) -> tuple:
+        """
+        Returns the earliest and the latest timeStamp of a message table, (None, None) if it has no rows. Asked in two
+        subqueries, so each is a single lookup in the table's timeStamp index instead of a scan
+        """
+        self.cur.execute(f'SELECT (SELECT min(timeStamp) FROM {table_name}), (SELECT max(timeStamp) FROM {table_name})')
+        return tuple(self.cur.fetchone())
+
+
+    def get_rollup_buckets(self, message_name: str, signals: list[str], index: int, start_time: float, end_time: float) -> np.ndarray:
+        """
+        Returns the rows of a message's rollup table of level rollups.ROLLUP_LEVELS[index] that overlap the time range,
+        in time order, see fetch_range(): (bucket, min and max of the first signal, min and max of the second signal,
+        ...). min and max are NaN for buckets where a signal had no value.
+        """
+        # clipped so that bogus ranges still give valid int64 bucket numbers
+        first, last = rollups.bucket_numbers(np.clip(np.array([start_time, end_time], dtype=float), -1e15, 1e15), index).tolist()
+        table = rollups.rollup_table_name(rollups.ROLLUP_LEVELS[index][0], message_name)
+        columns = [f'{signal}_{suffix}' for signal in signals for suffix in ('min', 'max')]
+        # at most one row per bucket, but a wide range can span far more buckets than exist, fetch_range grows as needed
+        return self.fetch_range(table, columns, first, last, key_column='bucket', capacity=min(last - first + 1, FETCH_CHUNK_ROWS))
+
+
     @staticmethod
     def setup_the_db_path(path: str) -> None:
         """
@@ -166,6 +508,12 @@ class DbConnection:
         @return: Nothing, just sets the SQL database connection path for all DbConnection objects (it is static)
         """
         DbConnection.DB_path = path
+
+        # connections to a previous database are not reused
+        with DbConnection.writer_lock:
+            DbConnection.writer_conn = None
+        while not DbConnection.read_pool.empty():
+            DbConnection.read_pool.get_nowait()
     
 
     def add_triggered_alert(self, alert_id, category, timestamp, can_message_id, can_message_data, can_message_timestamp, signal, fail_cause):
@@ -177,6 +525,31 @@ class DbConnection:
         self.conn.commit()
         new_id = self.cur.lastrowid
         return new_id
+
+
+    def save_triggered_alerts(self, new_alerts: list[tuple], updates: list[tuple]) -> list[int]:
+        """
+        Adds new triggered alerts and updates the count/last_seen/cleared_at of existing ones, in a single transaction
+
+        @param new_alerts: list of (alert_id, category, timestamp, can_message_id, can_message_data,
+        can_message_timestamp, signal, fail_cause, count, last_seen, cleared_at) tuples
+        @param updates: list of (count, last_seen, cleared_at, id) tuples
+        @return: the ids of the new triggered alerts, in the order of new_alerts
+        """
+        ids = []
+        for new_alert in new_alerts:  # one at a time for lastrowid, new alerts are rare compared to updates
+            self.cur.execute('''
+                INSERT INTO TriggeredAlerts (alert_id, category, timestamp, can_message_id, can_message_data, can_message_timestamp, signal, fail_cause, count, last_seen, cleared_at)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+            ''', new_alert)
+            ids.append(self.cur.lastrowid)
+
+        self.cur.executemany('''
+            UPDATE TriggeredAlerts SET count = ?, last_seen = ?, cleared_at = ? WHERE id = ?
+        ''', updates)
+
+        self.conn.commit()
+        return ids
     
     
     def create_alert(self, alert_data: dict) -> int:
@@ -188,14 +561,22 @@ class DbConnection:
         "type": "double",
         "category": "Battery",   # <-- We’ll be sending this now
         "value": "false"         # if bool
-        "comparisons": [ { "operator": "<", "value": 3.0 } ]
+        "comparisons": [ { "operator": "<", "value": 3.0 } ],
+        "holdoff": 0.5,          # optional, seconds the condition must hold before triggering
+        "hysteresis": 2.0        # optional, seconds the condition must be false before clearing
         }
+        Expression alerts have "type": "expression" and "expression": "mean(pack_current, 2) > 150" instead of a
+        value or comparisons, their field is set to the signals the expression uses
         """
 
         name = alert_data.get('name')
         field = alert_data.get('field')
         type_ = alert_data.get('type')
         category = alert_data.get('category')  # <-- new
+        holdoff = float(alert_data.get('holdoff') or 0)
+        hysteresis = float(alert_data.get('hysteresis') or 0)
+        if holdoff < 0 or hysteresis < 0:
+            raise ValueError("Hold-off and hysteresis can not be negative")
 
         # Check if an alert with this name already exists
         self.cur.execute('''
@@ -208,17 +589,26 @@ class DbConnection:
 
         bool_value = None
         comparisons_json = None
+        expression = None
 
-        if type_ == 'bool':
+        if type_ == 'expression':
+            expression = AlertExpression(alert_data.get('expression') or '')  # raises ValueError if it is invalid
+            field = ",".join(sorted(expression.signals))
+            expression = expression.source
+        elif type_ == 'bool':
             bool_value = alert_data.get('value')  # "true"/"false"
+            if isinstance(bool_value, bool):
+                bool_value = json.dumps(bool_value)
+            if bool_value not in ('true', 'false'):
+                raise ValueError(f"Bool alert value must be true or false, not {alert_data.get('value')!r}")
         elif type_ in ['int', 'double']:
             comps = alert_data.get('comparisons', [])
             comparisons_json = json.dumps(comps)
 
         self.cur.execute('''
-            INSERT INTO Alerts (name, field, type, category, bool_value, comparisons_json)
-            VALUES (?, ?, ?, ?, ?, ?)
-        ''', (name, field, type_, category, bool_value, comparisons_json))
+            INSERT INTO Alerts (name, field, type, category, bool_value, comparisons_json, holdoff, hysteresis, expression)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+        ''', (name, field, type_, category, bool_value, comparisons_json, holdoff, hysteresis, expression))
 
         self.conn.commit()
         new_id = self.cur.lastrowid
@@ -226,13 +616,72 @@ class DbConnection:
 
     
     def delete_alert(self, alert_id: int) -> None:
+        """ Deletes an alert and clears its still active TriggeredAlerts rows (as of the last frame they were seen in) """
+
         self.cur.execute('''
             DELETE FROM Alerts WHERE id = ?
         ''', (alert_id,))
+        self.cur.execute('''
+            UPDATE TriggeredAlerts SET cleared_at = coalesce(last_seen, can_message_timestamp) WHERE alert_id = ? AND cleared_at IS NULL
+        ''', (alert_id,))
 
         self.conn.commit()
 
 
+    def get_triggered_alerts(self, since_id: int = None, ids: list[int] = None, category: str = None, start_time: float = None,
+                             end_time: float = None, limit: int = None, offset: int = 0, newest_first: bool = False,
+                             before_id: int = None) -> list[dict]:
+        """
+        Returns TriggeredAlerts rows with the name of their alert (None for auto faults and deleted alerts), in id order
+
+        @param since_id: only rows with a greater id, for fetching just the rows added since the last request
+        @param ids: rows that are returned as well, even if their id is not greater than since_id (e.g. rows a client
+        shows as still active, whose count can change). Only these rows if since_id is None
+        @param category: only rows of this category ('' for auto faults)
+        @param start_time: only rows with can_message_timestamp >= start_time
+        @param end_time: only rows with can_message_timestamp <= end_time
+        @param limit: maximum number of rows, all if None
+        @param offset: number of (filtered) rows to skip
+        @param newest_first: descending id order instead of ascending
+        @param before_id: only rows with a smaller id, for paging back from the oldest row a client has
+        """
+        filters, filter_params = [], []
+        if before_id is not None:
+            filters.append('t.id < ?')
+            filter_params.append(before_id)
+        if category is not None:
+            filters.append('t.category = ?')
+            filter_params.append(category)
+        if start_time is not None:
+            filters.append('t.can_message_timestamp >= ?')
+            filter_params.append(start_time)
+        if end_time is not None:
+            filters.append('t.can_message_timestamp <= ?')
+            filter_params.append(end_time)
+
+        # the id conditions are separate SELECTs, SQLite scans the whole table for "id > ? OR id IN (...)"
+        selects = []
+        if since_id is not None:
+            selects.append((['t.id > ?'], [since_id]))
+        if ids:
+            selects.append(([f't.id IN ({", ".join("?" * len(ids))})'] + (['t.id <= ?'] if since_id is not None else []),
+                            list(ids) + ([since_id] if since_id is not None else [])))
+        if not selects:
+            selects.append(([], []))
+
+        sql, params = [], []
+        for conditions, condition_params in selects:
+            where = conditions + filters
+            sql.append('SELECT t.*, a.name AS name FROM TriggeredAlerts t LEFT JOIN Alerts a ON a.id = t.alert_id'
+                       + (' WHERE ' + ' AND '.join(where) if where else ''))
+            params += condition_params + filter_params
+        sql = ' UNION ALL '.join(sql) + f' ORDER BY id {"DESC" if newest_first else "ASC"} LIMIT ? OFFSET ?'
+        params += [limit if limit is not None else -1, offset]
+
+        self.cur.execute(sql, params)
+        return [dict(row) for row in self.cur.fetchall()]
+
+
     def get_alert_name(self, alert_id: int) -> str:
         self.cur.execute('''
             SELECT name FROM Alerts WHERE id = ?
@@ -2,23 +2,126 @@
 import cantools as ct
 import os
 import can
+import hashlib
+import pickle
+import time
 
 # DBC_FILES are the 'definitions'/'mappings' files, they are not parseable yet.
 DBCs = None
 # Function in our code depend on these definitions/configurations to get information on each type of can message.
 
+# frame ID -> (database, message) for every known message, built once by load_dbc_files()
+MESSAGES_BY_ID = dict()
+
+# Indexes derived from DBCs, computed once per set of DBC files (see get_messages_from_dbcs and get_fault_signals)
+MESSAGE_SIGNAL_TYPES = dict()
+FAULT_SIGNALS = list()
+# message name -> {signal name: unit}, signals in DBC order (see get_signal_units)
+SIGNAL_UNITS = dict()
+
+DBC_DIR = "./resources/CAN-messages/"
+# Parsed DBCs (and the indexes above) are pickled here, keyed by the hash of the DBC files and the cantools version
+DBC_CACHE_DIR = "./.dbc_cache/"
+
+
 def load_dbc_files() -> None:
-    """ Loads all DBC files. Only needs to be called once """
+    """ Loads all DBC files, from the on-disk cache if these exact files were parsed before. Only needs to be called once """
     
-    global DBCs
-    dbc_files = os.listdir("./resources/CAN-messages/")
-    DBCs = [ct.db.load_file(f"./resources/CAN-messages/{file}") for file in dbc_files if file.endswith(".dbc")]
+    global DBCs, MESSAGE_SIGNAL_TYPES, FAULT_SIGNALS, SIGNAL_UNITS
+    start = time.perf_counter()
+    # in file name order, not os.listdir order: it decides which DBC wins a frame ID defined twice (build_message_index)
+    # and must be the same on every run for the cache key
+    dbc_files = sorted(file for file in os.listdir(DBC_DIR) if file.endswith(".dbc"))
+    cache_path = os.path.join(DBC_CACHE_DIR, f"{_cache_key(dbc_files)}.pickle")
+
+    cached = _read_cache(cache_path)
+    if cached is not None:
+        DBCs, MESSAGE_SIGNAL_TYPES, FAULT_SIGNALS = cached["dbcs"], cached["message_signal_types"], cached["fault_signals"]
+        build_message_index()
+        SIGNAL_UNITS = _build_signal_units()
+        print(f"[DBC] Loaded {len(DBCs)} DBC files from cache in {(time.perf_counter() - start) * 1000:.1f} ms (warm)")
+        return
+
+    DBCs = [ct.db.load_file(os.path.join(DBC_DIR, file)) for file in dbc_files]
     # DBCs takes the files from DBC_FILES and turns each file into a DBC Object that has functions to access can msg types
 
+    MESSAGE_SIGNAL_TYPES = _build_message_signal_types()
+    FAULT_SIGNALS = _build_fault_signals()
+    build_message_index()
+    SIGNAL_UNITS = _build_signal_units()
+    print(f"[DBC] Parsed {len(DBCs)} DBC files in {(time.perf_counter() - start) * 1000:.1f} ms (cold)")
+
+    _write_cache(cache_path, {"dbcs": DBCs, "message_signal_types": MESSAGE_SIGNAL_TYPES, "fault_signals": FAULT_SIGNALS})
+
+
+def _cache_key(dbc_files: list[str]) -> str:
+    """ Hash of the cantools version plus the names and contents of all DBC files """
+
+    digest = hashlib.sha256(ct.__version__.encode())
+    for file in dbc_files:
+        digest.update(file.encode())
+        with open(os.path.join(DBC_DIR, file), "rb") as f:
+            digest.update(hashlib.sha256(f.read()).digest())
+    return digest.hexdigest()
+
+
+def _read_cache(cache_path: str) -> dict:
+    """ Returns the cached DBCs and indexes, or None if there is no usable cache entry """
+
+    if not os.path.exists(cache_path):
+        return None
+    try:
+        with open(cache_path, "rb") as f:
+            return pickle.load(f)
+    except Exception as e:  # e.g. truncated file, treat as a cache miss and parse again
+        print(f"[DBC] Ignoring unreadable DBC cache {cache_path}: {e}")
+        return None
+
+
+def _write_cache(cache_path: str, cached: dict) -> None:
+    """ Stores the cache entry and removes the ones for older DBC files. Failing to cache is not fatal """
+
+    try:
+        os.makedirs(DBC_CACHE_DIR, exist_ok=True)
+        for file in os.listdir(DBC_CACHE_DIR):
+            if file.endswith(".pickle"):
+                os.remove(os.path.join(DBC_CACHE_DIR, file))
+        tmp_path = cache_path + ".tmp"
+        with open(tmp_path, "wb") as f:
+            pickle.dump(cached, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp_path, cache_path)  # so a crash mid-write never leaves a partial cache entry behind
+    except Exception as e:
+        print(f"[DBC] Could not write DBC cache: {e}")
+
+
+def build_message_index() -> None:
+    """ (Re)builds MESSAGES_BY_ID from DBCs. The first DBC defining a frame ID wins, DBCs are in file name order """
+
+    MESSAGES_BY_ID.clear()
+    for db in DBCs:
+        for msg in db.messages:
+            MESSAGES_BY_ID.setdefault(msg.frame_id, (db, msg))
+
+
+def get_message_by_id(id: int) -> tuple:
+    """
+    Looks up the message definition for a frame ID in constant time
+
+    @param id: The message's ID as an int
+    @return: (database, message) tuple, or None if no DBC defines this exact ID
+    """
+    return MESSAGES_BY_ID.get(id)
+
 
 def get_messages_from_dbcs() -> dict:
     """ Returns a dictionary with message names as keys and a subdictionary of signal names and their types as values """
 
+    return MESSAGE_SIGNAL_TYPES
+
+
+def _build_message_signal_types() -> dict:
+    """ Builds the result of get_messages_from_dbcs() from DBCs """
+
     res = dict()
     for dbc in DBCs:
         for message in dbc.messages:
@@ -33,16 +136,34 @@ def get_messages_from_dbcs() -> dict:
     return res
 
 
+def get_signal_units() -> dict:
+    """ Returns a dictionary with message names as keys and a subdictionary of signal names and their units as values """
+
+    return SIGNAL_UNITS
+
+
+def _build_signal_units() -> dict:
+    """ Builds the result of get_signal_units() from DBCs. The first DBC defining a message name wins """
+
+    res = dict()
+    for dbc in DBCs:
+        for message in dbc.messages:
+            res.setdefault(message.name, {signal.name: signal.unit for signal in message.signals})
+    return res
+
+
 def get_fault_signals() -> list[str]:
     """
     Returns a list of all signal names that are faults.
     A signal is considered a fault if its comment contains 'fault' (case insensitive).
     """
+    return FAULT_SIGNALS
+
+
+def _build_fault_signals() -> list[str]:
+    """ Builds the result of get_fault_signals() from DBCs """
+
     fault_signals = []
-    
-    if DBCs is None:
-        return fault_signals
-    
     for dbc in DBCs:
         for message in dbc.messages:
             for signal in message.signals:
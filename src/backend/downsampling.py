@@ -2,16 +2,54 @@ from typing import Union, Iterable
 import numpy as np
 from numpy.typing import NDArray
 
+# MinMax-LTTB keeps the min and max of this many buckets per output point before running LTTB on them
+MINMAX_RATIO = 4
+
+
 def largest_triangle_three_buckets(
-    data: Union[Iterable[tuple[float, float]], NDArray[np.float64]], 
+    data: Union[Iterable[tuple[float, float]], NDArray[np.float64]],
     threshold: Union[int, None]
 ) -> NDArray[np.float64]:
     """
     Downsample data using the standard Largest Triangle Three Buckets (LTTB) algorithm.
 
+    The bucket bounds and the next-bucket averages are computed for all buckets at once (np.add.reduceat). Only picking
+    the point of each bucket stays a loop, since it depends on the point picked in the previous bucket.
+
+    Args:
+        data: Iterable of (x, y) pairs or numpy array shape (n, 2). Assumes x is sorted.
+        threshold: Desired number of points in the result (>= 3). If threshold >= n, returns data.
+
+    Returns:
+        numpy.ndarray of shape (m, 2) where m <= threshold.
+    """
+    if threshold is None or threshold <= 0:
+        return np.asarray(data)
+
+    data = np.asarray(data, dtype=float)
+    n = data.shape[0]
+    if n <= threshold:
+        return data
+
+    indices = _lttb_indices(data[:, 0], data[:, 1], threshold)
+    return data[indices]
+
+
+def minmax_lttb(
+    data: Union[Iterable[tuple[float, float]], NDArray[np.float64]],
+    threshold: Union[int, None],
+    ratio: int = MINMAX_RATIO
+) -> NDArray[np.float64]:
+    """
+    Downsample data with MinMax-LTTB: the data is split into threshold * ratio equal buckets, only the points with the
+    minimum and maximum y of each bucket are kept (vectorized), and LTTB picks the final points among those. The result
+    looks like plain LTTB (the extremes LTTB favours are kept), but only about 2 * threshold * ratio points go through
+    the LTTB loop, so the cost is a few passes over the data no matter how many points there are.
+
     Args:
         data: Iterable of (x, y) pairs or numpy array shape (n, 2). Assumes x is sorted.
         threshold: Desired number of points in the result (>= 3). If threshold >= n, returns data.
+        ratio: Number of min/max buckets per output point.
 
     Returns:
         numpy.ndarray of shape (m, 2) where m <= threshold.
@@ -23,46 +61,62 @@ def largest_triangle_three_buckets(
     n = data.shape[0]
     if n <= threshold:
         return data
+    if n <= 2 * threshold * ratio:  # nothing to gain from the preselection
+        return largest_triangle_three_buckets(data, threshold)
 
-    x = data[:, 0]
-    y = data[:, 1]
+    candidates = _minmax_indices(data[:, 1], threshold * ratio)
+    indices = _lttb_indices(data[candidates, 0], data[candidates, 1], threshold)
+    return data[candidates[indices]]
 
-    sampled = np.empty((threshold, 2), dtype=float)
-    sampled[0] = data[0]
-    sampled[-1] = data[-1]
 
+def _lttb_indices(x: NDArray[np.float64], y: NDArray[np.float64], threshold: int) -> NDArray[np.int64]:
+    """ Returns the indices of the points LTTB picks, len(x) must be greater than threshold """
+
+    n = x.shape[0]
     bucket_size = (n - 2) / (threshold - 2)
-    a_idx = 0
-
-    for i in range(1, threshold - 1):
-        # Bucket ranges for points to consider (current bucket)
-        range_start = int(np.floor((i - 1) * bucket_size)) + 1
-        range_end = int(np.floor(i * bucket_size)) + 1
-        range_end = min(range_end, n - 1)
-        if range_end <= range_start:
-            range_end = range_start + 1
-        idx_range = np.arange(range_start, range_end)
-
-        # Next bucket average for triangle apex reference
-        avg_start = int(np.floor(i * bucket_size)) + 1
-        avg_end = int(np.floor((i + 1) * bucket_size)) + 1
-        avg_end = min(avg_end, n)
-        if avg_end <= avg_start:
-            avg_end = avg_start + 1
-        avg_x = np.mean(x[avg_start:avg_end])
-        avg_y = np.mean(y[avg_start:avg_end])
-
-        # Compute triangle areas for all candidates with previous selected point a and next-bucket average
-        ax = x[a_idx]
-        ay = y[a_idx]
-        cx = avg_x
-        cy = avg_y
-        bx = x[idx_range]
-        by = y[idx_range]
 
+    # bucket i (1 .. threshold - 2) covers points [starts[i - 1], starts[i]), the one after it is averaged
+    starts = (np.floor(np.arange(threshold - 1) * bucket_size) + 1).astype(np.int64)
+    starts[-1] = min(starts[-1], n - 1)
+    counts = np.diff(np.r_[starts, n])
+    avg_x = (np.add.reduceat(x, starts) / counts)[1:].tolist()
+    avg_y = (np.add.reduceat(y, starts) / counts)[1:].tolist()
+    bounds = starts.tolist()
+
+    picked = np.empty(threshold, dtype=np.int64)
+    picked[0] = 0
+    picked[-1] = n - 1
+    a = 0
+    ax, ay = float(x[0]), float(y[0])
+    for i in range(threshold - 2):
+        start, end = bounds[i], bounds[i + 1]
+        bx = x[start:end]
+        by = y[start:end]
+        cx, cy = avg_x[i], avg_y[i]
+
+        # doubled triangle area between the previous pick a, each candidate b and the next bucket's average c
         areas = np.abs((ax - cx) * (by - ay) - (ax - bx) * (cy - ay))
-        max_index_in_range = np.argmax(areas)
-        a_idx = idx_range[max_index_in_range]
-        sampled[i] = (x[a_idx], y[a_idx])
+        a = start + int(areas.argmax())
+        picked[i + 1] = a
+        ax, ay = float(x[a]), float(y[a])
+    return picked
+
+
+def _minmax_indices(y: NDArray[np.float64], buckets: int) -> NDArray[np.int64]:
+    """
+    Returns the sorted indices of the first and last point and of the minimum and maximum of y in each of `buckets`
+    equally sized buckets (the last one may be shorter)
+    """
+    n = y.shape[0]
+    size = -(-(n - 2) // buckets)  # ceil, the first and last point are always kept
+    full = (n - 2) // size
+    inner = y[1:1 + full * size].reshape(full, size)
+    offsets = 1 + np.arange(full) * size
 
-    return sampled
\ No newline at end of file
+    parts = [np.zeros(1, dtype=np.int64), offsets + inner.argmin(axis=1), offsets + inner.argmax(axis=1)]
+    rest = 1 + full * size
+    if rest < n - 1:
+        tail = y[rest:n - 1]
+        parts += [np.array([rest + tail.argmin(), rest + tail.argmax()])]
+    parts.append(np.array([n - 1]))
+    return np.unique(np.concatenate(parts))
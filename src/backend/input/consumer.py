@@ -1,68 +1,193 @@
-import queue
+from queue import Empty
+import threading
 import time
 from backend.can_message import CanMessage, decode_message
 from backend.db_connection import DbConnection
+from backend.input.ingest_queue import IngestQueue
+import backend.latest_values as latest_values
 import backend.alert_checker as alertChecker
 
+# Maximum number of CanMessage objects held in memory between the producers and the consumer, and what to do with new
+# ones once it is reached (see IngestQueue). Spilling to disk never blocks the producers or loses messages
+QUEUE_MAX_SIZE = 50000
+QUEUE_OVERFLOW_POLICY = IngestQueue.SPILL
+
 # shared queue among all producers and this consumer, CanMessage objects
-queue = queue.Queue()
+queue = IngestQueue(QUEUE_MAX_SIZE, QUEUE_OVERFLOW_POLICY)
+
+# Alerts are checked in their own stage so the producers never wait for TriggeredAlerts writes or popups: every decoded
+# message also goes into alert_queue, which process_alerts_live works through in batches
+ALERT_QUEUE_MAX_SIZE = 50000
+ALERT_QUEUE_OVERFLOW_POLICY = IngestQueue.SPILL
+alert_queue = IngestQueue(ALERT_QUEUE_MAX_SIZE, ALERT_QUEUE_OVERFLOW_POLICY)
+ALERT_MAX_BATCH = 1000
+ALERT_MAX_LATENCY = 0.1
 
-# Time in seconds to wait before consuming all data from the queue each loop. This is done to prevent excessive database writes
-LOOP_TIME = 0.5
+# The live consumer writes a batch to the database as soon as it holds FLUSH_MAX_BATCH messages, or FLUSH_MAX_LATENCY
+# seconds after its first message arrived, whichever comes first. Both can be overridden per process_data_live call
+FLUSH_MAX_BATCH = 1000
+FLUSH_MAX_LATENCY = 0.1
 
 # Logic for live data processing
 last_consume_time = None  # the last time the consumer consumed data
 start_consume_time = time.perf_counter()  # the very first time when consumer started consuming
 
+# Sizes and durations of the live consumer's database writes, see get_flush_stats()
+flush_stats = {"flushes": 0, "messages": 0, "last_size": 0, "last_duration": 0.0, "max_size": 0, "max_duration": 0.0}
+flush_stats_lock = threading.Lock()
+
+# Time the producers spend in add_to_queue per frame (decoding and enqueueing), see get_producer_stats()
+producer_stats = {"frames": 0, "total_time": 0.0, "last_time": 0.0, "max_time": 0.0}
+producer_stats_lock = threading.Lock()
+
+# Batches and triggered alerts of the alert stage, see get_alert_stats()
+alert_stats = {"batches": 0, "messages": 0, "triggered": 0, "last_duration": 0.0, "max_duration": 0.0}
+alert_stats_lock = threading.Lock()
+
 
 def add_to_queue(id: int, data: bytes, timestamp: float) -> None:
-    """ Decodes and adds a CAN message to the queue, and performs checks """
+    """ Decodes and adds a CAN message to the queue and to the alert stage's queue """
 
+    start = time.perf_counter()
     can_msg = decode_message(id, data, timestamp)
     if can_msg is None:
         return  # invalid message, do not add to queue
 
-    # perform checks immediately
-    alertChecker.checkAlertsAgainstCanMsg(can_msg, data)
-
     queue.put(can_msg)
+    alert_queue.put(can_msg)
 
+    elapsed = time.perf_counter() - start
+    with producer_stats_lock:
+        producer_stats["frames"] += 1
+        producer_stats["total_time"] += elapsed
+        producer_stats["last_time"] = elapsed
+        producer_stats["max_time"] = max(producer_stats["max_time"], elapsed)
 
-def process_data() -> None:
-    """
-    Pops all stored tuples on CAN messages queue (each tuple representing a single CAN message) and adds them into the database
 
-    @return: Nothing, it will just add all CAN messages from the queue into the database
+def collect_batch(max_batch: int, max_latency: float, source: IngestQueue = None) -> list[CanMessage]:
     """
+    Blocks until a message is available, then keeps collecting messages until there are max_batch of them or max_latency
+    seconds have passed since the first one arrived
 
-    db_conn = DbConnection()
-    list_can_messages = []
-    while True:
-        if queue.empty():
+    @param source: the queue to collect from, defaults to the database queue
+    @return: list of CanMessage objects, empty if no message arrived within max_latency seconds
+    """
+    source = source or queue
+    try:
+        batch = [source.get(timeout=max_latency)]
+    except Empty:
+        return []
+
+    deadline = time.perf_counter() + max_latency
+    while len(batch) < max_batch:
+        remaining = deadline - time.perf_counter()
+        if remaining <= 0:
             break
-        can_msg = queue.get()
-        list_can_messages.append(can_msg)
+        try:
+            batch.append(source.get(timeout=remaining))
+        except Empty:
+            break
+    return batch
+
+
+def get_queue_stats() -> dict:
+    """ Returns the queue's current depth, high-water mark and overflow counters """
+
+    return queue.get_stats()
+
+
+def get_alert_queue_stats() -> dict:
+    """ Returns the alert queue's current depth, high-water mark and overflow counters """
+
+    return alert_queue.get_stats()
+
+
+def get_producer_stats() -> dict:
+    """ Returns the number of frames the producers handed to add_to_queue and the time it took per frame """
 
-    db_conn.add_batch_can_msg(list_can_messages)
+    with producer_stats_lock:
+        stats = dict(producer_stats)
+    stats["mean_time"] = stats["total_time"] / stats["frames"] if stats["frames"] else 0.0
+    return stats
 
 
-def process_data_live() -> None:
+def get_alert_stats() -> dict:
+    """ Returns a copy of the alert stage's statistics (batches, checked messages, triggered alerts, durations) """
+
+    with alert_stats_lock:
+        return dict(alert_stats)
+
+
+def get_flush_stats() -> dict:
+    """ Returns a copy of the live consumer's flush statistics (counts, and sizes/durations of the last and largest flush) """
+
+    with flush_stats_lock:
+        return dict(flush_stats)
+
+
+def _record_flush(size: int, duration: float) -> None:
+    with flush_stats_lock:
+        flush_stats["flushes"] += 1
+        flush_stats["messages"] += size
+        flush_stats["last_size"] = size
+        flush_stats["last_duration"] = duration
+        flush_stats["max_size"] = max(flush_stats["max_size"], size)
+        flush_stats["max_duration"] = max(flush_stats["max_duration"], duration)
+
+
+def process_data_live(max_batch: int = None, max_latency: float = None) -> None:
     """
-    Pops all stored tuples on CAN messages queue (each tuple representing a single CAN message) and adds them into the database. Runs forever
+    Pops CAN messages from the queue as they arrive and adds them into the database in batches. Runs forever
+
+    @param max_batch: flush once a batch holds this many messages, defaults to FLUSH_MAX_BATCH
+    @param max_latency: flush at most this many seconds after a batch's first message arrived, defaults to FLUSH_MAX_LATENCY
     """
 
     global start_consume_time, last_consume_time
     start_consume_time = time.perf_counter()
-    db_conn = DbConnection()
+    max_batch = max_batch or FLUSH_MAX_BATCH
+    max_latency = max_latency or FLUSH_MAX_LATENCY
 
     while True:
+        list_can_messages = collect_batch(max_batch, max_latency)
+        if not list_can_messages:
+            continue
+
         last_consume_time = time.perf_counter()
-        list_can_messages = []
-        while True:
-            if queue.empty():
-                break
-            can_msg = queue.get()
-            list_can_messages.append(can_msg)
-
-        db_conn.add_batch_can_msg(list_can_messages)
-        time.sleep(LOOP_TIME)
+        with DbConnection.writer() as db_conn:
+            db_conn.add_batch_can_msg(list_can_messages)
+        latest_values.update_from_can_msgs(list_can_messages)
+        _record_flush(len(list_can_messages), time.perf_counter() - last_consume_time)
+
+
+def process_alerts_live(max_batch: int = None, max_latency: float = None) -> None:
+    """
+    Pops CAN messages from the alert queue as they arrive and checks them against the alerts in batches, so triggered
+    alerts are written in one transaction and popups are coalesced per batch. Runs forever
+
+    @param max_batch: check once a batch holds this many messages, defaults to ALERT_MAX_BATCH
+    @param max_latency: check at most this many seconds after a batch's first message arrived, defaults to ALERT_MAX_LATENCY
+    """
+
+    max_batch = max_batch or ALERT_MAX_BATCH
+    max_latency = max_latency or ALERT_MAX_LATENCY
+
+    while True:
+        list_can_messages = collect_batch(max_batch, max_latency, alert_queue)
+        if not list_can_messages:
+            continue
+
+        start = time.perf_counter()
+        try:
+            triggered = alertChecker.checkAlertsAgainstCanMsgs(list_can_messages)
+        except Exception as e:  # a failing check must not stop the alert stage for the rest of the session
+            print(f"[ALERTS] Error checking {len(list_can_messages)} messages: {e}")
+            continue
+        duration = time.perf_counter() - start
+
+        with alert_stats_lock:
+            alert_stats["batches"] += 1
+            alert_stats["messages"] += len(list_can_messages)
+            alert_stats["triggered"] += triggered
+            alert_stats["last_duration"] = duration
+            alert_stats["max_duration"] = max(alert_stats["max_duration"], duration)
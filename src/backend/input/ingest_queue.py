@@ -0,0 +1,126 @@
+from queue import Queue, Full, Empty
+import pickle
+import tempfile
+import threading
+
+
+class IngestQueue:
+    """
+    Bounded FIFO between the producers and the consumer. What happens when it is full depends on the policy:
+    - "block": the producer waits until the consumer makes room
+    - "drop": the item is discarded and counted
+    - "spill": the item is appended to a file on disk, which the consumer replays (in order) once memory is drained
+
+    Has the same put()/get()/empty()/qsize() interface as queue.Queue.
+    """
+
+    BLOCK = "block"
+    DROP = "drop"
+    SPILL = "spill"
+
+    def __init__(self, maxsize: int, policy: str = SPILL):
+        if policy not in (IngestQueue.BLOCK, IngestQueue.DROP, IngestQueue.SPILL):
+            raise ValueError(f"Unknown overflow policy '{policy}'")
+        self.maxsize = maxsize
+        self.policy = policy
+        self.memory = Queue(maxsize)
+        self.lock = threading.Lock()  # guards everything below
+
+        self.high_water = 0
+        self.dropped = 0
+        self.spilled = 0
+        self.spill_file = None  # temporary file, created on first spill
+        self.spill_read_pos = 0
+        self.spill_pending = 0  # items in the spill file the consumer has not read yet
+
+
+    def put(self, item) -> None:
+        """ Adds an item, applying the overflow policy if the queue is full """
+
+        with self.lock:
+            # once spilling started, everything goes to disk until the consumer caught up, so the order is kept
+            if self.spill_pending == 0:
+                try:
+                    self.memory.put_nowait(item)
+                    self.__update_high_water()
+                    return
+                except Full:
+                    pass
+
+            if self.policy == IngestQueue.DROP:
+                self.dropped += 1
+                return
+            if self.policy == IngestQueue.SPILL:
+                self.__spill(item)
+                self.__update_high_water()
+                return
+
+        self.memory.put(item)  # BLOCK, outside the lock so the consumer can still get()
+        with self.lock:
+            self.__update_high_water()
+
+
+    def get(self, block: bool = True, timeout: float = None):
+        """ Removes and returns the oldest item, raises queue.Empty if there is none (within timeout) """
+
+        try:
+            return self.memory.get_nowait()
+        except Empty:
+            pass
+
+        with self.lock:
+            if self.spill_pending > 0:
+                return self.__unspill()
+
+        return self.memory.get(block, timeout)
+
+
+    def empty(self) -> bool:
+        return self.memory.empty() and self.spill_pending == 0
+
+
+    def qsize(self) -> int:
+        """ Current depth, counting items in memory and on disk """
+
+        return self.memory.qsize() + self.spill_pending
+
+
+    def get_stats(self) -> dict:
+        """ Returns the current depth, high-water mark and overflow counters """
+
+        with self.lock:
+            return {
+                "policy": self.policy,
+                "maxsize": self.maxsize,
+                "depth": self.memory.qsize() + self.spill_pending,
+                "spill_depth": self.spill_pending,
+                "high_water": self.high_water,
+                "dropped": self.dropped,
+                "spilled": self.spilled,
+            }
+
+
+    def __update_high_water(self) -> None:
+        self.high_water = max(self.high_water, self.memory.qsize() + self.spill_pending)
+
+
+    def __spill(self, item) -> None:
+        if self.spill_file is None:
+            self.spill_file = tempfile.TemporaryFile(prefix="can_ingest_spill_")
+        self.spill_file.seek(0, 2)  # append only
+        pickle.dump(item, self.spill_file, protocol=pickle.HIGHEST_PROTOCOL)
+        self.spill_pending += 1
+        self.spilled += 1
+
+
+    def __unspill(self):
+        self.spill_file.seek(self.spill_read_pos)
+        item = pickle.load(self.spill_file)
+        self.spill_read_pos = self.spill_file.tell()
+        self.spill_pending -= 1
+
+        if self.spill_pending == 0:  # caught up, start the file over so it does not grow forever
+            self.spill_file.seek(0)
+            self.spill_file.truncate()
+            self.spill_read_pos = 0
+        return item
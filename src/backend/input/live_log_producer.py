@@ -1,7 +1,7 @@
 import time
 from serial import Serial
 import serial.tools.list_ports
-from backend.input.logfile_producer import parse_line
+from backend.input.logfile_producer import LogParser
 import backend.input.consumer as consumer
 
 
@@ -23,6 +23,7 @@ def listen_to_serial():
         print("ERROR: ST-Link not found.")
         return
 
+    parser = LogParser()
     try:
         ser = Serial(port, baudrate=921600)
         print(f"Serial connection to {port} established. Listening...")
@@ -32,7 +33,7 @@ def listen_to_serial():
                 text = ser.readline().decode("utf-8").strip()
                 if text is None:
                     continue
-                text_tuple = parse_line(text)
+                text_tuple = parser.parse_line(text)
                 if text_tuple is None:
                     continue
                 id, data, timestamp = text_tuple # timestamp is derived from the log statement itself and therefore not used
@@ -1,4 +1,14 @@
 import backend.input.consumer as consumer
+import backend.alert_checker as alertChecker
+import backend.dbcs as dbcs
+from backend.batch_decode import payloads_to_uint64, group_by_message, decode_columns
+from backend.db_connection import DbConnection
+from concurrent.futures import ProcessPoolExecutor
+from collections import deque
+import numpy as np
+import binascii
+import mmap
+import os
 import time
 import re
 
@@ -6,17 +16,30 @@ import re
 # Time in seconds between reading lines of a log file and adding them to the queue
 LOOP_TIME = 0.01
 
+# Size in bytes of the chunks a log file is split into by process_logfile_parallel, each worker holds one chunk in memory
+CHUNK_SIZE = 16 * 1024 * 1024
+
+# Size in bytes of the blocks scan_logfile() runs the regex over, this bounds its memory use regardless of file size
+SCAN_BLOCK_SIZE = 4 * 1024 * 1024
+
 # Logfile format:               Timestamp                 ID                              Data Bytes
 pattern = re.compile(r'(\d{2}):(\d{2}):(\d{2}) .+ ID ([0-9A-FXa-fx]+) Length \d+ Data (0x[0-9A-Fa-f]+)')
 
-# These global vars are required for the non-live log-file processing
-msIncrementer = 0
-secondsPrevious = None
+# Same format as `pattern`, for matching many lines of raw bytes at once. Anchored to the start of each line, with the
+# lazy prefix finding the same (first) timestamp that pattern.search() finds, so there is at most one match per line
+block_pattern = re.compile(rb'^[^\n]*?(\d\d:\d\d:\d\d) [^\n]+ ID ([0-9A-FXa-fx]+) Length \d+ Data 0x([0-9A-Fa-f]+)', re.MULTILINE)
 
+# weight of each character of "HH:MM:SS" when converting it to seconds, the colons get 0
+_HMS_WEIGHTS = np.array([36000, 3600, 0, 600, 60, 0, 10, 1], dtype=np.int64)
 
-def parse_line(log_line: str) -> tuple[int, bytes, float]:
-    global msIncrementer, secondsPrevious
 
+def parse_fields(log_line: str) -> tuple[int, int, bytes]:
+    """
+    Parses a log line without any timestamp state
+
+    @param log_line: a single line of the log
+    @return: (whole seconds since midnight, id, data), or None if the line does not match the log format
+    """
     match = pattern.search(log_line)
     if match is None:  # if the line from the file does not match the REGEX, return none
         return None
@@ -25,18 +48,6 @@ def parse_line(log_line: str) -> tuple[int, bytes, float]:
     id_hex = match.group(4)
     data_hex = match.group(5)
 
-    # Convert time to seconds
-    seconds = hours * 3600 + minutes * 60 + seconds
-
-    # Check if the seconds have changed (First message just ignore), if it has not changed then increment
-    if secondsPrevious is not None and seconds == secondsPrevious:
-        msIncrementer += 5 # assume the current message is 5ms after the previous one
-    else:  # resets if it changes (or if it is the first message)
-        msIncrementer = 0
-        secondsPrevious = seconds
-
-    seconds += msIncrementer / 1000
-
     # Convert the ID to an integer
     if id_hex.startswith('0x') or id_hex.startswith('0X'):  # if formatted as hex (legacy log files)
         id_int = int(id_hex[2:], 16)
@@ -46,29 +57,258 @@ def parse_line(log_line: str) -> tuple[int, bytes, float]:
     # Convert the data to a byte object
     data_bytes = bytes.fromhex(data_hex[2:])
 
-    time_since_start = seconds
+    return (hours * 3600 + minutes * 60 + seconds, id_int, data_bytes)
 
-    cm_tuple = (id_int, data_bytes, time_since_start)
-    return cm_tuple
 
+def spread_timestamps(seconds: np.ndarray) -> np.ndarray:
+    """
+    Second pass of timestamp reconstruction: the log only has whole seconds, so the frames of each run of equal seconds
+    are spread evenly across that second, in file order (e.g. 4 frames in 12:00:01 get .0, .25, .5 and .75)
 
-def process_logfile(path_to_log_file: str) -> None:
-    """ Processes a log file and adds all CAN messages to the queue"""
+    @param seconds: whole seconds of consecutive frames, in file order
+    @return: float timestamps in seconds
+    """
+    seconds = np.asarray(seconds, dtype=np.int64)
+    n = seconds.shape[0]
+    if n == 0:
+        return np.empty(0, dtype=np.float64)
 
-    with open(path_to_log_file, 'r') as file:
-        for line in file:
-            cm_tup = parse_line(line)
-            if cm_tup is not None:  # if the line from log file followed the format, add to queue
-                consumer.add_to_queue(*cm_tup)
+    run_starts = np.flatnonzero(np.r_[True, seconds[1:] != seconds[:-1]])
+    run_lengths = np.diff(np.r_[run_starts, n])
+    run_ids = np.repeat(np.arange(run_starts.shape[0]), run_lengths)
+    position_in_run = np.arange(n) - run_starts[run_ids]
+    return seconds + position_in_run / run_lengths[run_ids]
+
+
+def _parse_block(matches: list[tuple[bytes, bytes, bytes]]) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """ Converts block_pattern matches into (whole seconds, ids, payloads) arrays, same as LogParser.parse_lines() """
+
+    n = len(matches)
+    if n == 0:
+        return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int64), np.empty((0, 8), dtype=np.uint8)
+
+    digits = np.frombuffer(b''.join([match[0] for match in matches]), dtype=np.uint8).reshape(n, 8).astype(np.int64) - ord('0')
+    seconds = digits @ _HMS_WEIGHTS
+
+    # hex (legacy log files) or decimal IDs
+    ids = np.array([int(match[1], 16) if match[1][1:2] in (b'x', b'X') else int(match[1]) for match in matches], dtype=np.int64)
+
+    # zero pad (or cut) every payload to 8 bytes, then convert all of them in one go
+    payloads = binascii.unhexlify(b''.join([match[2][:16].ljust(16, b'0') for match in matches]))
+    return seconds, ids, np.frombuffer(payloads, dtype=np.uint8).reshape(n, 8)
+
+
+def scan_logfile(path_to_log_file: str, start: int = 0, end: int = None):
+    """
+    Fast path for reading a log file: the file is memory mapped and block_pattern runs over SCAN_BLOCK_SIZE blocks of it,
+    instead of running `pattern` on every line. Memory use is bounded by the block size, not the file size.
+
+    @param path_to_log_file: path of the .log/.txt file
+    @param start: byte offset to start at, must be the start of a line
+    @param end: byte offset to stop at, must be the end of a line (or the end of the file, the default)
+    @return: generator of (whole seconds, ids, payloads) batches, as returned by LogParser.parse_lines()
+    """
+    size = os.path.getsize(path_to_log_file)
+    end = size if end is None else min(end, size)
+    if start >= end:  # also covers empty files, which cannot be memory mapped
+        return
+
+    with open(path_to_log_file, 'rb') as file, mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+        pos = start
+        while pos < end:
+            block_end = min(pos + SCAN_BLOCK_SIZE, end)
+            if block_end < end:  # extend the block to the end of the line it stops in
+                block_end = mm.find(b'\n', block_end, end) + 1 or end
+            yield _parse_block(block_pattern.findall(mm, pos, block_end))
+            pos = block_end
+
+
+class LogParser:
+    """
+    Turns log lines into (id, data, timestamp) tuples. Every producer uses its own LogParser, since reconstructing the
+    sub-second part of the timestamp needs state.
+    """
+
+    def __init__(self):
+        self.ms_incrementer = 0
+        self.seconds_previous = None
+
+    def parse_line(self, log_line: str) -> tuple[int, bytes, float]:
+        """
+        Single pass parsing, for when lines arrive one at a time. Frames within the same second are assumed to be 5 ms
+        apart.
+
+        @return: (id, data, timestamp) or None if the line does not match the log format
+        """
+        fields = parse_fields(log_line)
+        if fields is None:
+            return None
+        seconds, id_int, data_bytes = fields
+
+        # Check if the seconds have changed (First message just ignore), if it has not changed then increment
+        if self.seconds_previous is not None and seconds == self.seconds_previous:
+            self.ms_incrementer += 5 # assume the current message is 5ms after the previous one
+        else:  # resets if it changes (or if it is the first message)
+            self.ms_incrementer = 0
+            self.seconds_previous = seconds
+
+        return (id_int, data_bytes, seconds + self.ms_incrementer / 1000)
+
+    @staticmethod
+    def parse_lines(log_lines) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """
+        First pass of two pass parsing. Needs no state, so independent chunks of a file can be parsed concurrently;
+        pass the concatenated seconds of consecutive chunks to spread_timestamps() to get the timestamps.
+
+        @param log_lines: iterable of log lines
+        @return: (whole seconds, ids, payloads) arrays, payloads are zero padded to shape (n, 8)
+        """
+        seconds, ids, payloads = [], [], []
+        for line in log_lines:
+            fields = parse_fields(line)
+            if fields is None:  # line did not match the format
+                continue
+            seconds.append(fields[0])
+            ids.append(fields[1])
+            payloads.append(fields[2][:8].ljust(8, b'\x00'))
+
+        return (np.array(seconds, dtype=np.int64), np.array(ids, dtype=np.int64),
+                np.frombuffer(b''.join(payloads), dtype=np.uint8).reshape(-1, 8))
+
+
+def _chunk_ranges(path_to_log_file: str, chunk_size: int) -> list[tuple[int, int]]:
+    """ Splits a file into (start, end) byte ranges of about chunk_size bytes, every range ends on a line boundary """
+
+    size = os.path.getsize(path_to_log_file)
+    ranges = []
+    with open(path_to_log_file, 'rb') as file:
+        start = 0
+        while start < size:
+            end = min(start + chunk_size, size)
+            if end < size:
+                file.seek(end)
+                file.readline()  # move the boundary to the start of the next line
+                end = file.tell()
+            ranges.append((start, end))
+            start = end
+    return ranges
+
+
+def _init_worker() -> None:
+    """ Runs once in every worker process, which need the DBCs to decode (usually a warm load from the DBC cache) """
+
+    if dbcs.DBCs is None:
+        dbcs.load_dbc_files()
+
+
+def _parse_chunk(path_to_log_file: str, start: int, end: int) -> tuple[np.ndarray, dict]:
+    """
+    Parses and decodes the lines in one byte range of a log file. Runs in a worker process.
+
+    @return: (whole seconds of every frame in the chunk, {message_name: (columns, rows, frame IDs, payloads)}), where
+    columns are as returned by batch_decode.decode_columns and rows index into the seconds array
+    """
+    batches = list(scan_logfile(path_to_log_file, start, end))
+    if not batches:
+        return np.empty(0, dtype=np.int64), dict()
+    seconds, ids, payloads = (np.concatenate(arrays) for arrays in zip(*batches))
+    little, big = payloads_to_uint64(payloads)
+
+    groups = dict()
+    for name, (msg, rows) in group_by_message(ids).items():
+        groups[name] = (decode_columns(msg, little[rows], big[rows]), rows, ids[rows], payloads[rows])
+    return seconds, groups
+
+
+def _trailing_run(seconds: np.ndarray) -> np.ndarray:
+    """ Returns the last run of equal values in seconds """
+
+    changes = np.flatnonzero(seconds != seconds[-1])
+    return seconds[changes[-1] + 1:] if changes.size else seconds
+
+
+def _write_chunk(groups: dict, timestamps: np.ndarray) -> int:
+    """ Writes the decoded messages of one chunk and checks them for alerts, returns the number of messages """
+
+    frames = 0
+    for name, (columns, rows, ids, payloads) in groups.items():
+        columns['timeStamp'] = timestamps[rows]
+        with DbConnection.writer() as db_conn:
+            db_conn.add_batch_columns(name, columns)
+        alertChecker.checkAlertsAgainstColumns(name, columns, ids, payloads)
+        frames += len(rows)
+    alertChecker.checkExpressionAlertsAgainstGroups(groups)
+    return frames
+
+
+def process_logfile_parallel(path_to_log_file: str, workers: int = None) -> None:
+    """
+    Processes a log file with a pool of worker processes and writes all CAN messages straight into the database.
+    The file is split into chunks on line boundaries, each chunk is parsed and decoded in a worker, and the results are
+    written (and checked for alerts) in file order, so every table stays in timestamp order.
+
+    @param path_to_log_file: path of the .log/.txt file
+    @param workers: number of worker processes, defaults to one per core
+    """
+    start_time = time.perf_counter()
+    ranges = _chunk_ranges(path_to_log_file, CHUNK_SIZE)
+    workers = workers or os.cpu_count() or 1
+    frames = 0
+
+    # Chunks whose timestamps are not final yet: the last run of seconds of a chunk can continue into the next chunk,
+    # and spread_timestamps() needs the whole run. Everything but the newest chunk is written once a run ends in it.
+    unwritten = []
+    # Seconds of the run the last written chunk ended with, it may continue into the unwritten chunks
+    carry = np.empty(0, dtype=np.int64)
+
+    def write_unwritten(keep_last: bool) -> int:
+        nonlocal carry
+        all_seconds = np.concatenate([carry] + [seconds for seconds, _ in unwritten])
+        timestamps = spread_timestamps(all_seconds)
+        done = unwritten[:-1] if keep_last else unwritten
+        if not done:
+            return 0
+        offset = carry.shape[0]
+        written = 0
+        for seconds, groups in done:
+            written += _write_chunk(groups, timestamps[offset:offset + seconds.shape[0]])
+            offset += seconds.shape[0]
+        del unwritten[:len(done)]
+
+        carry = _trailing_run(all_seconds[:offset])
+        return written
+
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker) as executor:
+        pending = deque()
+        next_range = 0
+        while pending or next_range < len(ranges):
+            # keep a bounded number of chunks in flight, so finished results do not pile up in memory
+            while next_range < len(ranges) and len(pending) < 2 * workers:
+                pending.append(executor.submit(_parse_chunk, path_to_log_file, *ranges[next_range]))
+                next_range += 1
+
+            seconds, groups = pending.popleft().result()
+            if seconds.shape[0] == 0:
+                continue
+            run_continues = len(unwritten) > 0 and np.all(seconds == unwritten[-1][0][-1])
+            unwritten.append((seconds, groups))
+            if not run_continues:
+                frames += write_unwritten(keep_last=True)
+
+    if unwritten:
+        frames += write_unwritten(keep_last=False)
+
+    print(f"[PASTLOG] Processed {frames} CAN messages in {len(ranges)} chunks with {workers} workers in {time.perf_counter() - start_time:.1f} s")
 
 
 # Emphasize: For this function TimeStamp is NOT taken from logfile, it is system time
 def process_logfile_live(path_to_log_file: str) -> None:
     """ Mocks a live data source by incrementally processing a log file and adding CAN messages to the queue"""
 
+    parser = LogParser()
     with open(path_to_log_file, 'r') as file:
         for line in file:
-            cm_tup = parse_line(line)
+            cm_tup = parser.parse_line(line)
             if cm_tup is None: # line did not match the format
                 continue
             id, data, timestamp = cm_tup # timestamp is derived from the log statement itself and therefore not used
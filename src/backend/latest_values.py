@@ -0,0 +1,65 @@
+# Latest decoded values of every message type, kept in memory so the debug dashboard never has to query the database.
+# The consumer updates it whenever it writes a batch, in db/pastlog mode it is seeded once from the database.
+import threading
+from backend.can_message import CanMessage
+
+# message name -> (signals dict, timestamp) of the newest message of that type
+_latest = dict()
+_lock = threading.Lock()
+
+# incremented on every change, lets readers (e.g. a cached HTTP response) tell whether anything changed since last time
+_version = 0
+
+
+def update_from_can_msgs(can_msg_list: list[CanMessage]) -> None:
+    """ Stores the newest message of each type in can_msg_list, older ones than what is already stored are ignored """
+
+    global _version
+    newest = dict()
+    for can_msg in can_msg_list:
+        current = newest.get(can_msg.messageName)
+        if current is None or can_msg.timeStamp >= current.timeStamp:
+            newest[can_msg.messageName] = can_msg
+
+    with _lock:
+        for name, can_msg in newest.items():
+            stored = _latest.get(name)
+            if stored is None or can_msg.timeStamp >= stored[1]:
+                _latest[name] = (can_msg.sigDict, can_msg.timeStamp)
+        _version += 1
+
+
+def seed_from_db(db_conn) -> int:
+    """
+    Fills the snapshot with the newest row of every message table, replacing whatever was stored
+
+    @param db_conn: a DbConnection, reads one row per table through the timeStamp index
+    @return: the number of message types that have at least one row
+    """
+    global _version
+    seeded = dict()
+    for table_name in db_conn.get_message_table_names():
+        rows = db_conn.query(f"SELECT * FROM {table_name} ORDER BY timeStamp DESC LIMIT 1;")
+        if not rows:
+            continue
+        row = rows[0]
+        row.pop('count', None)
+        timestamp = row.pop('timeStamp', -1)
+        seeded[table_name] = (row, timestamp)
+
+    with _lock:
+        _latest.clear()
+        _latest.update(seeded)
+        _version += 1
+    return len(seeded)
+
+
+def get_snapshot() -> tuple[int, dict]:
+    """ Returns (version, {message name: (signals dict, timestamp)}), the dictionary is a copy and safe to iterate """
+
+    with _lock:
+        return _version, dict(_latest)
+
+
+def get_version() -> int:
+    return _version
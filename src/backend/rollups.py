@@ -0,0 +1,96 @@
+# Multi-resolution rollups of every signal, kept next to the raw message tables so zoomed out graphs read a few thousand
+# precomputed buckets instead of millions of rows. Each level splits time into buckets of a fixed width and stores, per
+# message, one row per bucket with the min, max, sum and count of every signal (mean = sum / count). Bucket b of a level
+# covers [b * width, (b + 1) * width) seconds. Bucket numbers of every level are derived from the one of the finest level
+# (see bucket_numbers), the same way in NumPy and in SQL, so incremental updates and rebuilds agree exactly.
+#
+# Rows written (DbConnection.add_batch_can_msg and add_batch_columns) are kept in memory and added to the rollups at most
+# every ROLLUP_FOLD_INTERVAL seconds, and at the end of a pastlog import (DbConnection.fold_rollups): all rows of a message
+# since the last fold are summarized into every level at once and merged with the buckets already stored. Rollups can
+# lag the newest rows by that interval. Databases written before rollups existed get them rebuilt with SQL
+# (DbConnection.build_rollups).
+import numpy as np
+from numpy.typing import NDArray
+
+# (name, bucket width in seconds), finest first. Each width must be a multiple of the previous one, coarser levels are
+# rebuilt from the finer ones. Most messages are sent every 10 to 100 ms, a finer level would be as large as the raw rows
+ROLLUP_LEVELS = (("100ms", 0.1), ("1s", 1.0), ("10s", 10.0), ("1min", 60.0))
+# number of finest buckets per bucket of each level
+ROLLUP_RATIOS = tuple(round(width / ROLLUP_LEVELS[0][1]) for _, width in ROLLUP_LEVELS)
+
+# rollup tables are named rollup_<level>_<message>
+ROLLUP_TABLE_PREFIX = "rollup_"
+
+# rows written are added to the rollups at most this many seconds apart. Every fold writes each message type's tables once,
+# whatever the number of rows, so folding more often slows writing down
+ROLLUP_FOLD_INTERVAL = 1.0
+
+# suffixes of the columns each signal gets in a rollup table
+ROLLUP_COLUMNS = ("min", "max", "sum", "count")
+
+
+def rollup_table_name(level: str, message_name: str) -> str:
+    return f"{ROLLUP_TABLE_PREFIX}{level}_{message_name}"
+
+
+def choose_level(start_time: float, end_time: float, viewport_width: int) -> int:
+    """
+    Returns the index (into ROLLUP_LEVELS) of the coarsest level that still has at least one bucket per pixel in the
+    time range, None if even the finest level is too coarse and the raw rows have to be used
+    """
+    for index in reversed(range(len(ROLLUP_LEVELS))):
+        if (end_time - start_time) / ROLLUP_LEVELS[index][1] >= viewport_width:
+            return index
+    return None
+
+
+def bucket_numbers(timestamps: NDArray[np.float64], index: int) -> NDArray[np.int64]:
+    """ The bucket of each timestamp in level ROLLUP_LEVELS[index], in SQL: CAST(timeStamp / 0.1 AS INTEGER) / ratio """
+
+    return np.floor(timestamps / ROLLUP_LEVELS[0][1]).astype(np.int64) // ROLLUP_RATIOS[index]
+
+
+def aggregate(buckets: NDArray[np.int64], values: NDArray[np.float64]) -> NDArray[np.float64]:
+    """
+    Summarizes rows into the buckets of one level, every signal at once
+
+    @param buckets: the bucket of each row, see bucket_numbers()
+    @param values: array of shape (rows, signals) with the value of each signal in each row, NaN where it is missing
+    @return: array of shape (buckets, 1 + 4 * signals), one row per bucket: the bucket number, then the min, max, sum
+    and count of each signal (the column order of the rollup tables). min and max are NaN (stored as NULL) for buckets
+    without a value of the signal
+    """
+    steps = np.diff(buckets)
+    if (steps < 0).any():  # rows are nearly always in time order already
+        order = np.argsort(buckets, kind='stable')
+        buckets = buckets[order]
+        values = values[order]
+        steps = np.diff(buckets)
+    starts = np.concatenate(([0], np.flatnonzero(steps) + 1))
+
+    present = ~np.isnan(values)
+    summaries = np.empty((starts.shape[0], 1 + len(ROLLUP_COLUMNS) * values.shape[1]))
+    summaries[:, 0] = buckets[starts]
+    summaries[:, 1::4] = np.fmin.reduceat(values, starts, axis=0)  # fmin/fmax skip NaN
+    summaries[:, 2::4] = np.fmax.reduceat(values, starts, axis=0)
+    summaries[:, 3::4] = np.add.reduceat(np.where(present, values, 0.0), starts, axis=0)
+    summaries[:, 4::4] = np.add.reduceat(present, starts, axis=0, dtype=np.int64)
+    return summaries
+
+
+def bucket_points(buckets: NDArray[np.float64], minimums: NDArray[np.float64], maximums: NDArray[np.float64],
+                  index: int) -> NDArray[np.float64]:
+    """
+    Turns the buckets of one signal into graph points: the min and the max of every bucket at its center, so spikes
+    shorter than a bucket still show up
+
+    @param buckets: bucket numbers in level ROLLUP_LEVELS[index]; minimums/maximums: the signal's min and max per bucket
+    @return: array of shape (points, 2) with (x, y) rows, buckets without values (NaN) are left out
+    """
+    present = ~np.isnan(minimums)
+    centers = (buckets[present] + 0.5) * ROLLUP_LEVELS[index][1]
+    points = np.empty((centers.shape[0] * 2, 2))
+    points[0::2, 0] = points[1::2, 0] = centers
+    points[0::2, 1] = minimums[present]
+    points[1::2, 1] = maximums[present]
+    return points
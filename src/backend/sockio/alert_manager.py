@@ -1,5 +1,7 @@
 from flask import render_template, request, jsonify
 import backend.alert_checker as alertChecker
+import backend.backtest as backtest
+from backend.alert_expressions import AlertExpression
 from backend.db_connection import DbConnection
 import backend.dbcs as dbcs
 from backend.sockio.socket import socketio, app
@@ -10,6 +12,12 @@ message_list = list()
 alert_definitions = dict() # {1: alert1, 2: alert2, 3: alert3, ...}
 alertsCreated = 0
 
+# rows per /get_triggered_alerts response if no limit is given, and the largest limit accepted
+TRIGGERED_ALERTS_PAGE_SIZE = 1000
+TRIGGERED_ALERTS_MAX_LIMIT = 10000
+# most ids accepted in the ids parameter, each one is a bound variable of the query
+TRIGGERED_ALERTS_MAX_IDS = 500
+
 
 @app.route('/logger/alert_manager')
 def alert_manager():
@@ -32,11 +40,21 @@ def create_alert():
     global alertsCreated
     global alert_definitions
 
-    logger_db = DbConnection()
     data = request.json 
     
     try:
-        alert_id = logger_db.create_alert(data)
+        if data.get('type') in alertChecker.THRESHOLD_TYPES:
+            alertChecker.compileComparisons(data['type'], data.get('comparisons', []))  # raises ValueError if invalid
+        elif data.get('type') == 'bool':
+            alertChecker.parseBoolValue(data.get('value'))  # raises ValueError if it is not true/false
+        elif data.get('type') == 'expression':
+            known = {signal for signals in dbcs.get_signal_units().values() for signal in signals}
+            unknown = AlertExpression(data.get('expression') or '').signals - known  # raises ValueError if invalid
+            if unknown:
+                raise ValueError(f"Unknown signals in expression: {', '.join(sorted(unknown))}")
+        with DbConnection.writer() as logger_db:
+            alert_id = logger_db.create_alert(data)
+        alertChecker.invalidateAlertRegistry()
         socketio.emit('big_popup_event', {
             'message': 'Request to create alert was triggered.'
         })
@@ -63,9 +81,9 @@ def create_alert():
 def get_alerts():
     alertChecker.fetchActiveAlerts()
     try:
-        logger_db = DbConnection()
-        query = "SELECT * FROM Alerts"
-        alerts = logger_db.query(query)
+        with DbConnection.reader() as logger_db:
+            query = "SELECT * FROM Alerts"
+            alerts = logger_db.query(query)
         return jsonify({"status": "success", "alerts": alerts}), 200
     except Exception as e:
         print(f"Error fetching alerts: {e}")
@@ -75,21 +93,80 @@ def get_alerts():
 @app.route('/delete_alert', methods=['POST'])
 def delete_alert():
     alert_id = request.json['alert_id']
-    logger_db = DbConnection()
-    logger_db.delete_alert(alert_id)
+    alertChecker.deleteAlert(alert_id)
     return jsonify({"status": "success", "message": "Alert deleted"}), 200
 
 
 @app.route('/get_triggered_alerts', methods=['GET'])
 def get_triggered_alerts():
-    logger_db = DbConnection()
-    query = "SELECT * FROM TriggeredAlerts"
-    triggered_alerts = logger_db.query(query)
-    
+    """
+    Returns triggered alerts in pages, oldest first, with the name of their alert.
+
+    Query parameters (all optional):
+        - since_id: only alerts with a greater id. Clients pass the last_id of their previous response to get new rows only
+        - ids: comma separated ids that are returned as well (e.g. rows shown as still active, their count can change),
+          at most TRIGGERED_ALERTS_MAX_IDS
+        - before_id: only alerts with a smaller id, for loading older pages
+        - limit / offset: page size (default TRIGGERED_ALERTS_PAGE_SIZE, at most TRIGGERED_ALERTS_MAX_LIMIT) and rows to skip
+        - category: only alerts of this category
+        - start_time / end_time: only alerts whose CAN message timestamp is within this range (seconds)
+        - order: 'desc' for newest first
+    Response: {"status", "triggered_alerts", "last_id" (greatest id returned, or since_id), "has_more"}
+    """
+    args = request.args
+    try:
+        ids = [int(id) for id in args['ids'].split(',') if id] if args.get('ids') else None
+        if ids and len(ids) > TRIGGERED_ALERTS_MAX_IDS:
+            raise ValueError(f"at most {TRIGGERED_ALERTS_MAX_IDS} ids")
+        since_id = args.get('since_id', type=int)
+        before_id = args.get('before_id', type=int)
+        limit = max(1, min(int(args.get('limit', TRIGGERED_ALERTS_PAGE_SIZE)), TRIGGERED_ALERTS_MAX_LIMIT))
+        offset = int(args.get('offset', 0))
+        start_time = float(args['start_time']) if args.get('start_time') else None
+        end_time = float(args['end_time']) if args.get('end_time') else None
+    except ValueError as e:
+        return jsonify({"status": "error", "message": f"Invalid parameter: {e}"}), 400
+
+    with DbConnection.reader() as logger_db:
+        triggered_alerts = logger_db.get_triggered_alerts(since_id, ids, args.get('category'), start_time, end_time,
+                                                          limit + 1, offset, args.get('order') == 'desc', before_id)
+
+    has_more = len(triggered_alerts) > limit
+    triggered_alerts = triggered_alerts[:limit]
     # Convert any bytes in can_message_data to a hex string
     for alert in triggered_alerts:
-        if 'can_message_data' in alert and isinstance(alert['can_message_data'], bytes):
+        if isinstance(alert['can_message_data'], bytes):
             alert['can_message_data'] = alert['can_message_data'].hex()
-        alert['name'] = logger_db.get_alert_name(alert['alert_id'])
-    
-    return jsonify({"status": "success", "triggered_alerts": triggered_alerts}), 200
\ No newline at end of file
+
+    last_id = max((alert['id'] for alert in triggered_alerts), default=since_id)
+    return jsonify({"status": "success", "triggered_alerts": triggered_alerts, "last_id": last_id, "has_more": has_more}), 200
+
+
+@app.route('/backtest_alert', methods=['POST'])
+def backtest_alert():
+    """
+    Evaluates alerts against the data already in the database and returns the intervals they would have been active for.
+
+    Request body (all optional):
+        - alert: an alert definition in the same format as /create_alert, does not need to be saved first
+        - alert_id: id of a saved alert, used if no definition is given. All saved alerts if neither is given
+        - start_time / end_time: time range in seconds, the whole database if not given
+    """
+    data = request.json or dict()
+
+    try:
+        if data.get('alert'):
+            alerts = [backtest.alert_from_definition(data['alert'])]
+        else:
+            alerts = backtest.get_active_alerts()
+            if data.get('alert_id') is not None:
+                alerts = [alert for alert in alerts if alert['id'] == int(data['alert_id'])]
+
+        intervals = backtest.backtest_alerts(alerts, data.get('start_time'), data.get('end_time'))
+        return jsonify({"status": "success", "intervals": intervals}), 200
+
+    except ValueError as e:
+        return jsonify({"status": "error", "message": str(e)}), 400
+    except Exception as e:
+        print(f"Error backtesting alerts: {e}")
+        return jsonify({"status": "error", "message": str(e)}), 500
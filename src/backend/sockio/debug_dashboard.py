@@ -1,76 +1,81 @@
+import threading
+import time
 import backend.dbcs as dbcs
 from backend.sockio.socket import socketio, app 
 from backend.db_connection import DbConnection
-from flask import jsonify
+import backend.input.consumer as consumer
+import backend.latest_values as latest_values
+import backend.rollups as rollups
+from flask import jsonify, request
 
 
-message_list = list()
+# (snapshot version, JSON body) of the last /get_latest_message call, reused until the snapshot changes
+latest_response = None
+
+# Clients subscribed with 'subscribe_latest' get 'latest_update' events with only the signals that changed since their
+# previous update, at most LIVE_PUSH_MAX_RATE times per second (a client can ask for less). Changes in between are
+# coalesced, a client only ever receives the newest values
+LIVE_PUSH_MAX_RATE = 4.0
+
+# sid -> {"messages": set of subscribed message names (empty = all), "interval": seconds between updates,
+# "next_push": perf_counter time, "sent": {message name: (timestamp, signals dict) as last sent to the client}}
+subscribers = dict()
+subscribers_lock = threading.Lock()
+push_task_started = False
 
 @app.route('/get_table_names', methods=['GET'])
 def get_table_names():
     """ Returns the names of all tables in the database. """
 
     try:
-        logger_db = DbConnection()
-        tables = logger_db.query("SELECT name FROM sqlite_master WHERE type='table';")
-        table_names = [table['name'] for table in tables]
-        return jsonify({"table_names": table_names})
+        with DbConnection.reader() as logger_db:
+            tables = logger_db.query("SELECT name FROM sqlite_master WHERE type='table';")
+            table_names = [table['name'] for table in tables if not table['name'].startswith(rollups.ROLLUP_TABLE_PREFIX)]
+            return jsonify({"table_names": table_names})
     except Exception as e:
         app.logger.error(f"Error fetching table names: {str(e)}")
         return jsonify({"error": "Unable to fetch table names"}), 500
 
 
-@app.route('/get_latest_message', methods=['GET'])
-def get_latest_message_batch():
-    """ Returns the latest message for each message (table) in the database. """
+@app.route('/get_ingest_stats', methods=['GET'])
+def get_ingest_stats():
+    """ Returns the ingest and alert queues' depth/high-water marks, the producers' time per frame, and the statistics of
+    the live consumer's flushes and the alert stage. """
 
-    logger_db = DbConnection()
-    message_batch = list()
+    return jsonify({
+        "queue": consumer.get_queue_stats(),
+        "flush": consumer.get_flush_stats(),
+        "producer": consumer.get_producer_stats(),
+        "alert_queue": consumer.get_alert_queue_stats(),
+        "alerts": consumer.get_alert_stats()
+    })
 
-    tables = logger_db.query("SELECT name FROM sqlite_master WHERE type='table';")
 
-    # add tables here to ignore when getting latest message batch
-    IGNORED_TABLES = ["sqlite_sequence", "Alerts", "TriggeredAlerts"]
-    for table in tables:
-        table_name = table['name']
-        if table_name in IGNORED_TABLES:
-            continue
+@app.route('/get_latest_message', methods=['GET'])
+def get_latest_message_batch():
+    """ Returns the latest message for each message type, served from the in-memory snapshot (see latest_values). """
 
-        columns = logger_db.query(f"PRAGMA table_info({table_name});")
-        column_names = [col['name'] for col in columns if col['name'].lower() != 'count']
+    global latest_response
+    version, snapshot = latest_values.get_snapshot()
+    if latest_response is not None and latest_response[0] == version:
+        return app.response_class(latest_response[1], mimetype="application/json")
 
-        if not column_names:
-            continue
+    message_batch = list()
+    signal_units = dbcs.get_signal_units()
 
-        column_list = ', '.join(column_names)
-        row = logger_db.query(f"SELECT {column_list} FROM {table_name} ORDER BY timeStamp DESC LIMIT 1;")
+    # every message type from the DBCs, plus tables of an opened database that the current DBCs do not define
+    message_names = list(signal_units) + [name for name in snapshot if name not in signal_units]
+    for message_name in message_names:
+        message_data, timestamp = snapshot.get(message_name, (dict(), -1))
 
-        if row:
-            timestamp = row[0].pop('timeStamp', -1)
-            message_data = row[0]
-        else:
-            timestamp = -1
-            message_data = dict()
-
-        message_data_with_units = {}
-        dbc_msg = None
-        for dbc in dbcs.DBCs:
-            for msg in dbc.messages:
-                if msg.name == table_name:
-                    dbc_msg = msg
-                    break
-            if dbc_msg:
-                break
-        if dbc_msg:
-            for signal in dbc_msg.signals:
-                val = message_data.get(signal.name)
-                message_data_with_units[signal.name] = {"value": val, "unit": signal.unit}
+        units = signal_units.get(message_name)
+        if units is not None:
+            message_data_with_units = {signal: {"value": message_data.get(signal), "unit": unit} for signal, unit in units.items()}
         else:
-            for k, v in message_data.items():
-                message_data_with_units[k] = {"value": v, "unit": None}
+            message_data_with_units = {signal: {"value": value, "unit": None} for signal, value in message_data.items()}
 
         message_batch.append({
-            'table_name': table_name,
+            'table_name': message_name,
             'data': message_data_with_units,
             'timestamp': timestamp
         })
@@ -79,17 +84,121 @@ def get_latest_message_batch():
         return jsonify({'message': 'No new messages'})
 
     # Prepare response
-    messages = message_batch
     table_names = list({msg['table_name'] for msg in message_batch})
     keys = list({key for msg in message_batch for key in msg['data'].keys()})
 
-    message_list.extend(messages)
-    if len(message_list) > 1:
-        message_list.pop(0)
-
-    return jsonify({
-        'messages': messages,
+    response = {
+        'messages': message_batch,
         'table_names': table_names,
         'timestamp': message_batch[0]["timestamp"],
         'keys': keys
-    })
+    }
+    body = jsonify(response).get_data()
+    latest_response = (version, body)
+    return app.response_class(body, mimetype="application/json")
+
+
+@socketio.on('subscribe_latest')
+def handle_subscribe_latest(data):
+    """
+    (Re)subscribes the client to live updates of the latest values, and immediately sends the current values of every
+    subscribed message.
+
+    Args:
+        data: Dictionary containing:
+            - messages: names of the messages to receive, all messages if empty or missing
+            - max_rate: optional, maximum number of updates per second (capped at LIVE_PUSH_MAX_RATE)
+    """
+    global push_task_started
+    data = data or dict()
+    max_rate = min(float(data.get('max_rate') or LIVE_PUSH_MAX_RATE), LIVE_PUSH_MAX_RATE)
+    client = {
+        "messages": set(data.get('messages') or []),
+        "interval": 1 / max(max_rate, 0.01),
+        "next_push": 0.0,
+        "sent": dict(),
+    }
+
+    # the first update is sent before the client is visible to the push task, so the two never touch it at once
+    _, snapshot = latest_values.get_snapshot()
+    _push_to_client(request.sid, client, snapshot)
+
+    with subscribers_lock:
+        subscribers[request.sid] = client
+        if not push_task_started:
+            push_task_started = True
+            socketio.start_background_task(target=push_latest_updates)
+
+
+@socketio.on('unsubscribe_latest')
+def handle_unsubscribe_latest():
+    with subscribers_lock:
+        subscribers.pop(request.sid, None)
+
+
+def push_latest_updates() -> None:
+    """ Background task, sends each subscriber the changes since its last update. Runs forever """
+
+    last_version = None
+    while True:
+        socketio.sleep(1 / LIVE_PUSH_MAX_RATE)
+        with subscribers_lock:
+            # the disconnect handler lives in socket.py, drop clients that went away here
+            for sid in [sid for sid in subscribers if not socketio.server.manager.is_connected(sid, '/')]:
+                del subscribers[sid]
+            clients = list(subscribers.items())
+
+        version, snapshot = latest_values.get_snapshot()
+        if version == last_version:
+            continue
+
+        now = time.perf_counter()
+        pending = False
+
+        for sid, client in clients:
+            if now < client["next_push"]:
+                pending = True  # this client is rate limited, look at this version again on the next tick
+                continue
+            client["next_push"] = now + client["interval"]
+            _push_to_client(sid, client, snapshot)
+
+        if not pending:
+            last_version = version
+
+
+def _push_to_client(sid: str, client: dict, snapshot: dict) -> None:
+    """ Emits the subscribed messages whose timestamp changed since they were last sent to this client """
+
+    signal_units = dbcs.get_signal_units()
+    if client["messages"]:
+        message_names = [name for name in client["messages"] if name in signal_units or name in snapshot]
+    else:
+        message_names = list(signal_units) + [name for name in snapshot if name not in signal_units]
+
+    updates = list()
+    for message_name in message_names:
+        values, timestamp = snapshot.get(message_name, (dict(), -1))
+        sent = client["sent"].get(message_name)
+
+        if sent is None:
+            # first update of this message for the client, includes every signal and their units
+            units = signal_units.get(message_name) or {signal: None for signal in values}
+            updates.append({
+                'table_name': message_name,
+                'timestamp': timestamp,
+                'signals': {signal: values.get(signal) for signal in units},
+                'units': units
+            })
+        elif sent[0] != timestamp:
+            previous = sent[1]
+            updates.append({
+                'table_name': message_name,
+                'timestamp': timestamp,
+                'signals': {signal: value for signal, value in values.items() if previous.get(signal) != value}
+            })
+        else:
+            continue
+        client["sent"][message_name] = (timestamp, values)
+
+    if updates:
+        socketio.emit('latest_update', {'messages': updates}, to=sid)
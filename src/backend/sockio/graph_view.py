@@ -1,12 +1,126 @@
+import json
+import struct
 import numpy as np
-from flask import render_template, jsonify, request
+from concurrent.futures import ThreadPoolExecutor
+from flask import render_template, jsonify, request, Response
 from ..db_connection import DbConnection as dbconnect
 from ..dbcs import get_messages_from_dbcs
-from ..downsampling import largest_triangle_three_buckets
-import numpy as np
+from ..downsampling import largest_triangle_three_buckets, minmax_lttb
+from .. import rollups
 
 from .socket import app, socketio
 
+# The signals of a bulk request are grouped by message, each message table is read once for all of its signals. The
+# groups are fetched and downsampled concurrently, each on its own read-only connection (see DbConnection.reader())
+GRAPH_FETCH_WORKERS = 4
+fetch_pool = ThreadPoolExecutor(max_workers=GRAPH_FETCH_WORKERS, thread_name_prefix="graph_fetch")
+
+# most points sent per signal, whatever the zoom level and viewport width
+ABSOLUTE_POINT_CAP = 2500
+
+# Bulk requests can ask for "format": "binary" instead of JSON lists. The response is a little-endian uint32 with the
+# length of a JSON header, the header (padded with spaces so the buffers start 8-byte aligned), then the x values of
+# every signal as float64 (timestamps need the precision), then the y values of every signal as "value_type", both in
+# the order of the header's "signals": [{"id", "points"}, ...]
+BINARY_VALUE_TYPES = {"float32": "<f4", "float64": "<f8"}
+
+
+def fetch_message_points(db_conn: dbconnect, message_name: str, signal_names: list[str], start_time: float,
+                         end_time: float, viewport_width: int) -> dict:
+    """
+    Returns the (timeStamp, value) points of signals of one message in a time range, read with a single query: from the
+    coarsest rollup level that still has a bucket per pixel (min and max of each bucket, see rollups.py), or from the
+    raw rows when zoomed in further than that
+
+    @return: signal name -> array of shape (points, 2) in time order, without NaN/None values
+    """
+    # the level is chosen for the part of the range that has data, a padded or open ended range would get one too coarse
+    first_time, last_time = db_conn.get_time_bounds(message_name)
+    if first_time is None:
+        return {signal_name: np.empty((0, 2)) for signal_name in signal_names}
+    start_time, end_time = max(float(start_time), first_time), min(float(end_time), last_time)
+
+    index = rollups.choose_level(start_time, end_time, int(viewport_width))
+    if index is not None:
+        rows = db_conn.get_rollup_buckets(message_name, signal_names, index, start_time, end_time)
+        return {signal_name: rollups.bucket_points(rows[:, 0], rows[:, 1 + 2 * i], rows[:, 2 + 2 * i], index)
+                for i, signal_name in enumerate(signal_names)}
+
+    rows = db_conn.fetch_range(message_name, signal_names, start_time, end_time)
+    points = dict()
+    for i, signal_name in enumerate(signal_names):
+        finite_mask = np.isfinite(rows[:, 0]) & np.isfinite(rows[:, 1 + i])
+        points[signal_name] = rows[:, [0, 1 + i]][finite_mask]
+    return points
+
+
+def downsample_points(data_points: np.ndarray, zoom_level: int, viewport_width: int) -> np.ndarray:
+    """ Downsamples the points of one signal to what the zoom level and viewport width can show """
+
+    # Calculate number of points to keep based on zoom level and viewport width
+    safe_div = max(1, (11 - int(zoom_level)))
+    base_points = max(100, len(data_points) // safe_div)
+    pixel_cap = max(500, int(3 * int(viewport_width)))
+    target_points = min(len(data_points), base_points, pixel_cap, ABSOLUTE_POINT_CAP)
+
+    # Apply downsampling, if rows are extremely large relative to target MinMax-LTTB preselects the extremes
+    if len(data_points) > target_points * 50:
+        return minmax_lttb(data_points, target_points)
+    return largest_triangle_three_buckets(data_points, target_points)
+
+
+def fetch_visible_range(signal_ids: list[str], start_time: float, end_time: float, zoom_level: int,
+                        viewport_width: int) -> dict:
+    """
+    Fetches and downsamples signals over a time window, one query and one pool thread per message
+
+    @param signal_ids: "Message.signal" ids, unknown ones get no points
+    @return: signal id -> array of shape (points, 2) with (x, y) rows, in the order of signal_ids
+    """
+    messages = get_messages_from_dbcs()
+    points_by_signal = {sid: np.empty((0, 2)) for sid in signal_ids}
+    signals_by_message = dict()
+    for sid in points_by_signal:
+        message_name, _, signal_name = sid.partition('.')
+        if signal_name in messages.get(message_name, ()):
+            signals_by_message.setdefault(message_name, []).append(signal_name)
+
+    def fetch_message(message_name: str, signal_names: list[str]) -> dict:
+        with dbconnect.reader() as db_conn:
+            points = fetch_message_points(db_conn, message_name, signal_names, start_time, end_time, viewport_width)
+        return {f"{message_name}.{signal_name}": downsample_points(dp, zoom_level, viewport_width) if len(dp) else dp
+                for signal_name, dp in points.items()}
+
+    futures = [fetch_pool.submit(fetch_message, message_name, signal_names)
+               for message_name, signal_names in signals_by_message.items()]
+    for future in futures:
+        try:
+            points_by_signal.update(future.result())
+        except Exception:
+            pass  # the signals of that message stay empty
+    return points_by_signal
+
+
+def points_to_json(points_by_signal: dict) -> dict:
+    """ signal id -> {'x': [...], 'y': [...]} for the JSON responses """
+
+    return {sid: { 'x': points[:, 0].tolist(), 'y': points[:, 1].tolist() } for sid, points in points_by_signal.items()}
+
+
+def points_to_binary(points_by_signal: dict, value_type: str) -> bytes:
+    """ Packs the points of every signal into the binary format described at BINARY_VALUE_TYPES """
+
+    header = json.dumps({
+        "status": "success",
+        "value_type": value_type,
+        "signals": [{"id": sid, "points": len(points)} for sid, points in points_by_signal.items()]
+    }).encode()
+    header += b" " * (-(4 + len(header)) % 8)
+    parts = [struct.pack("<I", len(header)), header]
+    parts += [points[:, 0].astype("<f8").tobytes() for points in points_by_signal.values()]
+    parts += [points[:, 1].astype(BINARY_VALUE_TYPES[value_type]).tobytes() for points in points_by_signal.values()]
+    return b"".join(parts)
+
 
 @socketio.on('request_data_range')
 def handle_data_range_request(data):
@@ -31,44 +145,19 @@ def handle_data_range_request(data):
         # Parse signal ID to get message name and signal name
         message_name, signal_name = signal_id.split('.')
         
-        # Query the database for the data in the specified range
-        db_conn = dbconnect()
-        query = f"""
-            SELECT {signal_name}, timeStamp 
-            FROM {message_name} 
-            WHERE timeStamp BETWEEN {start_time} AND {end_time}
-            ORDER BY timeStamp
-        """
-        results = db_conn.query(query)
+        # Query the database (or its rollups) for the data in the specified range
+        with dbconnect.reader() as db_conn:
+            data_points = fetch_message_points(db_conn, message_name, [signal_name], start_time, end_time, viewport_width)[signal_name]
         
-        if not results:
+        if not len(data_points):
             socketio.emit('data_range_update', {
                 'signal_id': signal_id,
                 'data': []
             })
             return
-        
-        # Convert results to numpy array for downsampling and drop NaN/None
-        data_points = np.array([(r['timeStamp'], r[signal_name]) for r in results], dtype=float)
-        if data_points.size:
-            finite_mask = np.isfinite(data_points[:, 0]) & np.isfinite(data_points[:, 1])
-            data_points = data_points[finite_mask]
-        
-        # Calculate number of points to keep based on zoom level and viewport width
-        safe_div = max(1, (11 - int(zoom_level)))
-        base_points = max(100, len(data_points) // safe_div)
-        pixel_cap = max(500, int(3 * int(viewport_width)))
-        absolute_cap = 2500
-        target_points = min(len(data_points), base_points, pixel_cap, absolute_cap)
-
-        # If rows are extremely large relative to target, pre-sample indices before LTTB to reduce memory/CPU
-        if len(data_points) > target_points * 50:
-            step = max(1, len(data_points) // (target_points * 20))
-            data_points = data_points[::step]
-        
-        # Apply downsampling
-        downsampled_data = largest_triangle_three_buckets(data_points, target_points)
-        
+
+        downsampled_data = downsample_points(data_points, zoom_level, viewport_width)
+    
         # Send the downsampled data back to the client (compact arrays)
         x = [float(pt[0]) for pt in downsampled_data]
         y = [float(pt[1]) for pt in downsampled_data]
@@ -105,51 +194,28 @@ def handle_visible_range_request(data):
         zoom_level = data.get('zoom_level', 1)
         viewport_width = data.get('viewport_width', 1200)
         request_id = data.get('request_id')
+        response_format = data.get('format', 'json')
+        value_type = data.get('value_type', 'float32')
 
         if not signal_ids or start_time is None or end_time is None:
             socketio.emit('data_range_error', { 'message': 'Missing required parameters' })
             return
+        if response_format not in ('json', 'binary') or value_type not in BINARY_VALUE_TYPES:
+            socketio.emit('data_range_error', { 'message': 'Invalid format or value_type' })
+            return
 
-        db_conn = dbconnect()
-
-        # Determine target points per signal using same cap logic
-        safe_div = max(1, (11 - int(zoom_level)))
-        pixel_cap = max(500, int(3 * int(viewport_width)))
-        absolute_cap = 2500
-
-        results_by_signal = {}
-        for sid in signal_ids:
-            try:
-                message_name, signal_name = sid.split('.')
-                query = f"""
-                    SELECT {signal_name}, timeStamp
-                    FROM {message_name}
-                    WHERE timeStamp BETWEEN {start_time} AND {end_time}
-                    ORDER BY timeStamp
-                """
-                rows = db_conn.query(query)
-                if not rows:
-                    results_by_signal[sid] = { 'x': [], 'y': [] }
-                    continue
-                dp = np.array([(r['timeStamp'], r[signal_name]) for r in rows], dtype=float)
-                if dp.size:
-                    finite_mask = np.isfinite(dp[:, 0]) & np.isfinite(dp[:, 1])
-                    dp = dp[finite_mask]
-                base_points = max(100, len(dp) // safe_div)
-                target_points = min(len(dp), base_points, pixel_cap, absolute_cap)
-                if len(dp) > target_points * 50:
-                    step = max(1, len(dp) // (target_points * 20))
-                    dp = dp[::step]
-                ds = largest_triangle_three_buckets(dp, target_points)
-                results_by_signal[sid] = {
-                    'x': [float(pt[0]) for pt in ds],
-                    'y': [float(pt[1]) for pt in ds]
-                }
-            except Exception as inner_e:
-                results_by_signal[sid] = { 'x': [], 'y': [] }
+        points_by_signal = fetch_visible_range(signal_ids, start_time, end_time, zoom_level, viewport_width)
 
+        if response_format == 'binary':
+            # bytes are sent as a Socket.IO binary attachment
+            socketio.emit('visible_range_update', {
+                'format': 'binary',
+                'data': points_to_binary(points_by_signal, value_type),
+                'request_id': request_id
+            })
+            return
         socketio.emit('visible_range_update', {
-            'signals': results_by_signal,
+            'signals': points_to_json(points_by_signal),
             'request_id': request_id
         })
     except Exception as e:
@@ -197,10 +263,13 @@ def get_visible_range():
       start_time: number (seconds),
       end_time: number (seconds),
       zoom_level: 1..10,
-      viewport_width: number
+      viewport_width: number,
+      format: "json" (default) | "binary",
+      value_type: "float32" (default) | "float64", y values of binary responses
     }
     
-    Returns JSON with x/y arrays per signal.
+    Returns JSON with x/y arrays per signal, or for "binary" an application/octet-stream body laid out as described at
+    BINARY_VALUE_TYPES.
     """
     try:
         data = request.json
@@ -209,71 +278,21 @@ def get_visible_range():
         end_time = data.get('end_time')
         zoom_level = data.get('zoom_level', 1)
         viewport_width = data.get('viewport_width', 1200)
+        response_format = data.get('format', 'json')
+        value_type = data.get('value_type', 'float32')
 
         if not signal_ids or start_time is None or end_time is None:
             return jsonify({"status": "error", "message": "Missing required parameters"}), 400
+        if response_format not in ('json', 'binary') or value_type not in BINARY_VALUE_TYPES:
+            return jsonify({"status": "error", "message": "Invalid format or value_type"}), 400
 
-        db_conn = dbconnect()
-
-        # Determine target points per signal using same cap logic as socketio handlers
-        safe_div = max(1, (11 - int(zoom_level)))
-        pixel_cap = max(500, int(3 * int(viewport_width)))
-        absolute_cap = 2500
-
-        results_by_signal = {}
-        total_raw_points = 0
-        total_processed_points = 0
-        
-        for sid in signal_ids:
-            try:
-                message_name, signal_name = sid.split('.')
-                query = f"""
-                    SELECT {signal_name}, timeStamp
-                    FROM {message_name}
-                    WHERE timeStamp BETWEEN {start_time} AND {end_time}
-                    ORDER BY timeStamp
-                """
-                rows = db_conn.query(query)
-                if not rows:
-                    results_by_signal[sid] = { 'x': [], 'y': [] }
-                    continue
-                
-                # Convert to numpy array for downsampling and drop NaN/None
-                dp = np.array([(r['timeStamp'], r[signal_name]) for r in rows], dtype=float)
-                raw_points = len(dp)
-                total_raw_points += raw_points
-                
-                if dp.size:
-                    finite_mask = np.isfinite(dp[:, 0]) & np.isfinite(dp[:, 1])
-                    dp = dp[finite_mask]
-                
-                # Calculate target points
-                base_points = max(100, len(dp) // safe_div)
-                target_points = min(len(dp), base_points, pixel_cap, absolute_cap)
-                
-                # Pre-sample if extremely large dataset
-                if len(dp) > target_points * 50:
-                    step = max(1, len(dp) // (target_points * 20))
-                    dp = dp[::step]
-                
-                # Apply downsampling
-                ds = largest_triangle_three_buckets(dp, target_points)
-                processed_points = len(ds)
-                total_processed_points += processed_points
-                
-                results_by_signal[sid] = {
-                    'x': [float(pt[0]) for pt in ds],
-                    'y': [float(pt[1]) for pt in ds]
-                }
-            except Exception as inner_e:
-                results_by_signal[sid] = { 'x': [], 'y': [] }
-
-        if total_raw_points > 0:
-            compression_ratio = (1 - total_processed_points / total_raw_points) * 100
+        points_by_signal = fetch_visible_range(signal_ids, start_time, end_time, zoom_level, viewport_width)
 
+        if response_format == 'binary':
+            return Response(points_to_binary(points_by_signal, value_type), mimetype='application/octet-stream')
         return jsonify({
             "status": "success",
-            "signals": results_by_signal
+            "signals": points_to_json(points_by_signal)
         }), 200
         
     except Exception as e:
@@ -73,13 +73,13 @@ def validate_startup_requirements(log_type: str, input_file_path: Optional[str])
         elif not (input_file_path.endswith(".txt") or input_file_path.endswith(".log")):
             errors.append(f"Input file must be .txt or .log for {log_type} mode")
     
-    elif log_type == "db":
+    elif log_type in ["db", "backtest"]:
         if not input_file_path:
-            errors.append("Input file is required for db mode")
+            errors.append(f"Input file is required for {log_type} mode")
         elif not validate_input_file_exists(input_file_path):
             errors.append(f"Database file does not exist: {input_file_path}")
         elif not input_file_path.endswith(".db"):
-            errors.append("Input file must be .db for db mode")
+            errors.append(f"Input file must be .db for {log_type} mode")
     
     # Validate hardware requirements
     if log_type == "livelog":
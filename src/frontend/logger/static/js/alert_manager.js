@@ -24,9 +24,19 @@ function deleteAlert(alertId) {
   });
 }
 
-// Modified to display all triggered alerts in one table, with "Alert Category"
-function fetchTriggeredAlerts() {
-  fetch('/get_triggered_alerts', {
+// Triggered alerts shown in the history table, by id. The table starts with the newest TRIGGERED_PAGE_SIZE rows, older
+// pages are loaded on demand. Polls only fetch rows added since lastTriggeredId, plus (separately) the rows that are
+// still active, since their count and cleared_at can change (rows from before last_seen existed never do)
+const TRIGGERED_PAGE_SIZE = 200;
+const MAX_ACTIVE_IDS = 500; // TRIGGERED_ALERTS_MAX_IDS of the server
+const triggeredAlerts = new Map();
+let lastTriggeredId = null;   // newest id loaded
+let oldestTriggeredId = null; // oldest id loaded
+let hasOlderTriggered = false;
+let triggeredInFlight = false; // one request chain at a time, polls skip while it runs
+
+function getTriggeredPage(params) {
+  return fetch(`/get_triggered_alerts?${new URLSearchParams(params)}`, {
     method: 'GET',
     headers: {
       'Content-Type': 'application/json',
@@ -34,70 +44,131 @@ function fetchTriggeredAlerts() {
   })
   .then((response) => response.json())
   .then((data) => {
-    const alertHistoryContainer = document.getElementById('alertHistoryContainer');
-    alertHistoryContainer.innerHTML = ''; // Clear previous content
-
-    if (data.status === 'success' && data.triggered_alerts.length > 0) {
-      // Sort by can_message_timestamp desc
-      data.triggered_alerts.sort(
-        (a, b) => new Date(b.can_message_timestamp) - new Date(a.can_message_timestamp)
-      );
-
-      let tableHtml = `
-        <div class="table-responsive">
-          <table class="table table-bordered table-striped">
-            <thead class="thead-dark">
-              <tr>
-                <th>#</th>
-                <th>Triggered Item</th>
-                <th>Value</th>
-                <th>CAN Message ID</th>
-                <th>CAN Data</th>
-                <th>Timestamp</th>
-              </tr>
-            </thead>
-            <tbody>
-      `;
+    if (data.status !== 'success') throw new Error(data.message);
+    return data;
+  });
+}
 
-      data.triggered_alerts.forEach((alert) => {
-        const operatorMatch = alert.fail_cause.match(/(.*?)(\s*(?:!=|==|<|>)\s*)(.*)/);
-        let formattedFailCause = alert.fail_cause;
+function fetchTriggeredAlerts() {
+  if (triggeredInFlight) return;
+  triggeredInFlight = true;
+
+  const params = { order: 'desc', limit: TRIGGERED_PAGE_SIZE };
+  if (lastTriggeredId !== null) params.since_id = lastTriggeredId;
+  const activeIds = [...triggeredAlerts.values()]
+    .filter((alert) => alert.cleared_at === null && alert.last_seen !== null)
+    .map((alert) => alert.id)
+    .sort((a, b) => b - a)
+    .slice(0, MAX_ACTIVE_IDS);
+
+  Promise.all([
+    getTriggeredPage(params),
+    activeIds.length > 0 ? getTriggeredPage({ ids: activeIds.join(','), limit: activeIds.length }) : null,
+  ])
+  .then(([newest, active]) => {
+    if (active) active.triggered_alerts.forEach((alert) => triggeredAlerts.set(alert.id, alert));
+    if (lastTriggeredId === null || newest.has_more) {
+      // first load, or more new rows than one page: show the newest page, older rows are loaded on demand
+      if (lastTriggeredId !== null) triggeredAlerts.clear();
+      hasOlderTriggered = newest.has_more;
+      oldestTriggeredId = newest.triggered_alerts.length > 0 ? newest.triggered_alerts[newest.triggered_alerts.length - 1].id : null;
+    }
+    newest.triggered_alerts.forEach((alert) => triggeredAlerts.set(alert.id, alert));
+    lastTriggeredId = newest.last_id;
+    renderTriggeredAlerts();
+  })
+  .catch((error) => {
+    console.error('Error fetching triggered alerts:', error);
+  })
+  .finally(() => {
+    triggeredInFlight = false;
+  });
+}
 
-        if (operatorMatch) {
-          const [, left, operator, right] = operatorMatch;
-          formattedFailCause = `<b>${left.trim()}</b>${operator}${right.trim()}`;
-        }
+function loadOlderTriggeredAlerts() {
+  if (triggeredInFlight || oldestTriggeredId === null) return;
+  triggeredInFlight = true;
 
-        tableHtml += `
-          <tr class="history-item">
-            <td>${alert.alert_id}</td>
-            <td>${alert.signal}</td>
-            <td>${formattedFailCause}</td>
-            <td>${alert.category + " (" + alert.can_message_id+ ")" || ''}</td>
-            <td>${alert.can_message_data}</td>
-            <td>${Math.trunc(alert.can_message_timestamp)}</td>
-          </tr>
-        `;
-      });
+  getTriggeredPage({ order: 'desc', limit: TRIGGERED_PAGE_SIZE, before_id: oldestTriggeredId })
+  .then((data) => {
+    data.triggered_alerts.forEach((alert) => triggeredAlerts.set(alert.id, alert));
+    if (data.triggered_alerts.length > 0) oldestTriggeredId = data.triggered_alerts[data.triggered_alerts.length - 1].id;
+    hasOlderTriggered = data.has_more;
+    renderTriggeredAlerts();
+  })
+  .catch((error) => {
+    console.error('Error fetching older triggered alerts:', error);
+  })
+  .finally(() => {
+    triggeredInFlight = false;
+  });
+}
 
+// Displays all triggered alerts in one table, with "Alert Category"
+function renderTriggeredAlerts() {
+  const alertHistoryContainer = document.getElementById('alertHistoryContainer');
+  alertHistoryContainer.innerHTML = ''; // Clear previous content
+
+  if (triggeredAlerts.size > 0) {
+    // Sort by can_message_timestamp desc
+    const sorted = [...triggeredAlerts.values()].sort(
+      (a, b) => new Date(b.can_message_timestamp) - new Date(a.can_message_timestamp)
+    );
+
+    let tableHtml = `
+      <div class="table-responsive">
+        <table class="table table-bordered table-striped">
+          <thead class="thead-dark">
+            <tr>
+              <th>#</th>
+              <th>Triggered Item</th>
+              <th>Value</th>
+              <th>CAN Message ID</th>
+              <th>CAN Data</th>
+              <th>Timestamp</th>
+            </tr>
+          </thead>
+          <tbody>
+    `;
+
+    sorted.forEach((alert) => {
+      const operatorMatch = alert.fail_cause.match(/(.*?)(\s*(?:!=|==|<=|>=|<|>)\s*)(.*)/);
+      let formattedFailCause = alert.fail_cause;
+
+      if (operatorMatch) {
+        const [, left, operator, right] = operatorMatch;
+        formattedFailCause = `<b>${left.trim()}</b>${operator}${right.trim()}`;
+      }
 
       tableHtml += `
-            </tbody>
-          </table>
-        </div>
-      `;
-      alertHistoryContainer.innerHTML = tableHtml;
-    } else {
-      alertHistoryContainer.innerHTML = `
-        <div class="alert alert-info" role="alert">
-          No alerts have been triggered yet.
-        </div>
+        <tr class="history-item">
+          <td>${alert.alert_id}</td>
+          <td>${alert.signal}</td>
+          <td>${formattedFailCause}${alert.count > 1 ? ` <span class="badge badge-secondary">${alert.count}x</span>` : ''}</td>
+          <td>${alert.category + " (" + alert.can_message_id+ ")" || ''}</td>
+          <td>${alert.can_message_data}</td>
+          <td>${Math.trunc(alert.can_message_timestamp)}</td>
+        </tr>
       `;
+    });
+
+
+    tableHtml += `
+          </tbody>
+        </table>
+      </div>
+    `;
+    if (hasOlderTriggered) {
+      tableHtml += `<button class="btn btn-outline-secondary btn-sm" onclick="loadOlderTriggeredAlerts()">Load older alerts</button>`;
     }
-  })
-  .catch((error) => {
-    console.error('Error fetching triggered alerts:', error);
-  });
+    alertHistoryContainer.innerHTML = tableHtml;
+  } else {
+    alertHistoryContainer.innerHTML = `
+      <div class="alert alert-info" role="alert">
+        No alerts have been triggered yet.
+      </div>
+    `;
+  }
 }
 
 // Show "Category" for each active alert
@@ -142,8 +213,9 @@ function fetchAlerts() {
               <p class="mb-1"><strong>Category:</strong> ${alert.category || ''}</p>
               <p class="mb-1"><strong>Field:</strong> ${alert.field} (${alert.type})</p>
               <p class="mb-0"><strong>Condition:</strong> 
-                ${alert.type === 'bool' ? alert.bool_value : comparisons}
+                ${alert.type === 'bool' ? alert.bool_value : alert.type === 'expression' ? alert.expression : comparisons}
               </p>
+              ${alert.holdoff || alert.hysteresis ? `<p class="mb-0"><strong>Debounce:</strong> hold-off ${alert.holdoff || 0} s, hysteresis ${alert.hysteresis || 0} s</p>` : ''}
             </div>
           </div>
         `;
@@ -185,6 +257,9 @@ document.getElementById("addAlertBtn").addEventListener("click", function () {
   selectedFieldType = null;
   selectedCategory = null;
   document.getElementById("alertName").value = "";
+  document.getElementById("alertExpression").value = "";
+  document.getElementById("holdoffValue").value = "";
+  document.getElementById("hysteresisValue").value = "";
   
   // Clear out the #radioGroup
   const radioGroup = document.getElementById("radioGroup");
@@ -242,14 +317,20 @@ document.getElementById("addAlertBtn").addEventListener("click", function () {
 
 // Next button: move from Step 1 to Step 2
 document.getElementById("nextBtn").addEventListener("click", function () {
+  const expression = document.getElementById("alertExpression").value.trim();
   const selectedRadio = document.querySelector('input[name="alertType"]:checked');
-  if (!selectedRadio) {
-    alert("Please select an alert type.");
+  if (expression) {
+    selectedField = expression;
+    selectedFieldType = "expression";
+    selectedCategory = "Expression";
+  } else if (selectedRadio) {
+    selectedField = selectedRadio.value;
+    selectedFieldType = selectedRadio.dataset.type;
+    selectedCategory = selectedRadio.dataset.category;
+  } else {
+    alert("Please select an alert type or enter an expression.");
     return;
   }
-  selectedField = selectedRadio.value;
-  selectedFieldType = selectedRadio.dataset.type;
-  selectedCategory = selectedRadio.dataset.category;
 
   document.getElementById("selectedField").innerText = `Selected Field: ${selectedField}`;
   document.getElementById("step1").style.display = "none";
@@ -295,7 +376,9 @@ document.getElementById("submitBtn").addEventListener("click", function () {
     category: selectedCategory
   };
 
-  if (selectedFieldType === "bool") {
+  if (selectedFieldType === "expression") {
+    alertData.expression = selectedField;
+  } else if (selectedFieldType === "bool") {
     const boolVal = document.querySelector('input[name="boolValue"]:checked');
     if (!boolVal) {
       alert("Please select True or False.");
@@ -336,6 +419,11 @@ document.getElementById("submitBtn").addEventListener("click", function () {
     alertData.comparisons = comparisons;
   }
 
+  const holdoff = document.getElementById("holdoffValue").value;
+  const hysteresis = document.getElementById("hysteresisValue").value;
+  if (holdoff !== "") alertData.holdoff = holdoff;
+  if (hysteresis !== "") alertData.hysteresis = hysteresis;
+
   // Send the alert data to the server
   fetch("/create_alert", {
     method: "POST",
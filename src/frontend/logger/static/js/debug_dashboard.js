@@ -27,6 +27,11 @@ const tableMessages = {};
 const lastReceivedTime = {};
 const lastMessageTime = {};
 const lastTimeStamp = {};
+// Latest {signal: {value, unit}} per table, live updates only carry the signals that changed
+const latestSignals = {};
+// Maximum number of live updates per second requested from the server (the server may cap it lower)
+const LIVE_UPDATE_MAX_RATE = 4;
+let socket = null;
 const messageContainer = document.getElementById('messageContainer');
 
 document.addEventListener('DOMContentLoaded', () => {
@@ -39,10 +44,44 @@ document.addEventListener('DOMContentLoaded', () => {
 
     // functions to handle getting table names and messages
     fetchTableNames();
-    setInterval(fetchLatestMessages, 1000);
+    if (typeof io !== 'undefined') {
+        socket = io.connect(location.protocol + '//' + document.domain + ':' + location.port);
+        socket.on('latest_update', handleLatestUpdate);
+        // subscriptions do not survive a reconnect, subscribe again
+        socket.on('connect', subscribeLatest);
+    } else {
+        setInterval(fetchLatestMessages, 1000);  // Socket.IO unavailable, fall back to polling
+    }
     setInterval(updateElapsedTime, 1000);
 });
 
+function subscribeLatest() {
+    if (!socket) return;
+    // an empty list subscribes to every message, same as showing all tables when none are checked
+    socket.emit('subscribe_latest', { messages: checkedTables, max_rate: LIVE_UPDATE_MAX_RATE });
+}
+
+function handleLatestUpdate(update) {
+    (update.messages || []).forEach(msg => {
+        const tableName = msg.table_name;
+        if (msg.units || !latestSignals[tableName]) {
+            latestSignals[tableName] = {};
+            Object.entries(msg.units || {}).forEach(([signal, unit]) => {
+                latestSignals[tableName][signal] = { value: null, unit: unit };
+            });
+        }
+        const signals = latestSignals[tableName];
+        Object.entries(msg.signals).forEach(([signal, value]) => {
+            if (signals[signal]) {
+                signals[signal].value = value;
+            } else {
+                signals[signal] = { value: value, unit: null };
+            }
+        });
+        displayMessage({ table_name: tableName, timestamp: msg.timestamp, data: signals });
+    });
+}
+
 function fetchTableNames() {
     fetch('/get_table_names')
         .then(res => res.json())
@@ -109,6 +148,7 @@ function loadTableData() {
         .map(cb => cb.value);
     saveSelectedToStorage(checkedTables);
     updateVisibleTables(checkedTables);
+    subscribeLatest();
 }
 
 function updateVisibleTables(selected) {
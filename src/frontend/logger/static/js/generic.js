@@ -117,66 +117,70 @@
         fillAlertDiv(latest);
     }
 
-    function fetchMostRecentAlert() {
-        console.log('Fetching most recent alert...');
-        fetch('/get_triggered_alerts')
+    // Newest triggered alert id seen so far, later polls only ask the server for newer rows
+    let lastTriggeredId = null;
+
+    function fetchTriggered(params) {
+        return fetch(`/get_triggered_alerts?${new URLSearchParams(params)}`)
             .then(resp => resp.json())
             .then(data => {
-                if (data.status !== 'success' || !data.triggered_alerts || data.triggered_alerts.length === 0) {
-                    // If no alerts, ensure any stored active fault ID is removed
-                    localStorage.removeItem(ACTIVE_KEY);
-                    return renderNoErrors();
-                }
-
-                // Sort by timestamp, newest first
-                const triggered = data.triggered_alerts.sort((a, b) =>
-                    new Date(b.can_message_timestamp) - new Date(a.can_message_timestamp)
-                );
-
-                const activeAutoId = localStorage.getItem(ACTIVE_KEY);
-                const clearedTriggerId = localStorage.getItem('cleared_trigger_id');
+                if (data.status !== 'success') throw new Error(data.message);
+                return data.triggered_alerts;
+            });
+    }
 
-                // --- START: Prioritize Active Auto-Fault ---
+    function fetchMostRecentAlert() {
+        console.log('Fetching most recent alert...');
+        const activeAutoId = localStorage.getItem(ACTIVE_KEY);
+
+        // --- START: Prioritize Active Auto-Fault ---
+        (activeAutoId ? fetchTriggered({ ids: activeAutoId }) : Promise.resolve([]))
+            .then(activeFaults => {
+                if (activeFaults.length > 0) {
+                    // The active fault IS still triggered. Display it and stop further processing.
+                    console.log(`Active auto-fault ${activeAutoId} still exists. Rendering it.`);
+                    renderAutoFault(activeFaults[0]);
+                    return; // Important: Stop here, don't process other alerts
+                }
                 if (activeAutoId) {
-                    // Find the alert matching the stored active ID within the current triggered list
-                    const activeFault = triggered.find(alert => alert.id.toString() === activeAutoId);
-                    if (activeFault) {
-                        // The active fault IS still triggered. Display it and stop further processing.
-                        console.log(`Active auto-fault ${activeAutoId} found in triggered list. Rendering it.`);
-                        renderAutoFault(activeFault);
-                        return; // Important: Stop here, don't process other alerts
-                    } else {
-                        // The stored active fault ID is no longer in the triggered list
-                        // (maybe cleared server-side or resolved). Remove it from storage.
-                        console.log(`Stored active auto-fault ${activeAutoId} not found in triggered list. Removing from localStorage.`);
-                        localStorage.removeItem(ACTIVE_KEY);
-                        // Continue processing below to check the latest alert...
-                    }
+                    // The stored active fault ID no longer exists (maybe cleared server-side or a different database).
+                    console.log(`Stored active auto-fault ${activeAutoId} not found. Removing from localStorage.`);
+                    localStorage.removeItem(ACTIVE_KEY);
                 }
                 // --- END: Prioritize Active Auto-Fault ---
 
+                // Only the newest alert is needed, and only if it is newer than the one already processed
+                const params = { limit: 1, order: 'desc' };
+                if (lastTriggeredId !== null) params.since_id = lastTriggeredId;
+                return fetchTriggered(params).then(triggered => {
+                    if (triggered.length === 0) {
+                        // Nothing new: keep what is shown, unless nothing has ever triggered
+                        if (lastTriggeredId === null) renderNoErrors();
+                        return;
+                    }
 
-                // If we reach here, either there was no activeAutoId, or the stored one is no longer valid.
-                // Process the absolute latest alert.
-                const latest = triggered[0];
+                    const latest = triggered[0];
+                    lastTriggeredId = latest.id;
+                    const clearedTriggerId = localStorage.getItem('cleared_trigger_id');
 
-                // If user explicitly cleared this specific latest alert via the button
-                if (clearedTriggerId && parseInt(clearedTriggerId) === latest.id) {
-                    console.log(`Latest alert ${latest.id} matches the recently cleared ID. Rendering no errors.`);
-                    return renderNoErrors();
-                }
+                    // If user explicitly cleared this specific latest alert via the button
+                    if (clearedTriggerId && parseInt(clearedTriggerId) === latest.id) {
+                        console.log(`Latest alert ${latest.id} matches the recently cleared ID. Rendering no errors.`);
+                        return renderNoErrors();
+                    }
 
-                // Check if the latest alert is an auto-fault (and should become the new active one)
-                const isAutoFault = latest.fail_cause && latest.fail_cause.trim().toUpperCase() === 'AUTO FAULT';
-                if (isAutoFault) {
-                    console.log(`Latest alert ${latest.id} is a new auto-fault. Storing and rendering.`);
-                    localStorage.setItem(ACTIVE_KEY, latest.id);
-                    return renderAutoFault(latest);
-                }
+                    // Check if the latest alert is an auto-fault (and should become the new active one)
+                    const isAutoFault = latest.fail_cause && latest.fail_cause.trim().toUpperCase() === 'AUTO FAULT';
+                    if (isAutoFault) {
+                        console.log(`Latest alert ${latest.id} is a new auto-fault. Storing and rendering.`);
+                        localStorage.setItem(ACTIVE_KEY, latest.id);
+                        return renderAutoFault(latest);
+                    }
 
-                // Otherwise, it's a normal warning
-                console.log(`Rendering latest alert ${latest.id} as a warning.`);
-                renderWarning(latest);
+                    // Otherwise, it's a normal warning
+                    console.log(`Rendering latest alert ${latest.id} as a warning.`);
+                    renderWarning(latest);
+                });
             })
             .catch(err => {
                 console.error('Error fetching triggered alerts:', err);
@@ -218,15 +222,11 @@
         // Clean up stale cleared_trigger_id
         const clearedTriggerId = localStorage.getItem('cleared_trigger_id');
         if (clearedTriggerId) {
-            fetch('/get_triggered_alerts')
-                .then(r => r.json())
-                .then(data => {
-                    if (data.status === 'success') {
-                        const exists = data.triggered_alerts.some(a => a.id === parseInt(clearedTriggerId));
-                        if (!exists) {
-                            console.log('Cleared ID no longer valid, removing.');
-                            localStorage.removeItem('cleared_trigger_id');
-                        }
+            fetchTriggered({ ids: clearedTriggerId })
+                .then(triggered => {
+                    if (triggered.length === 0) {
+                        console.log('Cleared ID no longer valid, removing.');
+                        localStorage.removeItem('cleared_trigger_id');
                     }
                 })
                 .finally(fetchMostRecentAlert)
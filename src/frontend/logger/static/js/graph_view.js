@@ -13,6 +13,10 @@ const POLLING_INTERVAL = 100; // milliseconds (0.1 seconds for very responsive l
 let pollingActive = false;
 let currentPollingTimeout = null;
 
+// Binary range responses: /get_visible_range sends float64 x and BINARY_VALUE_TYPE y buffers instead of JSON numbers
+const BINARY_RANGE_RESPONSES = true;
+const BINARY_VALUE_TYPE = 'float32'; // 'float32' or 'float64'
+
 // Live data configuration
 const LIVE_WINDOW_SIZE = 60; // seconds - how much historical data to show in live mode
 let liveUpdatesEnabled = true; // Always keep live updates enabled
@@ -226,6 +230,31 @@ function requestDataRange(signalId, startTime, endTime, zoomLevel) {
     requestVisibleRange(startTime, endTime, zoomLevel, [signalId]);
 }
 
+// Decode a binary /get_visible_range response (layout described at BINARY_VALUE_TYPES in graph_view.py) into the same
+// shape as the JSON one, with typed arrays viewing the buffer instead of number lists. Typed arrays use the platform's
+// byte order, which is little-endian like the buffers on every platform browsers run on
+function decodeBinaryRange(buffer) {
+    const headerLength = new DataView(buffer).getUint32(0, true);
+    const header = JSON.parse(new TextDecoder().decode(new Uint8Array(buffer, 4, headerLength)));
+    const ValueArray = header.value_type === 'float64' ? Float64Array : Float32Array;
+    const signals = {};
+    let offset = 4 + headerLength;
+    header.signals.forEach(s => {
+        signals[s.id] = { x: new Float64Array(buffer, offset, s.points) };
+        offset += s.points * Float64Array.BYTES_PER_ELEMENT;
+    });
+    header.signals.forEach(s => {
+        signals[s.id].y = new ValueArray(buffer, offset, s.points);
+        offset += s.points * ValueArray.BYTES_PER_ELEMENT;
+    });
+    return { status: header.status, signals };
+}
+
+// x/y series arrive as arrays (JSON) or typed arrays (binary)
+function isSeries(values) {
+    return Array.isArray(values) || ArrayBuffer.isView(values);
+}
+
 // Bulk request for all active signals in current visible range (now using HTTP)
 function requestVisibleRange(startTime, endTime, zoomLevel, specificSignalIds = null) {
     const viewportWidth = Math.floor(graphDiv.clientWidth || graphDiv.getBoundingClientRect().width || 1200);
@@ -255,10 +284,16 @@ function requestVisibleRange(startTime, endTime, zoomLevel, specificSignalIds =
             start_time: startTime,
             end_time: endTime,
             zoom_level: zoomLevel,
-            viewport_width: viewportWidth
+            viewport_width: viewportWidth,
+            format: BINARY_RANGE_RESPONSES ? 'binary' : 'json',
+            value_type: BINARY_VALUE_TYPE
         })
     })
-    .then(response => response.json())
+    .then(response => {
+        // errors are always JSON
+        const contentType = response.headers.get('Content-Type') || '';
+        return contentType.startsWith('application/octet-stream') ? response.arrayBuffer().then(decodeBinaryRange) : response.json();
+    })
         .then(data => {
             if (data.status === 'success') {
                 // Log how many data points we received for each signal
@@ -373,8 +408,8 @@ function handleDataRangeUpdate(data) {
     }
 
     // Expect compact arrays: x (timestamps as numbers), y (values)
-    const x = Array.isArray(data.x) ? data.x : [];
-    const y = Array.isArray(data.y) ? data.y : [];
+    const x = isSeries(data.x) ? data.x : [];
+    const y = isSeries(data.y) ? data.y : [];
 
     info.x = x;
     info.y = y;
@@ -405,8 +440,8 @@ function handleVisibleRangeUpdate(payload) {
         const info = activeSignals.get(signalId);
         if (!info) return;
         const s = series[signalId];
-        info.x = Array.isArray(s.x) ? s.x : [];
-        info.y = Array.isArray(s.y) ? s.y : [];
+        info.x = isSeries(s.x) ? s.x : [];
+        info.y = isSeries(s.y) ? s.y : [];
         
         // Track data presence and time range
         if (info.x.length > 0) {
@@ -8,6 +8,8 @@ import webbrowser
 import backend.dbcs as dbcs
 from backend.sockio.socket import socketio, app as socketio_app
 from backend.db_connection import DbConnection
+import backend.latest_values as latest_values
+import backend.backtest as backtest
 from backend.input import consumer, logfile_producer, live_log_producer, radio_producer
 from functools import partial
 from backend.sockio import debug_dashboard, alert_manager  # noqa: F401 (ensure handlers are registered)
@@ -19,7 +21,7 @@ from backend.sockio import debug_dashboard, alert_manager, graph_view
 SOCKETIO_PORT = 5500
 
 def build_parser() -> argparse.ArgumentParser:
-    data_sources = ["pastlog", "livelog", "mock_livelog", "db", "radio"]
+    data_sources = ["pastlog", "livelog", "mock_livelog", "db", "radio", "backtest"]
     parser = argparse.ArgumentParser()
     parser.add_argument("logType", choices=data_sources, type=str.lower,
                         help="The type of data source to use.")
@@ -29,6 +31,12 @@ def build_parser() -> argparse.ArgumentParser:
                         help="Output DB name (.db). Autogenerated if not specified.")
     parser.add_argument("--set_dbc_branch", "-b", type=str, default="main",
                         help="Branch of the DBC files submodule.")
+    parser.add_argument("--alertId", type=int, default=None,
+                        help="backtest: id of the saved alert to evaluate. All saved alerts if not specified.")
+    parser.add_argument("--start", type=float, default=None,
+                        help="backtest: only evaluate frames at or after this timestamp (seconds).")
+    parser.add_argument("--end", type=float, default=None,
+                        help="backtest: only evaluate frames at or before this timestamp (seconds).")
     return parser
 
 def run_server(args):
@@ -87,27 +95,55 @@ def run_server(args):
         print("[STARTUP] Error: Need to specify a .db file for the output database")
         sys.exit()
 
-    if args.logType == "db":
+    if args.logType in ("db", "backtest"):
         database_path = args.inputFile[0]
 
+    if args.logType == "backtest":
+        # evaluates the saved alerts against the database and exits, no tables are created and no server is started
+        DbConnection.setup_the_db_path(database_path)
+        backtest.run_cli(args.alertId, args.start, args.end)
+        return
+
     DbConnection.setup_the_db_path(database_path)
-    dbconn = DbConnection()
-    dbconn.setup_the_tables()
+    with DbConnection.writer() as dbconn:
+        # pastlog builds the timeStamp indexes after the bulk load, which is a lot faster than maintaining them, db adds
+        # the ones it is missing below
+        dbconn.setup_the_tables(create_indexes=args.logType not in ("pastlog", "db"))
+        if args.logType == "db":
+            # databases written by older versions have no timeStamp indexes yet, this adds them once
+            index_start = time.perf_counter()
+            created = dbconn.create_time_indexes()
+            if created:
+                print(f"[STARTUP] Added {created} timeStamp indexes in {time.perf_counter() - index_start:.1f} s")
+            # same for the rollups the graphs read when zoomed out
+            rollup_start = time.perf_counter()
+            built = dbconn.build_rollups()
+            if built:
+                print(f"[STARTUP] Built rollups of {built} message tables in {time.perf_counter() - rollup_start:.1f} s")
+            latest_values.seed_from_db(dbconn)
 
     if args.logType == "pastlog":
-        logfile_producer.process_logfile(datafile_path)
-        consumer.process_data()
+        logfile_producer.process_logfile_parallel(datafile_path)
+        with DbConnection.writer() as dbconn:
+            index_start = time.perf_counter()
+            dbconn.create_time_indexes()
+            print(f"[PASTLOG] Built timeStamp indexes in {time.perf_counter() - index_start:.1f} s")
+            dbconn.fold_rollups()  # the rows written since the last periodic fold
+            latest_values.seed_from_db(dbconn)
 
     elif args.logType == "livelog":
         socketio.start_background_task(target=consumer.process_data_live)
+        socketio.start_background_task(target=consumer.process_alerts_live)
         socketio.start_background_task(target=live_log_producer.listen_to_serial)
 
     elif args.logType == "mock_livelog":
         socketio.start_background_task(target=consumer.process_data_live)
+        socketio.start_background_task(target=consumer.process_alerts_live)
         socketio.start_background_task(target=partial(logfile_producer.process_logfile_live, datafile_path))
 
     elif args.logType == "radio":
         socketio.start_background_task(target=consumer.process_data_live)
+        socketio.start_background_task(target=consumer.process_alerts_live)
         socketio.start_background_task(target=radio_producer.listen_to_radio)
 
     print(f"Starting socketio server on localhost:{SOCKETIO_PORT}")
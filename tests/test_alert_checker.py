@@ -0,0 +1,49 @@
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+
+import pytest
+from backend.db_connection import DbConnection
+import backend.alert_checker as alertChecker
+import backend.dbcs as dbcs
+
+BOOL_ALERT = {"name": "fault", "field": "fault_flag", "type": "bool", "category": "PackInformation"}
+
+
+@pytest.fixture
+def database(tmp_path, monkeypatch):
+    """ A database with the alert tables only, no DBCs needed """
+
+    monkeypatch.setattr(dbcs, "DBCs", [])
+    DbConnection.setup_the_db_path(str(tmp_path / "alerts.db"))
+    with DbConnection.writer() as db_conn:
+        db_conn.setup_the_tables()
+    yield
+    DbConnection.setup_the_db_path("./error")
+
+
+@pytest.mark.parametrize("value", [None, "", "maybe", 1, "True"])
+def test_create_bool_alert_needs_true_or_false(database, value):
+    with DbConnection.writer() as db_conn, pytest.raises(ValueError):
+        db_conn.create_alert(dict(BOOL_ALERT, value=value))
+
+
+@pytest.mark.parametrize("value, expected", [("true", True), ("false", False), (True, True), (False, False)])
+def test_create_bool_alert(database, value, expected):
+    with DbConnection.writer() as db_conn:
+        db_conn.create_alert(dict(BOOL_ALERT, value=value))
+    alert, = alertChecker.fetchActiveAlerts()
+    assert alertChecker.compileAlert(alert)['bool_value'] is expected
+
+
+def test_registry_skips_invalid_stored_alert(database):
+    with DbConnection.writer() as db_conn:
+        # as stored before bool values were validated on creation
+        db_conn.cur.execute("INSERT INTO Alerts (name, field, type, category) VALUES ('no value', 'fault_flag', 'bool', 'PackInformation')")
+        db_conn.conn.commit()
+        db_conn.create_alert(dict(BOOL_ALERT, value="true"))
+
+    alertChecker._buildAlertRegistry()  # must not raise
+    with pytest.raises(ValueError):
+        alertChecker.compileAlert(alertChecker.fetchActiveAlerts()[0])
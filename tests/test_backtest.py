@@ -0,0 +1,49 @@
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+
+import pytest
+from backend.db_connection import DbConnection
+import backend.backtest as backtest
+
+ALERT = {"id": 1, "name": "high voltage", "field": "pack_voltage", "type": "double", "category": "PackInformation",
+         "comparisons": [{"operator": ">", "value": 10}]}
+
+
+@pytest.fixture
+def database(tmp_path):
+    """ A database with an empty PackInformation table, no DBCs needed """
+
+    DbConnection.setup_the_db_path(str(tmp_path / "backtest.db"))
+    with DbConnection.writer() as db_conn:
+        db_conn.cur.execute('CREATE TABLE PackInformation (count INTEGER PRIMARY KEY AUTOINCREMENT, pack_voltage REAL, timeStamp REAL)')
+        db_conn.conn.commit()
+    yield
+    DbConnection.setup_the_db_path("./error")
+
+
+def add_rows(rows: list[tuple]) -> None:
+    with DbConnection.writer() as db_conn:
+        db_conn.cur.executemany('INSERT INTO PackInformation (pack_voltage, timeStamp) VALUES (?, ?)', rows)
+        db_conn.conn.commit()
+
+
+def test_empty_table(database):
+    alerts = [backtest.alert_from_definition(ALERT)]
+    assert backtest.backtest_alerts(alerts) == []
+
+
+def test_empty_time_window(database):
+    add_rows([(20.0, 1.0), (20.0, 2.0), (5.0, 3.0)])
+    alerts = [backtest.alert_from_definition(ALERT)]
+    assert backtest.backtest_alerts(alerts, start_time=10.0, end_time=20.0) == []
+
+    intervals = backtest.backtest_alerts(alerts)
+    assert [(interval["start"], interval["end"], interval["count"]) for interval in intervals] == [(1.0, 3.0, 2)]
+
+
+def test_empty_tables_of_expression_alert(database):
+    alerts = [backtest.alert_from_definition({"name": "sum", "type": "expression", "expression": "mean(pack_voltage, 1) > 10"})]
+    assert backtest.backtest_alerts(alerts) == []
+    assert backtest.backtest_alerts(alerts, start_time=10.0, end_time=20.0) == []